@@ -0,0 +1,356 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import Float, case, func, literal, select, true, tuple_
+from sqlalchemy.dialects.postgresql import aggregate_order_by, array
+from sqlalchemy.orm import Session
+
+from app.core.request_metrics import timed
+from app.models.database import User
+from app.models.filters import user_filter_clauses
+
+# Age ranges reported by /analytics/by_age_range (inclusive bounds)
+AGE_RANGES = {
+    '18-30': (18, 30),
+    '31-45': (31, 45),
+    '46-60': (46, 60),
+    '60+': (61, 100)
+}
+
+HISTOGRAM_BINS = 10
+
+
+def round_value(value):
+    """Round like pandas/numpy do, mapping missing values to None."""
+    if value is None:
+        return None
+    value = float(value)
+    if np.isnan(value):
+        return None
+    return float(np.round(value, 2))
+
+
+def _supports_sql_statistics(db: Session) -> bool:
+    """Whether the backend has width_bucket, percentile_cont and stddev_samp."""
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def age_ranges_from_edges(edges) -> dict:
+    """Turn ascending edges ``[a0, a1, ..., an]`` into ranges ``a(i)..a(i+1)-1``."""
+    if edges is None:
+        return AGE_RANGES
+    return {
+        f"{lower}-{upper - 1}": (lower, upper - 1)
+        for lower, upper in zip(edges, edges[1:])
+    }
+
+
+def histogram_edges(minimum, maximum, bins: int = HISTOGRAM_BINS) -> list:
+    """Bin edges exactly as np.histogram derives them from the data range."""
+    if minimum is None or maximum is None:
+        minimum, maximum = 0.0, 1.0
+    first, last = float(minimum), float(maximum)
+    if first == last:
+        first, last = first - 0.5, last + 0.5
+    return np.linspace(first, last, bins + 1, endpoint=True).tolist()
+
+
+def _salary_statistics(mean, median, std, minimum, maximum) -> dict:
+    return {
+        'mean': round_value(mean),
+        'median': round_value(median),
+        'std': round_value(std),
+        'min': round_value(minimum),
+        'max': round_value(maximum)
+    }
+
+
+def city_stats(db: Session, filters=None) -> dict:
+    """Count, mean salary and mean age per city, computed by the database."""
+    rows = (
+        db.query(
+            User.city,
+            # count(*) rather than count(id): city-filtered queries can then
+            # be answered from ix_users_city_covering alone
+            func.count(),
+            func.avg(User.salary),
+            func.avg(User.age)
+        )
+        .filter(User.city.isnot(None), *user_filter_clauses(filters))
+        .group_by(User.city)
+        .all()
+    )
+    return {
+        city: {'id': count, 'salary': round_value(salary), 'age': round_value(age)}
+        for city, count, salary, age in sorted(rows, key=lambda row: row[0])
+    }
+
+
+def age_range_stats(db: Session, ranges=AGE_RANGES, filters=None) -> dict:
+    """Count and mean salary per age range in a single conditional aggregate."""
+    columns = []
+    for min_age, max_age in ranges.values():
+        in_range = User.age.between(min_age, max_age)
+        columns.append(func.sum(case((in_range, 1), else_=0)))
+        columns.append(func.avg(case((in_range, User.salary))))
+    row = db.query(*columns).filter(*user_filter_clauses(filters)).one()
+
+    result = {}
+    for index, range_name in enumerate(ranges):
+        count, avg_salary = row[2 * index], row[2 * index + 1]
+        result[range_name] = {
+            'count': int(count or 0),
+            'avg_salary': round_value(avg_salary)
+        }
+    return result
+
+
+def _bucket_expression(edges: list):
+    """1-based histogram bin for User.salary, or NULL outside the edges.
+
+    width_bucket with an explicit threshold array uses exact comparisons, so
+    rows land in the same bins as np.histogram; the last edge itself belongs
+    to the closed last bin.
+    """
+    bins = len(edges) - 1
+    thresholds = array([literal(edge, Float) for edge in edges])
+    return case(
+        (User.salary.between(edges[0], edges[-1]),
+         func.least(func.width_bucket(User.salary, thresholds), bins))
+    )
+
+
+def _reduce_chunks(db: Session, filters, bins, bin_edges, columns, summary=True, ranges=AGE_RANGES):
+    """pandas fallback: reduce column-pruned chunks to partial aggregates, in
+    parallel shards when the analytics pool is enabled."""
+    # partials builds on this module's helpers
+    from app.analytics.loader import salary_bounds
+    from app.analytics.parallel import reduce_chunks
+    from app.analytics.partials import SalaryAggregator, SummaryAggregator
+
+    minimum, maximum = (None, None) if bin_edges else salary_bounds(db, [None], filters)[0]
+    aggregator = SalaryAggregator.for_bounds(minimum, maximum, bins, bin_edges)
+    if summary:
+        aggregator = SummaryAggregator(ranges, aggregator.edges.tolist(), aggregator.clamp)
+    aggregator = reduce_chunks(db, aggregator, columns, filters)
+    with timed("pandas"):
+        return aggregator.result()
+
+
+def salary_histogram(db: Session, bins: int = HISTOGRAM_BINS, bin_edges=None, filters=None) -> dict:
+    """Salary histogram and summary statistics.
+
+    On PostgreSQL everything is computed server-side: summary statistics with
+    one aggregate query and the bin counts with ``width_bucket`` over the
+    same edges ``np.histogram`` would use. Other backends fall back to pandas
+    over the salary column only.
+    """
+    clauses = user_filter_clauses(filters)
+    if not _supports_sql_statistics(db):
+        return _reduce_chunks(db, filters, bins, bin_edges, ["salary"], summary=False)
+
+    count, mean, median, std, minimum, maximum = (
+        db.query(
+            func.count(User.salary),
+            func.avg(User.salary),
+            func.percentile_cont(0.5).within_group(User.salary),
+            func.stddev_samp(User.salary),
+            func.min(User.salary),
+            func.max(User.salary)
+        )
+        .filter(*clauses)
+        .one()
+    )
+
+    edges = list(map(float, bin_edges)) if bin_edges else histogram_edges(minimum, maximum, bins)
+    counts = [0] * (len(edges) - 1)
+    if count:
+        # Group on a derived column so the bucket's bound edges are not
+        # repeated in GROUP BY (positional drivers would bind them twice)
+        binned = select(_bucket_expression(edges).label('bucket')).where(*clauses).subquery()
+        rows = (
+            db.query(binned.c.bucket, func.count())
+            .filter(binned.c.bucket.isnot(None))
+            .group_by(binned.c.bucket)
+            .all()
+        )
+        for bucket_number, bucket_count in rows:
+            counts[bucket_number - 1] = bucket_count
+
+    return {
+        'counts': counts,
+        'bin_edges': edges,
+        'statistics': _salary_statistics(mean, median, std, minimum, maximum)
+    }
+
+
+def summary(db: Session, ranges=AGE_RANGES, bins: int = HISTOGRAM_BINS,
+            bin_edges=None, filters=None) -> dict:
+    """City, age range and salary histogram results from one statement.
+
+    On PostgreSQL a single ``GROUPING SETS`` query scans the filtered rows
+    once and returns one row per city, age range and salary bin plus a grand
+    total row carrying the summary statistics. Without explicit edges, the
+    histogram edges are derived in the same statement from the salary range,
+    using the same arithmetic as ``np.linspace``. Other backends load the
+    three needed columns once and use pandas.
+    """
+    clauses = user_filter_clauses(filters)
+    if not _supports_sql_statistics(db):
+        return _reduce_chunks(db, filters, bins, bin_edges, ["city", "age", "salary"], ranges=ranges)
+
+    age_bucket = case(
+        *[(User.age.between(min_age, max_age), literal(index))
+          for index, (min_age, max_age) in enumerate(ranges.values())]
+    )
+    if bin_edges:
+        edges = list(map(float, bin_edges))
+        salary_bucket = _bucket_expression(edges)
+        edges_column = literal(None)
+    else:
+        bounds = (
+            select(func.min(User.salary).label('lo'), func.max(User.salary).label('hi'))
+            .where(*clauses)
+            .cte('bounds')
+        )
+        same = bounds.c.lo == bounds.c.hi
+        lo = case((same, bounds.c.lo - 0.5), else_=bounds.c.lo)
+        hi = case((same, bounds.c.hi + 0.5), else_=bounds.c.hi)
+        series = func.generate_series(0, bins).table_valued('step').render_derived()
+        step = series.c.step
+        edge = case((step == bins, hi), else_=step * ((hi - lo) / literal(float(bins), Float)) + lo)
+        edges_array = (
+            select(func.array_agg(aggregate_order_by(edge, step)))
+            .select_from(bounds.join(series, true()))
+            .scalar_subquery()
+        )
+        # least() skips NULLs, so a NULL salary would land in the last bin
+        salary_bucket = case(
+            (User.salary.isnot(None),
+             func.least(func.width_bucket(User.salary, edges_array), bins))
+        )
+        edges_column = edges_array
+
+    binned = (
+        select(
+            User.city,
+            User.age,
+            User.salary,
+            age_bucket.label('age_bucket'),
+            salary_bucket.label('salary_bucket')
+        )
+        .where(*clauses)
+        .subquery()
+    )
+    columns = binned.c
+    grouping_sets = func.grouping_sets(
+        tuple_(columns.city), tuple_(columns.age_bucket), tuple_(columns.salary_bucket), tuple_()
+    )
+    rows = db.execute(
+        select(
+            func.grouping(columns.city),
+            func.grouping(columns.age_bucket),
+            func.grouping(columns.salary_bucket),
+            columns.city,
+            columns.age_bucket,
+            columns.salary_bucket,
+            func.count(),
+            func.avg(columns.salary),
+            func.avg(columns.age),
+            func.percentile_cont(0.5).within_group(columns.salary),
+            func.stddev_samp(columns.salary),
+            func.min(columns.salary),
+            func.max(columns.salary),
+            edges_column
+        )
+        .group_by(grouping_sets)
+    ).all()
+
+    by_city, age_groups, bin_counts, total = {}, {}, {}, None
+    for (no_city, no_age, no_bin, city, age_index, bin_number, count,
+         avg_salary, avg_age, median, std, minimum, maximum, computed_edges) in rows:
+        if not no_city and no_age and no_bin:
+            if city is not None:
+                by_city[city] = {
+                    'id': count, 'salary': round_value(avg_salary), 'age': round_value(avg_age)
+                }
+        elif no_city and not no_age and no_bin:
+            if age_index is not None:
+                age_groups[age_index] = (count, avg_salary)
+        elif no_city and no_age and not no_bin:
+            if bin_number is not None:
+                bin_counts[bin_number] = count
+        else:
+            total = (avg_salary, median, std, minimum, maximum, computed_edges)
+
+    if total is None:
+        total = (None,) * 6
+    avg_salary, median, std, minimum, maximum, computed_edges = total
+    if not bin_edges:
+        edges = computed_edges or histogram_edges(None, None, bins)
+    counts = [bin_counts.get(number, 0) for number in range(1, len(edges))]
+
+    by_age_range = {}
+    for index, range_name in enumerate(ranges):
+        count, range_salary = age_groups.get(index, (0, None))
+        by_age_range[range_name] = {'count': count, 'avg_salary': round_value(range_salary)}
+
+    return {
+        'by_city': dict(sorted(by_city.items())),
+        'by_age_range': by_age_range,
+        'salary_histogram': {
+            'counts': counts,
+            'bin_edges': list(map(float, edges)),
+            'statistics': _salary_statistics(avg_salary, median, std, minimum, maximum)
+        }
+    }
+
+
+@timed("pandas")
+def city_stats_from_frame(frame: pd.DataFrame) -> dict:
+    """Per-city statistics computed with pandas (same payload as ``city_stats``)."""
+    grouped = frame.groupby('city').agg(
+        id=('city', 'size'), salary=('salary', 'mean'), age=('age', 'mean')
+    )
+    return {
+        city: {'id': int(row.id), 'salary': round_value(row.salary), 'age': round_value(row.age)}
+        for city, row in grouped.iterrows()
+    }
+
+
+@timed("pandas")
+def age_range_stats_from_frame(frame: pd.DataFrame, ranges=AGE_RANGES) -> dict:
+    """Per-age-range statistics computed with pandas."""
+    result = {}
+    for range_name, (min_age, max_age) in ranges.items():
+        age_group = frame[(frame['age'] >= min_age) & (frame['age'] <= max_age)]
+        result[range_name] = {
+            'count': len(age_group),
+            'avg_salary': round_value(age_group['salary'].mean())
+        }
+    return result
+
+
+@timed("pandas")
+def salary_histogram_from_series(salaries: pd.Series, bins: int = HISTOGRAM_BINS,
+                                 bin_edges=None) -> dict:
+    """Salary histogram and summary statistics computed with pandas."""
+    salaries = salaries.dropna()
+    hist, edges = np.histogram(salaries, bins=bin_edges if bin_edges else bins)
+    return {
+        'counts': hist.tolist(),
+        'bin_edges': edges.tolist(),
+        'statistics': _salary_statistics(
+            salaries.mean(), salaries.median(), salaries.std(), salaries.min(), salaries.max()
+        )
+    }
+
+
+@timed("pandas")
+def summary_from_frame(frame: pd.DataFrame, ranges=AGE_RANGES, bins: int = HISTOGRAM_BINS,
+                       bin_edges=None) -> dict:
+    """All three analytics payloads from one DataFrame of city, age and salary."""
+    return {
+        'by_city': city_stats_from_frame(frame),
+        'by_age_range': age_range_stats_from_frame(frame, ranges),
+        'salary_histogram': salary_histogram_from_series(frame['salary'], bins, bin_edges)
+    }
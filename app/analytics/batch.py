@@ -0,0 +1,211 @@
+"""Many named analytics specs answered from one load of the users table.
+
+A spec is ``{"type": <kind>, **parameters}``, where the parameters are those
+of the matching single endpoint, including its user filters. The batch's own
+filters restrict the rows loaded. Only the columns the specs and their
+filters need are read, once, in typed chunks (see ``app.analytics.loader``).
+Each chunk gets every spec's extra filters applied in memory and is reduced
+into that spec's partial aggregate, so memory stays bounded by the chunk
+size. Large batches are reduced in parallel id-range shards. Specs are
+validated and evaluated one by one, so a bad spec yields an error entry
+instead of failing the batch.
+"""
+import pandas as pd
+from pydantic import ValidationError
+from sqlalchemy.orm import Session
+
+from app.analytics import aggregations
+from app.analytics.aggregations import age_ranges_from_edges
+from app.analytics.loader import COLUMNS, salary_bounds
+from app.analytics.parallel import reduce_chunks
+from app.analytics.partials import (AgeRangeAggregator, CityAggregator, SalaryAggregator,
+                                    SummaryAggregator)
+from app.config.database import offload
+from app.core.request_metrics import timed
+from app.models.filters import filter_user_frame
+from app.models.schemas import AgeRangeQuery, AnalyticsSummaryQuery, HistogramQuery, UserFilter
+
+
+def _by_city(frame, query):
+    return aggregations.city_stats_from_frame(frame)
+
+
+def _by_age_range(frame, query):
+    return aggregations.age_range_stats_from_frame(frame, age_ranges_from_edges(query.age_edges))
+
+
+def _salary_histogram(frame, query):
+    return aggregations.salary_histogram_from_series(frame['salary'], query.bins, query.bin_edges)
+
+
+def _summary(frame, query):
+    return aggregations.summary_from_frame(
+        frame, age_ranges_from_edges(query.age_edges), query.bins, query.bin_edges
+    )
+
+
+def _salary_aggregator(query, bounds) -> SalaryAggregator:
+    return SalaryAggregator.for_bounds(*bounds, query.bins, query.bin_edges)
+
+
+def _summary_aggregator(query, bounds) -> SummaryAggregator:
+    salary = _salary_aggregator(query, bounds)
+    return SummaryAggregator(age_ranges_from_edges(query.age_edges), salary.edges.tolist(), salary.clamp)
+
+
+# type -> (parameter model, columns read, evaluation over the filtered frame,
+#          partial aggregator given the query and its (min, max) salary)
+SPEC_TYPES = {
+    "by_city": (UserFilter, ("city", "age", "salary"), _by_city,
+                lambda query, bounds: CityAggregator()),
+    "by_age_range": (AgeRangeQuery, ("age", "salary"), _by_age_range,
+                     lambda query, bounds: AgeRangeAggregator(age_ranges_from_edges(query.age_edges))),
+    "salary_histogram": (HistogramQuery, ("salary",), _salary_histogram,
+                         _salary_aggregator),
+    "summary": (AnalyticsSummaryQuery, ("city", "age", "salary"), _summary, _summary_aggregator),
+}
+
+# Columns referenced by each UserFilter bound
+_FILTER_COLUMNS = {
+    "city": "city",
+    "min_age": "age", "max_age": "age",
+    "min_salary": "salary", "max_salary": "salary",
+    "joined_after": "join_date", "joined_before": "join_date",
+}
+
+
+class Spec:
+    """One validated spec, or the error that made it invalid."""
+
+    def __init__(self, name: str, raw):
+        self.name = name
+        self.type = raw.get("type") if isinstance(raw, dict) else None
+        self.query = None
+        self.error = None
+        if not isinstance(raw, dict):
+            self.error = {"message": "spec must be an object with a type"}
+            return
+        if self.type not in SPEC_TYPES:
+            self.error = {"message": f"type must be one of {', '.join(SPEC_TYPES)}"}
+            return
+        model = SPEC_TYPES[self.type][0]
+        parameters = {key: value for key, value in raw.items() if key != "type"}
+        unknown = sorted(set(parameters) - set(model.model_fields))
+        if unknown:
+            self.error = {"message": f"unknown parameters: {', '.join(unknown)}"}
+            return
+        try:
+            self.query = model.model_validate(parameters)
+        except ValidationError as error:
+            self.error = {
+                "message": "invalid parameters",
+                "details": error.errors(include_url=False, include_context=False),
+            }
+
+    def columns(self) -> set:
+        columns = set(SPEC_TYPES[self.type][1])
+        columns.update(
+            column for field, column in _FILTER_COLUMNS.items()
+            if getattr(self.query, field) is not None
+        )
+        return columns
+
+
+def parse_specs(raw_specs: dict) -> list:
+    return [Spec(name, raw) for name, raw in raw_specs.items()]
+
+
+def required_columns(specs: list) -> list:
+    """Columns to load for the valid specs, in table order."""
+    needed = set()
+    for spec in specs:
+        if spec.error is None:
+            needed |= spec.columns()
+    return [column for column in COLUMNS if column in needed]
+
+
+@timed("pandas")
+def evaluate(frame: pd.DataFrame, specs: list) -> dict:
+    """Results (or errors) of every spec over ``frame``, keyed by spec name."""
+    results = {}
+    for spec in specs:
+        if spec.error is not None:
+            results[spec.name] = {"type": spec.type, "error": spec.error}
+            continue
+        try:
+            rows = filter_user_frame(frame, spec.query)
+            result = SPEC_TYPES[spec.type][2](rows, spec.query)
+        except Exception as error:
+            results[spec.name] = {"type": spec.type, "error": {"message": str(error)}}
+            continue
+        results[spec.name] = {"type": spec.type, "result": result}
+    return {"rows": len(frame), "results": results}
+
+
+def _needs_bounds(spec: Spec) -> bool:
+    return spec.type in ("salary_histogram", "summary") and not spec.query.bin_edges
+
+
+class BatchAggregator:
+    """Partial aggregates of every valid spec, each over its own filtered rows.
+
+    Picklable, so the parallel engine can reduce id-range shards of the
+    batch in pool processes and merge them (see ``app.analytics.parallel``).
+    """
+
+    def __init__(self, specs: list, bounds: dict):
+        self.specs = specs
+        self.parts = {
+            spec.name: SPEC_TYPES[spec.type][3](spec.query, bounds.get(spec.name, (None, None)))
+            for spec in specs if spec.error is None
+        }
+        self.errors = {}
+        self.rows = 0
+
+    def add(self, frame: pd.DataFrame):
+        self.rows += len(frame)
+        for spec in self.specs:
+            if spec.name not in self.parts or spec.name in self.errors:
+                continue
+            try:
+                self.parts[spec.name].add(filter_user_frame(frame, spec.query))
+            except Exception as error:
+                self.errors[spec.name] = {"message": str(error)}
+
+    def merge(self, other: "BatchAggregator"):
+        self.rows += other.rows
+        for name, error in other.errors.items():
+            self.errors.setdefault(name, error)
+        for name, part in self.parts.items():
+            if name not in self.errors:
+                part.merge(other.parts[name])
+
+    def result(self) -> dict:
+        results = {}
+        for spec in self.specs:
+            error = spec.error or self.errors.get(spec.name)
+            if error is None:
+                try:
+                    results[spec.name] = {"type": spec.type, "result": self.parts[spec.name].result()}
+                    continue
+                except Exception as exc:
+                    error = {"message": str(exc)}
+            results[spec.name] = {"type": spec.type, "error": error}
+        return {"rows": self.rows, "results": results}
+
+
+def run(db: Session, specs: list, filters=None) -> dict:
+    """Stream the needed columns once and reduce every spec chunk by chunk."""
+    columns = required_columns(specs)
+    if not columns:
+        return evaluate(pd.DataFrame(), specs)
+
+    # Histogram edges come from each spec's salary range, all in one query
+    bounded = [spec for spec in specs if spec.error is None and _needs_bounds(spec)]
+    bounds = dict(zip(
+        (spec.name for spec in bounded),
+        salary_bounds(db, [spec.query for spec in bounded], filters)
+    ))
+    aggregator = reduce_chunks(db, BatchAggregator(specs, bounds), columns, filters)
+    with timed("pandas"):
+        return offload(aggregator.result)
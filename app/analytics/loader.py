@@ -0,0 +1,69 @@
+"""Column-pruned, typed, chunked reads of ``users`` for the pandas analytics.
+
+``iter_chunks`` selects only the requested columns and streams them through
+a server-side cursor as DataFrames of at most ANALYTICS_CHUNK_ROWS rows with
+compact dtypes. ``city`` is categorical. ``age`` uses the smallest integer
+type that holds it (``int8`` for real ages). ``salary`` becomes ``float32``
+only when every value survives the round trip. A 24-bit mantissa cannot
+hold six-figure salaries with cents, so those stay ``float64``. Consumers
+reduce each chunk to partial aggregates (see ``app.analytics.partials``),
+so peak memory is one chunk, whatever the table size.
+"""
+import numpy as np
+import pandas as pd
+from sqlalchemy import and_, case, func, select
+from sqlalchemy.orm import Session
+
+from app.config.settings import ANALYTICS_CHUNK_ROWS
+from app.core.request_metrics import count_rows
+from app.models.database import User
+from app.models.filters import user_filter_clauses
+
+COLUMNS = ("city", "age", "salary", "join_date")
+
+
+def _compact(frame: pd.DataFrame) -> pd.DataFrame:
+    """``frame`` with the compact dtype of each of its columns."""
+    columns = {}
+    for name in frame.columns:
+        values = frame[name]
+        if name == "city":
+            values = values.astype("category")
+        elif name == "age":
+            values = pd.to_numeric(values, downcast="integer")
+        elif name == "salary":
+            salaries = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            narrow = salaries.astype(np.float32)
+            values = narrow if np.array_equal(narrow, salaries, equal_nan=True) else salaries
+        else:
+            values = pd.to_datetime(values)
+        columns[name] = values
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def iter_chunks(db: Session, columns, filters=None, chunk_rows: int = ANALYTICS_CHUNK_ROWS,
+                clauses=()):
+    """Yield the given columns of the users matching ``filters`` (and any extra
+    ``clauses``) in DataFrame chunks."""
+    columns = [column for column in COLUMNS if column in columns]
+    statement = (
+        select(*(getattr(User, column) for column in columns))
+        .where(*user_filter_clauses(filters), *clauses)
+        .execution_options(stream_results=True)
+    )
+    for frame in pd.read_sql(statement, db.connection(), chunksize=chunk_rows):
+        count_rows(len(frame))
+        yield _compact(frame)
+
+
+def salary_bounds(db: Session, filter_sets: list, filters=None) -> list:
+    """``(min, max)`` salary for each filter set within ``filters``, from one query."""
+    if not filter_sets:
+        return []
+    columns = []
+    for filter_set in filter_sets:
+        clauses = user_filter_clauses(filter_set)
+        salary = case((and_(*clauses), User.salary)) if clauses else User.salary
+        columns += [func.min(salary), func.max(salary)]
+    row = db.execute(select(*columns).where(*user_filter_clauses(filters))).one()
+    return [(row[2 * index], row[2 * index + 1]) for index in range(len(filter_sets))]
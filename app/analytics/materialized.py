@@ -0,0 +1,220 @@
+"""Incrementally maintained analytics aggregates.
+
+Per-city and per-age count, sum and sum-of-squares plus a fixed-width salary
+histogram are kept in the ``analytics_*`` tables. ORM writes to ``User``
+update them inside the same transaction (see ``app.models.events``); bulk
+loads that bypass the session must be followed by ``rebuild``.
+"""
+import math
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import Integer, cast, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.analytics.aggregations import AGE_RANGES, HISTOGRAM_BINS, round_value, histogram_edges
+from app.config.settings import ANALYTICS_MATERIALIZED, ANALYTICS_SALARY_BIN_WIDTH
+from app.models.database import AgeAggregate, CityAggregate, SalaryBin, User
+from app.models.events import on_users_flushed
+
+_TABLES = {
+    CityAggregate: CityAggregate.city,
+    AgeAggregate: AgeAggregate.age,
+    SalaryBin: SalaryBin.bin,
+}
+
+# INSERT constructs with ON CONFLICT DO UPDATE, by dialect
+_UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def salary_bin(salary: float) -> int:
+    """Fine histogram bin for a salary (matches the SQL used by ``rebuild``)."""
+    return math.floor(salary / ANALYTICS_SALARY_BIN_WIDTH)
+
+
+def _salary_terms(salary) -> dict:
+    if salary is None:
+        return {'salary_count': 0, 'salary_sum': 0.0, 'salary_sumsq': 0.0}
+    return {'salary_count': 1, 'salary_sum': salary, 'salary_sumsq': salary * salary}
+
+
+def _contributions(values: dict):
+    """Yield ``(model, key, terms)`` for every aggregate row a user counts towards."""
+    salary, age, city = values['salary'], values['age'], values['city']
+    if city is not None:
+        terms = {'count': 1, **_salary_terms(salary)}
+        if age is None:
+            terms.update(age_count=0, age_sum=0.0, age_sumsq=0.0)
+        else:
+            terms.update(age_count=1, age_sum=age, age_sumsq=age * age)
+        yield CityAggregate, city, terms
+    if age is not None:
+        yield AgeAggregate, age, {'count': 1, **_salary_terms(salary)}
+    if salary is not None:
+        yield SalaryBin, salary_bin(salary), {
+            'count': 1, 'salary_sum': salary, 'salary_sumsq': salary * salary
+        }
+
+
+def apply_changes(connection, changes):
+    """Fold ``(old, new)`` user changes into the aggregate tables."""
+    deltas = defaultdict(lambda: defaultdict(int))
+    for old, new in changes:
+        for values, sign in ((old, -1), (new, 1)):
+            if values is None:
+                continue
+            for model, key, terms in _contributions(values):
+                delta = deltas[(model, key)]
+                for name, value in terms.items():
+                    delta[name] += sign * value
+
+    upsert = _UPSERTS[connection.dialect.name]
+    for (model, key), delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        key_column = _TABLES[model]
+        # One statement, so concurrent first writes to a key cannot both insert
+        connection.execute(
+            upsert(model)
+            .values({key_column.key: key, **delta})
+            .on_conflict_do_update(
+                index_elements=[key_column],
+                set_={name: getattr(model, name) + value for name, value in delta.items()}
+            )
+        )
+
+
+if ANALYTICS_MATERIALIZED:
+    on_users_flushed(apply_changes)
+
+
+def rebuild(db: Session):
+    """Recompute every aggregate table from ``users`` (recovery / after bulk loads)."""
+    for model in _TABLES:
+        db.query(model).delete(synchronize_session=False)
+
+    db.execute(insert(CityAggregate).from_select(
+        ['city', 'count', 'salary_count', 'salary_sum', 'salary_sumsq',
+         'age_count', 'age_sum', 'age_sumsq'],
+        select(
+            User.city,
+            func.count(),
+            func.count(User.salary),
+            func.coalesce(func.sum(User.salary), 0),
+            func.coalesce(func.sum(User.salary * User.salary), 0),
+            func.count(User.age),
+            func.coalesce(func.sum(User.age), 0),
+            func.coalesce(func.sum(User.age * User.age), 0)
+        ).where(User.city.isnot(None)).group_by(User.city)
+    ))
+    db.execute(insert(AgeAggregate).from_select(
+        ['age', 'count', 'salary_count', 'salary_sum', 'salary_sumsq'],
+        select(
+            User.age,
+            func.count(),
+            func.count(User.salary),
+            func.coalesce(func.sum(User.salary), 0),
+            func.coalesce(func.sum(User.salary * User.salary), 0)
+        ).where(User.age.isnot(None)).group_by(User.age)
+    ))
+    bin_expr = cast(func.floor(User.salary / ANALYTICS_SALARY_BIN_WIDTH), Integer)
+    db.execute(insert(SalaryBin).from_select(
+        ['bin', 'count', 'salary_sum', 'salary_sumsq'],
+        select(
+            bin_expr,
+            func.count(),
+            func.sum(User.salary),
+            func.sum(User.salary * User.salary)
+        ).where(User.salary.isnot(None)).group_by(bin_expr)
+    ))
+    db.commit()
+
+
+def city_stats(db: Session) -> dict:
+    """Same payload as ``aggregations.city_stats``, read from ``analytics_city``."""
+    rows = (
+        db.query(CityAggregate)
+        .filter(CityAggregate.count > 0)
+        .all()
+    )
+    return {
+        row.city: {
+            'id': int(row.count),
+            'salary': round_value(row.salary_sum / row.salary_count) if row.salary_count else None,
+            'age': round_value(row.age_sum / row.age_count) if row.age_count else None
+        }
+        for row in sorted(rows, key=lambda row: row.city)
+    }
+
+
+def age_range_stats(db: Session, ranges=AGE_RANGES) -> dict:
+    """Same payload as ``aggregations.age_range_stats``, read from ``analytics_age``."""
+    rows = db.query(AgeAggregate).filter(AgeAggregate.count > 0).all()
+    result = {}
+    for range_name, (min_age, max_age) in ranges.items():
+        in_range = [row for row in rows if min_age <= row.age <= max_age]
+        salary_count = sum(row.salary_count for row in in_range)
+        salary_sum = sum(row.salary_sum for row in in_range)
+        result[range_name] = {
+            'count': int(sum(row.count for row in in_range)),
+            'avg_salary': round_value(salary_sum / salary_count) if salary_count else None
+        }
+    return result
+
+
+def salary_histogram(db: Session, bins: int = HISTOGRAM_BINS, bin_edges=None) -> dict:
+    """Histogram payload estimated from the fine salary bins.
+
+    Count, mean and standard deviation are exact. Min, max and median are
+    estimated within one fine bin, and bin counts are placed by each fine
+    bin's mean, so they may differ from the exact histogram near edges.
+    """
+    rows = (
+        db.query(SalaryBin)
+        .filter(SalaryBin.count > 0)
+        .order_by(SalaryBin.bin)
+        .all()
+    )
+    counts = np.array([row.count for row in rows], dtype=np.int64)
+    total = int(counts.sum())
+    if total == 0:
+        edges = list(map(float, bin_edges)) if bin_edges else histogram_edges(None, None, bins)
+        return {
+            'counts': [0] * (len(edges) - 1),
+            'bin_edges': edges,
+            'statistics': {
+                'mean': None, 'median': None, 'std': None, 'min': None, 'max': None
+            }
+        }
+
+    sums = np.array([row.salary_sum for row in rows], dtype=np.float64)
+    sumsqs = np.array([row.salary_sumsq for row in rows], dtype=np.float64)
+    centers = sums / counts
+    mean = sums.sum() / total
+    std = None
+    if total > 1:
+        variance = (sumsqs.sum() - sums.sum() ** 2 / total) / (total - 1)
+        std = math.sqrt(max(variance, 0.0))
+
+    # Median: interpolate inside the fine bin holding the middle observation
+    cumulative = np.cumsum(counts)
+    target = total / 2
+    index = int(np.searchsorted(cumulative, target))
+    before = cumulative[index - 1] if index else 0
+    lower = rows[index].bin * ANALYTICS_SALARY_BIN_WIDTH
+    median = lower + (target - before) / counts[index] * ANALYTICS_SALARY_BIN_WIDTH
+
+    edges = list(map(float, bin_edges)) if bin_edges else histogram_edges(centers[0], centers[-1], bins)
+    hist, _ = np.histogram(centers, bins=edges, weights=counts)
+    return {
+        'counts': [int(value) for value in hist],
+        'bin_edges': edges,
+        'statistics': {
+            'mean': round_value(mean),
+            'median': round_value(median),
+            'std': round_value(std),
+            'min': round_value(centers[0]),
+            'max': round_value(centers[-1])
+        }
+    }
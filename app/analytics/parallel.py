@@ -0,0 +1,231 @@
+"""Process pool that reduces users to partial aggregates in id-range shards.
+
+``reduce_chunks`` folds the users matching some filters into an aggregator
+from ``app.analytics.partials`` (anything with ``add``/``merge``). Small
+scans, or ones with the pool disabled, run in the calling thread. Larger
+ones are split into one ``id`` range per pool process. Each process reads
+its range through its own connection, reduces it into a copy of the empty
+aggregator and sends the copy back, and the parent merges the results.
+
+Shards read in their own transactions, after the parent split the ids (and
+callers read salary bounds for histogram edges). The result therefore is
+not one snapshot: rows written meanwhile may be seen by one shard and not by
+another. No row is lost to the split, though: the first and last shard are
+open-ended, so rows inserted after it are read by the last shard, and
+aggregators built with data-derived edges count salaries that moved outside
+them in the end bins. Without concurrent writes the result is the same as
+a single-process scan. The pool uses the ``spawn`` start method, so no database connection or lock of
+the server process leaks into the workers. It is created once per server
+process and shared by every request.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from fastapi import HTTPException, status
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from app.analytics.loader import iter_chunks
+from app.config.database import _connect_args, offload
+from app.config.settings import (ANALYTICS_PARALLEL_MIN_ROWS, ANALYTICS_PARALLEL_TIMEOUT,
+                                 ANALYTICS_WORKERS)
+from app.core.metrics import register_stats
+from app.core.request_metrics import count_rows, timed
+from app.models.database import User
+from app.models.filters import user_filter_clauses
+
+logger = logging.getLogger(__name__)
+
+# Engines of a pool process, by database URL
+_engines = {}
+
+
+def _engine(url: str):
+    if url not in _engines:
+        _engines[url] = create_engine(
+            url, poolclass=NullPool, connect_args=_connect_args(url, is_async=False)
+        )
+    return _engines[url]
+
+
+def _reduce_shard(url: str, aggregator, columns, filters, lower: int, upper: int):
+    """Pool task: ``aggregator`` fed with the matching users in ``[lower, upper)``
+    (a None bound is open)."""
+    clauses = []
+    if lower is not None:
+        clauses.append(User.id >= lower)
+    if upper is not None:
+        clauses.append(User.id < upper)
+    rows = 0
+    with Session(_engine(url)) as db:
+        for chunk in iter_chunks(db, columns, filters, clauses=clauses):
+            rows += len(chunk)
+            aggregator.add(chunk)
+    return aggregator, rows
+
+
+def _warm_up():
+    return True
+
+
+def _worker_url(db: Session):
+    """URL pool processes connect to for ``db``'s database, or None if they cannot."""
+    url = db.get_bind().url
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return None
+    if url.get_driver_name() == "asyncpg":
+        # AsyncSession facades; the pool processes read synchronously
+        url = url.set(drivername="postgresql")
+    return url.render_as_string(hide_password=False)
+
+
+class AnalyticsPool:
+    """Lazily started process pool shared by all requests of a server process."""
+
+    def __init__(self, workers: int, timeout: float):
+        self.workers = workers
+        self.timeout = timeout
+        self._executor = None
+        self._lock = threading.Lock()
+        self.parallel_runs = 0
+        self.inline_runs = 0
+        self.shards = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        """A single process would only add overhead to the request thread."""
+        return self.workers > 1
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._executor
+
+    def start(self):
+        """Spawn the pool processes ahead of the first request."""
+        if self.enabled:
+            executor = self.executor()
+            for future in [executor.submit(_warm_up) for _ in range(self.workers)]:
+                future.result()
+
+    def stop(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def map(self, fn, tasks: list) -> list:
+        """Results of ``fn(*task)`` for every task, run in the pool processes.
+
+        Raises TimeoutError when the tasks take longer than ``timeout`` seconds
+        in total. The first failing task cancels the ones not started yet. A
+        pool whose process died, or that is still busy with timed-out tasks,
+        is replaced on the next call.
+        """
+        executor = self.executor()
+        futures = []
+        try:
+            futures = [executor.submit(fn, *task) for task in tasks]
+            done, pending = wait(futures, timeout=self.timeout, return_when=FIRST_EXCEPTION)
+            for future in done:
+                if future.exception() is not None:
+                    raise future.exception()
+            if pending:
+                raise TimeoutError(f"{len(pending)} of {len(futures)} tasks still running "
+                                   f"after {self.timeout:g}s")
+            return [future.result() for future in futures]
+        except (BrokenProcessPool, TimeoutError):
+            self._reset(executor)
+            raise
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "started": self._executor is not None,
+            "parallel_runs": self.parallel_runs,
+            "inline_runs": self.inline_runs,
+            "shards": self.shards,
+            "failures": self.failures,
+        }
+
+
+analytics_pool = AnalyticsPool(ANALYTICS_WORKERS, ANALYTICS_PARALLEL_TIMEOUT)
+if analytics_pool.enabled:
+    register_stats("analytics_pool", analytics_pool.stats)
+
+
+def _shards(db: Session, filters) -> list:
+    """``[lower, upper)`` id ranges splitting the matching users between the
+    pool processes, or an empty list when the scan is too small to split.
+
+    The first range has no lower bound and the last no upper bound, so rows
+    inserted after the split are not skipped."""
+    lowest, highest, rows = db.execute(
+        select(func.min(User.id), func.max(User.id), func.count()).where(*user_filter_clauses(filters))
+    ).one()
+    if rows < max(ANALYTICS_PARALLEL_MIN_ROWS, 2):
+        return []
+    count = min(analytics_pool.workers, highest - lowest + 1)
+    bounds = [lowest + (highest + 1 - lowest) * index // count for index in range(count + 1)]
+    bounds[0], bounds[-1] = None, None
+    return list(zip(bounds, bounds[1:]))
+
+
+def _reduce_inline(db: Session, aggregator, columns, filters):
+    analytics_pool.record(inline_runs=1)
+    for chunk in iter_chunks(db, columns, filters):
+        with timed("pandas"):
+            offload(aggregator.add, chunk)
+    return aggregator
+
+
+def reduce_chunks(db: Session, aggregator, columns, filters=None):
+    """``aggregator`` with the given columns of the users matching ``filters``
+    added, computed in parallel id-range shards when the pool is enabled."""
+    url = _worker_url(db) if analytics_pool.enabled else None
+    shards = _shards(db, filters) if url else []
+    if not shards:
+        return _reduce_inline(db, aggregator, columns, filters)
+
+    tasks = [(url, aggregator, columns, filters, lower, upper) for lower, upper in shards]
+    with timed("pandas"):
+        try:
+            results = offload(analytics_pool.map, _reduce_shard, tasks)
+        except BrokenProcessPool as error:
+            analytics_pool.record(failures=1)
+            logger.warning("Analytics pool failed (%s); reducing in the request thread", error)
+            return _reduce_inline(db, aggregator, columns, filters)
+        except TimeoutError:
+            analytics_pool.record(failures=1)
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Computation is taking too long, please retry shortly"
+            )
+        for shard, rows in results:
+            count_rows(rows)
+            aggregator.merge(shard)
+    analytics_pool.record(parallel_runs=1, shards=len(shards))
+    return aggregator
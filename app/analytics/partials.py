@@ -0,0 +1,232 @@
+"""Mergeable partial aggregates behind the chunked pandas analytics.
+
+Each aggregator takes DataFrame chunks with ``add`` and combines with
+another instance of itself through ``merge``. Its state stays small
+whatever the number of rows: per-group counts and sums, count/mean/M2 for
+the standard deviation (Chan et al.), histogram counts over fixed edges,
+and a median accumulator. ``result()`` returns the same payload as the
+matching ``*_from_frame`` function in ``app.analytics.aggregations``.
+"""
+import numpy as np
+import pandas as pd
+
+from app.analytics.aggregations import (AGE_RANGES, HISTOGRAM_BINS, _salary_statistics,
+                                        histogram_edges, round_value)
+from app.analytics.sketches import KLLSketch
+from app.config.settings import ANALYTICS_EXACT_MEDIAN_ROWS
+
+
+def _float64(series: pd.Series) -> np.ndarray:
+    """Non-null values as float64, so sums never accumulate in float32."""
+    values = series.to_numpy(dtype=np.float64, na_value=np.nan)
+    return values[~np.isnan(values)]
+
+
+class MedianAccumulator:
+    """Exact median of up to ``limit`` values, then a KLL sketch estimate."""
+
+    def __init__(self, limit: int = ANALYTICS_EXACT_MEDIAN_ROWS):
+        self.limit = limit
+        self.chunks = []
+        self.count = 0
+        self.sketch = None
+
+    def _spill(self):
+        self.sketch = KLLSketch()
+        for chunk in self.chunks:
+            self.sketch.update(chunk)
+        self.chunks = []
+
+    def add(self, values: np.ndarray):
+        if not len(values):
+            return
+        self.count += len(values)
+        if self.sketch is not None:
+            self.sketch.update(values)
+            return
+        self.chunks.append(values)
+        if self.count > self.limit:
+            self._spill()
+
+    def merge(self, other: "MedianAccumulator"):
+        if other.sketch is not None:
+            if self.sketch is None:
+                self._spill()
+            self.sketch.merge(other.sketch)
+            self.count += other.count
+            return
+        for values in other.chunks:
+            self.add(values)
+
+    @property
+    def exact(self) -> bool:
+        return self.sketch is None
+
+    def result(self):
+        if not self.count:
+            return None
+        if self.sketch is not None:
+            return self.sketch.quantiles([0.5])[0]
+        return float(np.median(np.concatenate(self.chunks)))
+
+
+class SalaryAggregator:
+    """Salary statistics and histogram counts over fixed ``edges``.
+
+    With ``clamp``, for edges derived from a salary range read before the
+    chunks, values outside the edges (rows changed after that read) are
+    counted in the first or last bin instead of being dropped.
+    """
+
+    def __init__(self, edges: list, clamp: bool = False):
+        self.edges = np.asarray(edges, dtype=np.float64)
+        self.clamp = clamp
+        self.counts = np.zeros(len(edges) - 1, dtype=np.int64)
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.median = MedianAccumulator()
+
+    @classmethod
+    def for_bounds(cls, minimum, maximum, bins: int = HISTOGRAM_BINS, bin_edges=None):
+        """Aggregator with the edges ``np.histogram`` derives from the data range
+        (clamping), or with the explicit ``bin_edges``."""
+        if bin_edges:
+            return cls(list(map(float, bin_edges)))
+        return cls(histogram_edges(minimum, maximum, bins), clamp=True)
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        if not count:
+            return
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+    def add(self, frame: pd.DataFrame):
+        values = _float64(frame["salary"])
+        if not len(values):
+            return
+        binned = np.clip(values, self.edges[0], self.edges[-1]) if self.clamp else values
+        self.counts += np.histogram(binned, bins=self.edges)[0]
+        mean = float(values.mean())
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()),
+                      float(values.min()), float(values.max()))
+        self.median.add(values)
+
+    def merge(self, other: "SalaryAggregator"):
+        self.counts += other.counts
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self.median.merge(other.median)
+
+    def result(self) -> dict:
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else None
+        return {
+            'counts': self.counts.tolist(),
+            'bin_edges': self.edges.tolist(),
+            'statistics': _salary_statistics(
+                self.mean if self.count else None, self.median.result(), std, self.min, self.max
+            )
+        }
+
+
+class CityAggregator:
+    """Row count and mean salary and age per city."""
+
+    _COLUMNS = ["rows", "salary_sum", "salary_count", "age_sum", "age_count"]
+
+    def __init__(self):
+        self.totals = pd.DataFrame(columns=self._COLUMNS, dtype=np.float64)
+
+    def add(self, frame: pd.DataFrame):
+        frame = frame[frame["city"].notna()]
+        parts = pd.DataFrame({
+            "city": frame["city"].astype(object),
+            "salary": frame["salary"].astype(np.float64),
+            "age": frame["age"].astype(np.float64),
+        })
+        grouped = parts.groupby("city").agg(
+            rows=("city", "size"),
+            salary_sum=("salary", "sum"), salary_count=("salary", "count"),
+            age_sum=("age", "sum"), age_count=("age", "count"),
+        ).astype(np.float64)
+        self.totals = grouped if self.totals.empty else self.totals.add(grouped, fill_value=0)
+
+    def merge(self, other: "CityAggregator"):
+        if not other.totals.empty:
+            self.totals = other.totals if self.totals.empty else self.totals.add(other.totals, fill_value=0)
+
+    def result(self) -> dict:
+        def mean(total, count):
+            return round_value(total / count) if count else None
+
+        return {
+            city: {
+                'id': int(row.rows),
+                'salary': mean(row.salary_sum, row.salary_count),
+                'age': mean(row.age_sum, row.age_count),
+            }
+            for city, row in self.totals.sort_index().iterrows()
+        }
+
+
+class AgeRangeAggregator:
+    """Row count and mean salary per age range."""
+
+    def __init__(self, ranges=AGE_RANGES):
+        self.ranges = ranges
+        self.rows = np.zeros(len(ranges), dtype=np.int64)
+        self.salary_sum = np.zeros(len(ranges))
+        self.salary_count = np.zeros(len(ranges), dtype=np.int64)
+
+    def add(self, frame: pd.DataFrame):
+        ages = frame["age"].to_numpy(dtype=np.float64, na_value=np.nan)
+        salaries = frame["salary"].to_numpy(dtype=np.float64, na_value=np.nan)
+        known = ~np.isnan(salaries)
+        for index, (min_age, max_age) in enumerate(self.ranges.values()):
+            in_range = (ages >= min_age) & (ages <= max_age)
+            self.rows[index] += int(in_range.sum())
+            self.salary_sum[index] += float(salaries[in_range & known].sum())
+            self.salary_count[index] += int((in_range & known).sum())
+
+    def merge(self, other: "AgeRangeAggregator"):
+        self.rows += other.rows
+        self.salary_sum += other.salary_sum
+        self.salary_count += other.salary_count
+
+    def result(self) -> dict:
+        return {
+            range_name: {
+                'count': int(self.rows[index]),
+                'avg_salary': (round_value(self.salary_sum[index] / self.salary_count[index])
+                               if self.salary_count[index] else None)
+            }
+            for index, range_name in enumerate(self.ranges)
+        }
+
+
+class SummaryAggregator:
+    """City, age range and salary partials in one pass."""
+
+    def __init__(self, ranges, edges: list, clamp: bool = False):
+        self.parts = {
+            'by_city': CityAggregator(),
+            'by_age_range': AgeRangeAggregator(ranges),
+            'salary_histogram': SalaryAggregator(edges, clamp),
+        }
+
+    def add(self, frame: pd.DataFrame):
+        for part in self.parts.values():
+            part.add(frame)
+
+    def merge(self, other: "SummaryAggregator"):
+        for name, part in self.parts.items():
+            part.merge(other.parts[name])
+
+    def result(self) -> dict:
+        return {name: part.result() for name, part in self.parts.items()}
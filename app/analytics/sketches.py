@@ -0,0 +1,247 @@
+"""Mergeable quantile sketches over User.salary and User.age.
+
+A KLL sketch keeps a bounded number of samples in levels of compactors,
+where an item at level ``h`` stands for ``2**h`` observations. Sketches of
+disjoint data (shards, time windows, cities) merge into a sketch of their
+union with the same error guarantee. They answer any quantile in time that
+depends only on ``k``, not on the number of users.
+"""
+import math
+import threading
+from time import monotonic
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config.database import offload
+from app.config.settings import ANALYTICS_COMPUTE_TIMEOUT, SKETCH_K, SKETCH_REBUILD_INTERVAL
+from app.core.metrics import register_stats
+from app.core.singleflight import SingleFlight
+from app.models.database import User
+from app.models.events import on_users_committed
+
+SKETCH_COLUMNS = ("salary", "age")
+
+_BUILD_BATCH_SIZE = 10000
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang & Liberty) over floats."""
+
+    def __init__(self, k: int = SKETCH_K, c: float = 2 / 3, seed=None):
+        self.k = k
+        self.c = c
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self.compactors = [np.empty(0)]
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.compactors) - level - 1
+        return max(int(math.ceil(self.k * self.c ** depth)), 2)
+
+    def _size(self) -> int:
+        return sum(len(items) for items in self.compactors)
+
+    def _max_size(self) -> int:
+        return sum(self._capacity(level) for level in range(len(self.compactors)))
+
+    def _compress(self):
+        while self._size() >= self._max_size():
+            for level, items in enumerate(self.compactors):
+                if len(items) >= self._capacity(level):
+                    if level + 1 == len(self.compactors):
+                        self.compactors.append(np.empty(0))
+                    items = np.sort(items)
+                    # An odd leftover stays behind; the rest is halved at random
+                    keep = items[-1:] if len(items) % 2 else items[:0]
+                    paired = items[:len(items) - len(keep)]
+                    promoted = paired[int(self._rng.integers(2))::2]
+                    self.compactors[level] = keep
+                    self.compactors[level + 1] = np.concatenate([self.compactors[level + 1], promoted])
+                    if self._size() < self._max_size():
+                        break
+
+    def update(self, values):
+        """Add one value or an array of values (NaNs are ignored)."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return
+        self.count += len(values)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self._compress()
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """Fold another sketch into this one in place and return self."""
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0))
+        for level, items in enumerate(other.compactors):
+            self.compactors[level] = np.concatenate([self.compactors[level], items])
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, fractions) -> list:
+        """Estimated values at the given fractions in [0, 1] (None when empty)."""
+        if not self.count:
+            return [None for _ in fractions]
+        values = np.concatenate(self.compactors)
+        weights = np.concatenate([
+            np.full(len(items), 2 ** level, dtype=np.float64)
+            for level, items in enumerate(self.compactors)
+        ])
+        order = np.argsort(values, kind="stable")
+        values, cumulative = values[order], np.cumsum(weights[order])
+        total = cumulative[-1]
+        result = []
+        for fraction in fractions:
+            if fraction <= 0:
+                result.append(self.min)
+            elif fraction >= 1:
+                result.append(self.max)
+            else:
+                index = int(np.searchsorted(cumulative, fraction * total))
+                result.append(float(values[min(index, len(values) - 1)]))
+        return result
+
+    def rank_error(self) -> float:
+        """Approximate normalized rank error (DataSketches' empirical fit for KLL)."""
+        return 2.296 / self.k ** 0.9723
+
+    def to_dict(self) -> dict:
+        """JSON-serializable form, so sketches can be shipped and merged elsewhere."""
+        return {
+            "k": self.k,
+            "c": self.c,
+            "count": self.count,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+            "compactors": [items.tolist() for items in self.compactors],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "KLLSketch":
+        sketch = cls(k=data["k"], c=data["c"])
+        sketch.count = data["count"]
+        if sketch.count:
+            sketch.min, sketch.max = data["min"], data["max"]
+        sketch.compactors = [np.asarray(items, dtype=np.float64) for items in data["compactors"]]
+        return sketch
+
+
+class SketchStore:
+    """Per-city and global sketches for every column in ``SKETCH_COLUMNS``.
+
+    Built with one streaming scan on first use. Committed inserts are added
+    incrementally; updates and deletes cannot be removed from a KLL sketch,
+    so they mark the store stale and it is rebuilt on the next read once
+    ``SKETCH_REBUILD_INTERVAL`` seconds have passed since the last build.
+    Concurrent readers share one rebuild, which runs without the lock and is
+    swapped in when done.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._rebuilds = SingleFlight(timeout=ANALYTICS_COMPUTE_TIMEOUT)
+        self._sketches = None
+        self._built_at = None
+        self._stale = False
+        # Commits seen so far, to tell whether any landed during a rebuild
+        self._commits = 0
+        self.builds = 0
+
+    def _build(self, db: Session) -> dict:
+        sketches = {}
+        statement = (
+            select(User.city, User.salary, User.age)
+            .execution_options(yield_per=_BUILD_BATCH_SIZE)
+        )
+        for partition in db.execute(statement).partitions():
+            offload(_add_rows, sketches, partition)
+        return sketches
+
+    def _expired(self) -> bool:
+        with self._lock:
+            if self._sketches is None:
+                return True
+            return self._stale and monotonic() - self._built_at >= SKETCH_REBUILD_INTERVAL
+
+    async def _rebuild(self, run):
+        with self._lock:
+            commits = self._commits
+        sketches = await run(self._build)
+        with self._lock:
+            self._sketches = sketches
+            self._built_at = monotonic()
+            # The scan may have missed users committed while it ran
+            self._stale = self._commits != commits
+            self.builds += 1
+
+    async def sketches(self, run) -> dict:
+        """Current sketches keyed by ``(column, city)``; ``city`` None is global.
+
+        ``run`` is ``run_in_read_session`` or another ``run_db``-like function
+        used for the scan when the sketches have to be (re)built.
+        """
+        if self._expired():
+            await self._rebuilds.do("build", lambda: self._rebuild(run))
+        with self._lock:
+            return self._sketches
+
+    def apply_changes(self, changes):
+        """Session commit hook: add inserted users, mark the store stale otherwise."""
+        with self._lock:
+            self._commits += 1
+            if self._sketches is None:
+                return
+            inserted = [new for old, new in changes if old is None]
+            if len(inserted) < len(changes):
+                self._stale = True
+            _add_rows(
+                self._sketches,
+                [(row["city"], row["salary"], row["age"]) for row in inserted]
+            )
+
+    def stats(self) -> dict:
+        return {
+            "built": self._sketches is not None,
+            "stale": self._stale,
+            "builds": self.builds,
+            "sketches": len(self._sketches or {}),
+        }
+
+
+def _add_rows(sketches: dict, rows):
+    """Update global and per-city sketches with ``(city, salary, age)`` rows."""
+    if not rows:
+        return
+    cities = np.array([row[0] for row in rows], dtype=object)
+    for position, column in enumerate(SKETCH_COLUMNS, start=1):
+        values = np.array([row[position] for row in rows], dtype=np.float64)
+        sketches.setdefault((column, None), KLLSketch()).update(values)
+        for city in set(cities.tolist()):
+            if city is not None:
+                sketches.setdefault((column, city), KLLSketch()).update(values[cities == city])
+
+
+def merged(sketches: dict, column: str, cities=None) -> KLLSketch:
+    """One sketch for ``column`` over the given cities (all users when None)."""
+    if not cities:
+        return sketches.get((column, None)) or KLLSketch()
+    result = KLLSketch()
+    for city in cities:
+        if (column, city) in sketches:
+            result.merge(sketches[(column, city)])
+    return result
+
+
+sketch_store = SketchStore()
+on_users_committed(sketch_store.apply_changes)
+register_stats("quantile_sketches", sketch_store.stats)
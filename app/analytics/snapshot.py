@@ -0,0 +1,220 @@
+"""Versioned Arrow IPC snapshots of the columns analytics needs from ``users``.
+
+A background job writes ``users-<ms>.arrow`` files, named after the moment
+the snapshot was read from the database, into ANALYTICS_SNAPSHOT_DIR. Files
+are written under a temporary name and renamed, so readers, including other
+worker processes sharing the directory, only ever see complete snapshots.
+Readers memory-map the newest file; the Arrow buffers are used in place and
+the DataFrame built over them is kept per version, so analytics requests
+neither query Postgres nor rebuild a frame.
+"""
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config.database import offload
+from app.config.settings import (ANALYTICS_SNAPSHOT, ANALYTICS_SNAPSHOT_DIR,
+                                 ANALYTICS_SNAPSHOT_INTERVAL, ANALYTICS_SNAPSHOT_MAX_AGE)
+from app.core.metrics import register_stats
+from app.models.database import User
+from app.models.events import on_users_committed
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_COLUMNS = ("city", "age", "salary", "join_date")
+
+_FILE_PATTERN = re.compile(r"^users-(\d+)\.arrow$")
+_BATCH_SIZE = 50000
+_KEEP = 2
+
+
+def _schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ("city", pa.string()),
+        ("age", pa.int32()),
+        ("salary", pa.float64()),
+        ("join_date", pa.timestamp("us")),
+    ])
+
+
+def _write_batch(writer, schema, frame):
+    import pyarrow as pa
+
+    # pyarrow converts the chunk to the snapshot schema, dropping the pandas index
+    writer.write_batch(pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False))
+
+
+class Snapshot:
+    """One memory-mapped snapshot file."""
+
+    def __init__(self, path: str, version: int):
+        import pyarrow as pa
+
+        self.path = path
+        self.version = version
+        self.table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        self._frame = None
+        self._lock = threading.Lock()
+
+    @property
+    def age(self) -> float:
+        """Seconds since the data was read from the database."""
+        return max(time.time() - self.version / 1000, 0.0)
+
+    def frame(self):
+        """pandas view of the snapshot (numeric columns share the mapped buffers)."""
+        with self._lock:
+            if self._frame is None:
+                self._frame = self.table.to_pandas(split_blocks=True)
+            return self._frame
+
+    def headers(self) -> dict:
+        return {
+            "X-Data-Source": "snapshot",
+            "X-Snapshot-Version": str(self.version),
+            "X-Snapshot-Age": f"{self.age:.0f}",
+        }
+
+
+class SnapshotStore:
+    """Writes snapshots and serves the newest one from ``directory``."""
+
+    def __init__(self, directory: str, max_age: float):
+        self.directory = directory
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._current = None
+        self._dirty = True
+        self._task = None
+        self.writes = 0
+        self.rows_written = 0
+        self.last_write_seconds = None
+
+    def _versions(self) -> list:
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(
+            (int(match.group(1)), os.path.join(self.directory, name))
+            for name in names if (match := _FILE_PATTERN.match(name))
+        )
+
+    def mark_dirty(self, changes=None):
+        """Session commit hook: users changed, so the next run rewrites the snapshot."""
+        self._dirty = True
+
+    def write(self, db: Session) -> int:
+        """Stream ``users`` into a new snapshot file and return its version."""
+        import pyarrow as pa
+
+        self._dirty = False
+        started = time.perf_counter()
+        version = time.time_ns() // 1_000_000
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"users-{version}.arrow")
+        temporary = f"{path}.{os.getpid()}.tmp"
+
+        schema = _schema()
+        statement = (
+            select(*(getattr(User, column) for column in SNAPSHOT_COLUMNS))
+            .execution_options(stream_results=True)
+        )
+        rows = 0
+        try:
+            with pa.OSFile(temporary, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+                for frame in pd.read_sql(statement, db.connection(), chunksize=_BATCH_SIZE):
+                    offload(_write_batch, writer, schema, frame)
+                    rows += len(frame)
+            os.replace(temporary, path)
+        except BaseException:
+            self._dirty = True
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+        for _, old_path in self._versions()[:-_KEEP]:
+            try:
+                os.remove(old_path)
+            except FileNotFoundError:
+                pass
+        self.writes += 1
+        self.rows_written = rows
+        self.last_write_seconds = round(time.perf_counter() - started, 3)
+        return version
+
+    def current(self):
+        """Newest snapshot no older than ``max_age``, or None."""
+        versions = self._versions()
+        if not versions:
+            return None
+        version, path = versions[-1]
+        with self._lock:
+            if self._current is None or self._current.version != version:
+                self._current = Snapshot(path, version)
+            snapshot = self._current
+        if self.max_age and snapshot.age > self.max_age:
+            return None
+        return snapshot
+
+    def needs_write(self) -> bool:
+        """Whether users changed here or the newest snapshot is due a refresh."""
+        versions = self._versions()
+        if not versions:
+            return True
+        age = time.time() - versions[-1][0] / 1000
+        if self.max_age and age >= self.max_age:
+            return True
+        return self._dirty and age >= ANALYTICS_SNAPSHOT_INTERVAL
+
+    async def _run(self, run_in_session):
+        while True:
+            if self.needs_write():
+                try:
+                    await run_in_session(self.write)
+                except Exception:
+                    logger.exception("Users snapshot failed")
+            await asyncio.sleep(ANALYTICS_SNAPSHOT_INTERVAL)
+
+    def start(self, run_in_session):
+        """Start the periodic snapshot job; ``run_in_session(fn)`` supplies the session."""
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise RuntimeError(
+                "ANALYTICS_SNAPSHOT=true needs the pyarrow package (pip install pyarrow)"
+            ) from None
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(run_in_session))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        versions = self._versions()
+        return {
+            "directory": self.directory,
+            "latest_version": versions[-1][0] if versions else None,
+            "age_seconds": round(time.time() - versions[-1][0] / 1000, 3) if versions else None,
+            "dirty": self._dirty,
+            "writes": self.writes,
+            "rows_written": self.rows_written,
+            "last_write_seconds": self.last_write_seconds,
+        }
+
+
+users_snapshot = SnapshotStore(ANALYTICS_SNAPSHOT_DIR, max_age=ANALYTICS_SNAPSHOT_MAX_AGE)
+if ANALYTICS_SNAPSHOT:
+    on_users_committed(users_snapshot.mark_dirty)
+    register_stats("users_snapshot", users_snapshot.stats)
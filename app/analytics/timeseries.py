@@ -0,0 +1,370 @@
+"""Signups and salary over ``User.join_date`` in day, week or month buckets.
+
+Both series are derived from per-bucket partials: signups, non-null salaries
+and salary sum per city. On PostgreSQL they come from ``date_trunc`` grouped in the database;
+elsewhere pandas buckets the ``join_date`` column with NumPy. Weeks start on
+Monday, like ``date_trunc('week', ...)``. ``join_date`` holds naive UTC, so
+buckets are UTC days, weeks and months.
+
+A bucket is closed once the current time is past its end. Closed buckets can
+only change through writes to ``users``, so their partials are kept until a
+committed change touches them, and a request only queries the open bucket
+and closed buckets it has not seen yet, each run with a ``join_date`` range
+scan. Bulk loads from other processes (``python -m app.cli seed``) bypass
+the commit hook and are picked up after a restart.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+import numpy as np
+import orjson
+import pandas as pd
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.analytics.aggregations import round_value
+from app.analytics.loader import iter_chunks
+from app.config.settings import TIMESERIES_CACHE_SERIES, TIMESERIES_MAX_BUCKETS
+from app.core.metrics import register_stats
+from app.core.request_metrics import timed
+from app.models.database import User, utc_now
+from app.models.events import on_users_committed
+from app.models.filters import _naive_utc, user_filter_clauses
+from app.models.schemas import UserFilter
+
+INTERVALS = ("day", "week", "month")
+
+# Filter fields that select users within each bucket (join date bounds pick the buckets)
+_SERIES_FILTERS = tuple(name for name in UserFilter.model_fields
+                        if name not in ("joined_after", "joined_before"))
+
+
+class TooManyBuckets(ValueError):
+    """The requested window spans more than TIMESERIES_MAX_BUCKETS buckets."""
+
+
+def bucket_start(value: datetime, interval: str) -> datetime:
+    """Start of the bucket containing ``value``."""
+    day = datetime(value.year, value.month, value.day)
+    if interval == "day":
+        return day
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def next_bucket(start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        return start + timedelta(days=1)
+    if interval == "week":
+        return start + timedelta(weeks=1)
+    return start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+
+
+def previous_bucket(start: datetime, interval: str) -> datetime:
+    return bucket_start(start - timedelta(days=1), interval)
+
+
+def bucket_range(first: datetime, last: datetime, interval: str) -> list:
+    """Bucket starts from ``first`` to ``last`` inclusive."""
+    buckets = []
+    start = first
+    while start <= last:
+        buckets.append(start)
+        if len(buckets) > TIMESERIES_MAX_BUCKETS:
+            raise TooManyBuckets(
+                f"The window spans more than {TIMESERIES_MAX_BUCKETS} {interval} buckets"
+            )
+        start = next_bucket(start, interval)
+    return buckets
+
+
+def _bucket_array(join_dates: np.ndarray, interval: str) -> np.ndarray:
+    """Vectorized ``bucket_start`` over a datetime64 array."""
+    days = join_dates.astype("datetime64[D]")
+    if interval == "day":
+        return days.astype("datetime64[us]")
+    if interval == "week":
+        # 1970-01-01 was a Thursday: shift by 3 so Monday has offset 0
+        offsets = (days.astype(np.int64) + 3) % 7
+        return (days - offsets.astype("timedelta64[D]")).astype("datetime64[us]")
+    return join_dates.astype("datetime64[M]").astype("datetime64[us]")
+
+
+def _partials_from_frame(frame: pd.DataFrame, interval: str) -> dict:
+    """``{bucket: {city: [signups, salary_count, salary_sum]}}`` from join_date, city and salary."""
+    if frame.empty:
+        return {}
+    frame = frame.assign(
+        bucket=_bucket_array(pd.to_datetime(frame["join_date"]).to_numpy(), interval),
+        city=frame["city"].astype(object).fillna(""),
+        salary=frame["salary"].astype(np.float64),
+    )
+    grouped = frame.groupby(["bucket", "city"]).agg(
+        signups=("salary", "size"), salary_count=("salary", "count"), salary=("salary", "sum")
+    )
+    partials = {}
+    for (bucket, city), row in grouped.iterrows():
+        partials.setdefault(bucket.to_pydatetime(), {})[city or None] = [
+            int(row.signups), int(row.salary_count), float(row.salary)
+        ]
+    return partials
+
+
+def _merge_partials(partials: dict, other: dict):
+    """Add the counts and salary sums of ``other`` into ``partials``."""
+    for start, cities in other.items():
+        bucket = partials.setdefault(start, {})
+        for city, values in cities.items():
+            current = bucket.setdefault(city, [0, 0, 0.0])
+            for index, value in enumerate(values):
+                current[index] += value
+
+
+def _query_partials(db: Session, interval: str, filters, lower: datetime, upper: datetime) -> dict:
+    """Partials of the buckets in ``[lower, upper)``."""
+    window = [User.join_date >= lower, User.join_date < upper]
+    if db.get_bind().dialect.name != "postgresql":
+        partials = {}
+        for chunk in iter_chunks(db, ["join_date", "city", "salary"], filters, clauses=window):
+            with timed("pandas"):
+                _merge_partials(partials, _partials_from_frame(chunk, interval))
+        return partials
+
+    clauses = [*user_filter_clauses(filters), *window]
+
+    bucket = func.date_trunc(interval, User.join_date).label("bucket")
+    rows = (
+        db.query(bucket, User.city, func.count(), func.count(User.salary), func.sum(User.salary))
+        .filter(*clauses)
+        .group_by(bucket, User.city)
+        .all()
+    )
+    partials = {}
+    for start, city, signups, salary_count, salary_sum in rows:
+        partials.setdefault(start, {})[city] = [signups, salary_count, float(salary_sum or 0)]
+    return partials
+
+
+class BucketStore:
+    """Partials of closed buckets per series (interval and non-date filters)."""
+
+    def __init__(self, max_series: int):
+        self.max_series = max_series
+        self._series = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; results computed across one are not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+
+    def _get_series(self, key) -> dict:
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = {"buckets": {}, "before": {}}
+            while len(self._series) > self.max_series:
+                self._series.popitem(last=False)
+        self._series.move_to_end(key)
+        return series
+
+    def lookup(self, key, buckets: list) -> tuple:
+        """Cached partials for ``buckets`` and the current generation."""
+        with self._lock:
+            cached = self._get_series(key)["buckets"]
+            found = {bucket: cached[bucket] for bucket in buckets if bucket in cached}
+            self.hits += len(found)
+            self.misses += len(buckets) - len(found)
+            return found, self._generation
+
+    def store(self, key, generation: int, partials: dict, before: dict = None):
+        with self._lock:
+            if generation != self._generation:
+                return
+            series = self._get_series(key)
+            series["buckets"].update(partials)
+            series["before"].update(before or {})
+
+    def headcount_before(self, key, start: datetime):
+        with self._lock:
+            return self._get_series(key)["before"].get(start)
+
+    def apply_changes(self, changes):
+        """Session commit hook: drop the buckets and headcounts the changed users fall in."""
+        dates = {
+            values["join_date"] for pair in changes for values in pair
+            if values is not None and values.get("join_date") is not None
+        }
+        if not dates:
+            return
+        earliest = min(dates)
+        with self._lock:
+            self._generation += 1
+            for (interval, _), series in self._series.items():
+                for date in dates:
+                    if series["buckets"].pop(bucket_start(date, interval), None) is not None:
+                        self.invalidated += 1
+                series["before"] = {
+                    start: count for start, count in series["before"].items() if start <= earliest
+                }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "series": len(self._series),
+                "buckets": sum(len(series["buckets"]) for series in self._series.values()),
+                "bucket_hits": self.hits,
+                "bucket_misses": self.misses,
+                "invalidated": self.invalidated,
+            }
+
+
+bucket_store = BucketStore(TIMESERIES_CACHE_SERIES)
+on_users_committed(bucket_store.apply_changes)
+register_stats("timeseries_buckets", bucket_store.stats)
+
+
+def _series_filters(filters):
+    """The filters without join date bounds, which only choose the buckets."""
+    if filters is None:
+        return None
+    return UserFilter(**{name: getattr(filters, name) for name in _SERIES_FILTERS})
+
+
+def _series_key(interval: str, filters) -> tuple:
+    values = {name: getattr(filters, name, None) for name in _SERIES_FILTERS}
+    return interval, orjson.dumps(values, option=orjson.OPT_SORT_KEYS).decode()
+
+
+def _runs(buckets: list, interval: str) -> list:
+    """Group sorted bucket starts into ``(lower, upper)`` ranges of consecutive buckets."""
+    runs = []
+    for bucket in buckets:
+        if runs and runs[-1][1] == bucket:
+            runs[-1][1] = next_bucket(bucket, interval)
+        else:
+            runs.append([bucket, next_bucket(bucket, interval)])
+    return runs
+
+
+def _partials(db: Session, interval: str, filters, buckets: list, now: datetime) -> tuple:
+    """Partials for ``buckets`` (closed ones from the store) and the store generation."""
+    key = _series_key(interval, filters)
+    open_from = bucket_start(now, interval)
+    closed = [bucket for bucket in buckets if bucket < open_from]
+    partials, generation = bucket_store.lookup(key, closed)
+    missing = [bucket for bucket in buckets if bucket not in partials]
+    fresh = {}
+    for lower, upper in _runs(missing, interval):
+        fresh.update(_query_partials(db, interval, filters, lower, upper))
+    computed = {bucket: fresh.get(bucket, {}) for bucket in missing}
+    bucket_store.store(key, generation, {
+        bucket: values for bucket, values in computed.items() if bucket < open_from
+    })
+    partials.update(computed)
+    return partials, generation
+
+
+def _headcount_before(db: Session, interval: str, filters, start: datetime, now: datetime,
+                      generation: int) -> int:
+    """Users matching ``filters`` who joined before ``start``."""
+    key = _series_key(interval, filters)
+    count = bucket_store.headcount_before(key, start)
+    if count is None:
+        count = (
+            db.query(func.count())
+            .select_from(User)
+            .filter(*user_filter_clauses(filters), User.join_date < start)
+            .scalar()
+        )
+        if start <= bucket_start(now, interval):
+            bucket_store.store(key, generation, {}, before={start: count})
+    return count
+
+
+def _window(db: Session, interval: str, filters, now: datetime, lookback: int = 0):
+    """Requested bucket starts, and the earlier ``lookback`` buckets to read as well."""
+    joined_after = _naive_utc(filters.joined_after) if filters else None
+    joined_before = _naive_utc(filters.joined_before) if filters else None
+    if joined_after is None:
+        joined_after = (
+            db.query(func.min(User.join_date))
+            .filter(*user_filter_clauses(_series_filters(filters)))
+            .scalar()
+        )
+        if joined_after is None:
+            return [], []
+    first = bucket_start(joined_after, interval)
+    last = bucket_start(joined_before or now, interval)
+    buckets = bucket_range(first, last, interval)
+    earlier = []
+    for _ in range(lookback):
+        first = previous_bucket(first, interval)
+        earlier.insert(0, first)
+    return earlier, buckets
+
+
+def signups(db: Session, interval: str = "month", filters=None, now: datetime = None) -> dict:
+    """Signups per bucket and cumulative headcount at the end of each bucket.
+
+    The ``joined_after``/``joined_before`` bounds select whole buckets; the
+    window defaults to the first signup up to now.
+    """
+    now = now or utc_now()
+    _, buckets = _window(db, interval, filters, now)
+    if not buckets:
+        return {'interval': interval, 'buckets': []}
+    filters = _series_filters(filters)
+    partials, generation = _partials(db, interval, filters, buckets, now)
+    headcount = _headcount_before(db, interval, filters, buckets[0], now, generation)
+    result = []
+    for bucket in buckets:
+        count = sum(values[0] for values in partials[bucket].values())
+        headcount += count
+        result.append({'start': bucket.isoformat(), 'signups': count, 'headcount': headcount})
+    return {'interval': interval, 'buckets': result}
+
+
+def rolling_salary(db: Session, interval: str = "month", window: int = 3, filters=None,
+                   now: datetime = None) -> dict:
+    """Average salary per city of each bucket's signups and over the trailing ``window`` buckets.
+
+    Averages are over the signups with a salary; users without one only count as signups.
+    """
+    now = now or utc_now()
+    earlier, buckets = _window(db, interval, filters, now, lookback=window - 1)
+    if not buckets:
+        return {'interval': interval, 'window': window, 'cities': {}}
+    filters = _series_filters(filters)
+    partials, _ = _partials(db, interval, filters, earlier + buckets, now)
+    cities = sorted({city for values in partials.values() for city in values if city is not None})
+
+    with timed("pandas"):
+        index = earlier + buckets
+        values = np.array([[partials[bucket].get(city, (0, 0, 0.0)) for city in cities]
+                           for bucket in index], dtype=np.float64).reshape(len(index), len(cities), 3)
+        counts, salary_counts, sums = values[..., 0], values[..., 1], values[..., 2]
+        rolling_counts = pd.DataFrame(salary_counts).rolling(window, min_periods=1).sum().to_numpy()
+        rolling_sums = pd.DataFrame(sums).rolling(window, min_periods=1).sum().to_numpy()
+        with np.errstate(invalid="ignore", divide="ignore"):
+            average = sums / salary_counts
+            rolling_average = rolling_sums / rolling_counts
+
+    offset = len(earlier)
+    return {
+        'interval': interval,
+        'window': window,
+        'cities': {
+            city: [
+                {
+                    'start': bucket.isoformat(),
+                    'signups': int(counts[offset + row, column]),
+                    'avg_salary': round_value(average[offset + row, column]),
+                    'rolling_avg_salary': round_value(rolling_average[offset + row, column])
+                }
+                for row, bucket in enumerate(buckets)
+            ]
+            for column, city in enumerate(cities)
+        }
+    }
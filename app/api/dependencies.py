@@ -1,33 +1,102 @@
-from fastapi import Depends, HTTPException, status
+import secrets
+import time
+
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from sqlalchemy.orm import Session
 
-from app.config.database import get_db
-from app.config.settings import SECRET_KEY, ALGORITHM
+from app.config.database import (close_session, open_read_session, read_router, route_name,
+                                 run_db, session_holds)
+from app.config.settings import METRICS_TOKEN
+from app.core.principals import Principal, embedded_principal, principal_cache
+from app.core.request_metrics import timed
+from app.core.tokens import token_digest, verify_token
 from app.models.database import Account
+from app.models.events import on_users_committed
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), 
-    db: Session = Depends(get_db)
-):
-    """Get current user from JWT token."""
-    credentials_exception = HTTPException(
+# Shared analytics results must not be computed from a replica that has not
+# replayed the latest users change yet
+on_users_committed(read_router.hold_primary)
+
+def _token_subject(request: Request):
+    """Unverified ``sub`` of the bearer token, used only to route reads."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        with timed("jwt"):
+            return jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+
+async def get_read_db(request: Request):
+    """Read-only session dependency, served by a read replica when configured.
+
+    Clients that wrote recently are kept on the primary (read-your-writes).
+    """
+    with session_holds.timer(route_name(request)):
+        db = await open_read_session(_token_subject(request))
+        try:
+            yield db
+        finally:
+            await close_session(db)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _verified_claims(token: str) -> dict:
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
+        claims = verify_token(token)
     except JWTError:
-        raise credentials_exception
-    
-    user = db.query(Account).filter(Account.username == username).first()
+        raise _credentials_exception()
+    if claims.get("sub") is None:
+        raise _credentials_exception()
+    return claims
+
+async def _load_principal(token: str, claims: dict) -> Principal:
+    digest = token_digest(token)
+    principal = principal_cache.get(digest)
+    if principal is not None:
+        return principal
+
+    username = claims["sub"]
+    # Only cache misses need a session; accounts that just changed are read from the primary
+    with session_holds.timer("get_current_user"):
+        db = await open_read_session(username)
+        try:
+            user = await run_db(
+                db, lambda session: session.query(Account).filter(Account.username == username).first()
+            )
+        finally:
+            await close_session(db)
     if user is None:
-        raise credentials_exception
-    return user
\ No newline at end of file
+        raise _credentials_exception()
+
+    principal = Principal.from_account(user)
+    principal_cache.set(digest, principal, ttl=claims.get("exp", 0) - time.time())
+    return principal
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Get current user from JWT token, with the account loaded (password hash included)."""
+    return await _load_principal(token, _verified_claims(token))
+
+async def get_token_user(token: str = Depends(oauth2_scheme)) -> Principal:
+    """Like get_current_user, but trusts account claims embedded in the token.
+
+    Used by read-only endpoints: with JWT_EMBED_ACCOUNT they authenticate
+    without an accounts lookup. The principal has no password hash.
+    """
+    claims = _verified_claims(token)
+    return embedded_principal(claims) or await _load_principal(token, claims)
+
+async def get_metrics_reader(token: str = Depends(oauth2_scheme)):
+    """Allow the scrape token (METRICS_TOKEN) or, like /stats, any user token."""
+    if METRICS_TOKEN and secrets.compare_digest(token.encode(), METRICS_TOKEN.encode()):
+        return None
+    return await get_token_user(token)
@@ -1,76 +1,262 @@
-import numpy as np
-import pandas as pd
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from starlette.concurrency import run_in_threadpool
 
-from app.config.database import SessionLocal
-from app.models.database import User
-from app.api.dependencies import get_current_user
+from app.analytics import aggregations, batch, materialized, timeseries
+from app.analytics.aggregations import age_ranges_from_edges
+from app.analytics.sketches import merged, sketch_store
+from app.analytics.snapshot import users_snapshot
+from app.config.database import run_in_read_session
+from app.config.settings import ANALYTICS_JOB_TIMEOUT, ANALYTICS_MATERIALIZED, ANALYTICS_SNAPSHOT
+from app.core.jobs import SUCCEEDED, analytics_jobs
+from app.core.request_metrics import timed
+from app.core.response_cache import response_cache
+from app.models.database import utc_now
+from app.models.filters import filter_user_frame, has_user_filters
+from app.models.schemas import (AgeRangeQuery, AnalyticsMode, AnalyticsSummaryQuery,
+                                BatchAnalyticsQuery, HistogramQuery, QuantileQuery, RollingSalaryQuery,
+                                TimeSeriesQuery, UserFilter)
+from app.api.dependencies import get_token_user
 
 router = APIRouter(tags=["Analytics"])
 
+def _use_materialized(filters) -> bool:
+    """The aggregate tables cover unfiltered data only."""
+    return ANALYTICS_MATERIALIZED and not has_user_filters(filters)
+
+async def _serve(request: Request, name: str, params, compute, mode: str, current_user,
+                 headers=None):
+    """Respond through the response cache, or with ``mode=async`` queue the
+    computation as a background job and return 202 with its status.
+
+    ``headers()`` describes the result: it is added to the synchronous
+    response, or kept with the job and sent once the job has succeeded.
+    """
+    if mode != "async":
+        response = await response_cache.respond(request, name, params, compute)
+        if headers is not None:
+            response.headers.update(headers())
+        return response
+
+    job = analytics_jobs.submit(
+        current_user.id, name,
+        lambda: response_cache.render(name, params, compute, timeout=ANALYTICS_JOB_TIMEOUT),
+        headers
+    )
+    return Response(
+        analytics_jobs.render(job), status_code=status.HTTP_202_ACCEPTED,
+        media_type="application/json", headers={"Location": f"/analytics/jobs/{job.id}"}
+    )
+
+async def _respond(request: Request, name: str, query, compute, from_frame, mode: str, current_user):
+    """Serve ``name`` from the users snapshot when a fresh one exists, else ``compute()``.
+
+    ``from_frame(frame)`` computes the payload from the filtered snapshot
+    rows. Snapshot results are cached per snapshot version, and the
+    response reports which snapshot served it and how old it is.
+    """
+    params = query.model_dump(mode="json")
+    snapshot = users_snapshot.current() if ANALYTICS_SNAPSHOT else None
+    if snapshot is None:
+        return await _serve(request, name, params, compute, mode, current_user)
+
+    @timed("pandas")
+    def compute_from_snapshot():
+        return from_frame(filter_user_frame(snapshot.frame(), query))
+
+    return await _serve(
+        request, name, {**params, "snapshot": snapshot.version},
+        lambda: run_in_threadpool(compute_from_snapshot), mode, current_user, snapshot.headers
+    )
+
 @router.post("/analytics/by_city")
-async def get_users_by_city(current_user = Depends(get_current_user)):
+async def get_users_by_city(
+    request: Request,
+    query: Optional[UserFilter] = None,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
     """Get user statistics grouped by city."""
-    db = SessionLocal()
-    try:
-        df = pd.read_sql(db.query(User).statement, db.bind)
-        city_stats = df.groupby('city').agg({
-            'id': 'count',
-            'salary': 'mean',
-            'age': 'mean'
-        }).round(2).to_dict('index')
-        return city_stats
-    finally:
-        db.close()
+    query = query or UserFilter()
+
+    async def compute():
+        if _use_materialized(query):
+            return await run_in_read_session(materialized.city_stats)
+        return await run_in_read_session(aggregations.city_stats, query)
+
+    return await _respond(
+        request, "by_city", query, compute, aggregations.city_stats_from_frame, mode, current_user
+    )
 
 @router.post("/analytics/by_age_range")
-async def get_users_by_age_range(current_user = Depends(get_current_user)):
+async def get_users_by_age_range(
+    request: Request,
+    query: Optional[AgeRangeQuery] = None,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
     """Get user statistics grouped by age range."""
-    db = SessionLocal()
-    try:
-        df = pd.read_sql(db.query(User).statement, db.bind)
-        
-        age_ranges = {
-            '18-30': (18, 30),
-            '31-45': (31, 45),
-            '46-60': (46, 60),
-            '60+': (61, 100)
-        }
-        
-        result = {}
-        for range_name, (min_age, max_age) in age_ranges.items():
-            age_group = df[(df['age'] >= min_age) & (df['age'] <= max_age)]
-            result[range_name] = {
-                'count': len(age_group),
-                'avg_salary': round(age_group['salary'].mean(), 2)
-            }
-        
-        return result
-    finally:
-        db.close()
+    query = query or AgeRangeQuery()
+    ranges = age_ranges_from_edges(query.age_edges)
+
+    async def compute():
+        if _use_materialized(query):
+            return await run_in_read_session(materialized.age_range_stats, ranges)
+        return await run_in_read_session(aggregations.age_range_stats, ranges, query)
+
+    return await _respond(
+        request, "by_age_range", query, compute,
+        lambda frame: aggregations.age_range_stats_from_frame(frame, ranges), mode, current_user
+    )
 
 @router.post("/analytics/salary_histogram")
-async def get_salary_histogram(current_user = Depends(get_current_user)):
+async def get_salary_histogram(
+    request: Request,
+    query: Optional[HistogramQuery] = None,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
     """Get salary distribution histogram data."""
-    db = SessionLocal()
-    try:
-        df = pd.read_sql(db.query(User).statement, db.bind)
-        
-        hist, bin_edges = np.histogram(df['salary'], bins=10)
-        
-        histogram_data = {
-            'counts': hist.tolist(),
-            'bin_edges': bin_edges.tolist(),
-            'statistics': {
-                'mean': round(df['salary'].mean(), 2),
-                'median': round(df['salary'].median(), 2),
-                'std': round(df['salary'].std(), 2),
-                'min': round(df['salary'].min(), 2),
-                'max': round(df['salary'].max(), 2)
+    query = query or HistogramQuery()
+
+    async def compute():
+        if _use_materialized(query):
+            return await run_in_read_session(materialized.salary_histogram, query.bins, query.bin_edges)
+        return await run_in_read_session(aggregations.salary_histogram, query.bins, query.bin_edges, query)
+
+    return await _respond(
+        request, "salary_histogram", query, compute,
+        lambda frame: aggregations.salary_histogram_from_series(frame['salary'], query.bins, query.bin_edges),
+        mode, current_user
+    )
+
+@router.post("/analytics/summary")
+async def get_analytics_summary(
+    request: Request,
+    query: Optional[AnalyticsSummaryQuery] = None,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
+    """Get city, age range and salary histogram data in one round-trip."""
+    query = query or AnalyticsSummaryQuery()
+    ranges = age_ranges_from_edges(query.age_edges)
+
+    async def compute():
+        return await run_in_read_session(aggregations.summary, ranges, query.bins, query.bin_edges, query)
+
+    return await _respond(
+        request, "summary", query, compute,
+        lambda frame: aggregations.summary_from_frame(frame, ranges, query.bins, query.bin_edges),
+        mode, current_user
+    )
+
+@router.post("/analytics/batch")
+async def get_analytics_batch(
+    request: Request,
+    query: BatchAnalyticsQuery,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
+    """Evaluate named analytics specs over one load of the filtered users.
+
+    Each result is ``{"type", "result"}`` or ``{"type", "error"}``.
+    """
+    specs = batch.parse_specs(query.specs)
+
+    async def compute():
+        return await run_in_read_session(batch.run, specs, query)
+
+    return await _respond(
+        request, "batch", query, compute, lambda frame: batch.evaluate(frame, specs), mode, current_user
+    )
+
+async def _time_series(request: Request, name: str, mode: str, current_user, query, fn, *args):
+    """Serve a join_date series; the open bucket is part of the cache key so
+    cached responses roll over when a new bucket starts."""
+    now = utc_now()
+
+    async def compute():
+        try:
+            return await run_in_read_session(fn, *args, query, now)
+        except timeseries.TooManyBuckets as error:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
+
+    params = {
+        **query.model_dump(mode="json"),
+        "open_bucket": timeseries.bucket_start(now, query.interval).isoformat()
+    }
+    return await _serve(request, name, params, compute, mode, current_user)
+
+@router.post("/analytics/signups")
+async def get_signups(
+    request: Request,
+    query: Optional[TimeSeriesQuery] = None,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
+    """Get signups and cumulative headcount per day, week or month of join_date."""
+    query = query or TimeSeriesQuery()
+    return await _time_series(
+        request, "signups", mode, current_user, query, timeseries.signups, query.interval
+    )
+
+@router.post("/analytics/rolling_salary")
+async def get_rolling_salary(
+    request: Request,
+    query: Optional[RollingSalaryQuery] = None,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
+    """Get average salary per city of each bucket's signups and over a rolling window."""
+    query = query or RollingSalaryQuery()
+    return await _time_series(
+        request, "rolling_salary", mode, current_user, query,
+        timeseries.rolling_salary, query.interval, query.window
+    )
+
+def _quantile_result(sketch, fractions) -> dict:
+    return {
+        'count': sketch.count,
+        'quantiles': dict(zip(map(str, fractions), sketch.quantiles(fractions))),
+        'rank_error': sketch.rank_error()
+    }
+
+@router.post("/analytics/quantiles")
+async def get_quantiles(
+    request: Request,
+    query: QuantileQuery,
+    mode: AnalyticsMode = "sync",
+    current_user = Depends(get_token_user)
+):
+    """Get approximate quantiles of salary or age from mergeable sketches."""
+    async def compute():
+        sketches = await sketch_store.sketches(run_in_read_session)
+        if query.group_by_city:
+            cities = query.city or sorted(city for column, city in sketches
+                                          if column == query.column and city is not None)
+            return {
+                'column': query.column,
+                'by_city': {
+                    city: _quantile_result(merged(sketches, query.column, [city]), query.quantiles)
+                    for city in cities
+                }
             }
-        }
-        
-        return histogram_data
-    finally:
-        db.close()
+        sketch = merged(sketches, query.column, query.city)
+        return {'column': query.column, **_quantile_result(sketch, query.quantiles)}
+
+    return await _serve(request, "quantiles", query.model_dump(mode="json"), compute, mode, current_user)
+
+@router.get("/analytics/jobs/{job_id}")
+async def get_analytics_job(job_id: str, current_user = Depends(get_token_user)):
+    """Get the status and progress of an analytics job started with ``mode=async``.
+
+    Once the job has succeeded its ``result`` is the payload the synchronous
+    request would have returned.
+    """
+    job = analytics_jobs.get(job_id, current_user.id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return Response(
+        analytics_jobs.render(job), media_type="application/json",
+        headers=job.headers if job.status == SUCCEEDED else None
+    )
@@ -4,27 +4,42 @@ from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from starlette.responses import JSONResponse
 
-from app.config.database import get_db
+from app.config.database import get_db, read_router, run_db
 from app.config.oauth import oauth
-from app.core.security import verify_password, create_access_token, get_password_hash
+from app.core.principals import Principal, invalidate_principal
+from app.core.security import verify_password_async, create_access_token, get_password_hash_async
 from app.models.database import Account
 from app.models.schemas import (Token, UserRegister, AccountResponse, 
                               AccountUpdate, AccountDelete)
-from app.api.dependencies import get_current_user
+from app.api.dependencies import get_current_user, get_token_user
 
 router = APIRouter(tags=["Authentication"])
 
+def _first_account(db: Session, *criteria):
+    """Return the first account matching the given filter criteria."""
+    return db.query(Account).filter(*criteria).first()
+
+def _save(db: Session, instance):
+    """Add an instance and commit it."""
+    db.add(instance)
+    db.commit()
+
+def _delete_account(db: Session, account_id: int):
+    """Delete an account by id and commit."""
+    db.query(Account).filter(Account.id == account_id).delete(synchronize_session=False)
+    db.commit()
+
 @router.post("/login", response_model=Token)
-async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db = Depends(get_db)):
     """Login user and return access token."""
-    db_user = db.query(Account).filter(Account.username == form_data.username).first()
-    if not db_user or not db_user.hashed_password or not verify_password(form_data.password, db_user.hashed_password):
+    db_user = await run_db(db, _first_account, Account.username == form_data.username)
+    if not db_user or not db_user.hashed_password or not await verify_password_async(form_data.password, db_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect username or password"
         )
     
-    access_token = create_access_token(data={"sub": form_data.username})
+    access_token = create_access_token(data={"sub": db_user.username}, account=db_user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get('/login/google')
@@ -47,7 +62,7 @@ async def google_login(request: Request):
         )
 
 @router.get('/callback/{provider}')
-async def social_callback_get(provider: str, request: Request, db: Session = Depends(get_db)):
+async def social_callback_get(provider: str, request: Request, db = Depends(get_db)):
     """Handle social media callback (OAuth flow)."""
     try:
         if provider != 'google':
@@ -64,13 +79,14 @@ async def social_callback_get(provider: str, request: Request, db: Session = Dep
         email = user_info['email']
         name = user_info['name']
         
-        account = db.query(Account).filter(
+        account = await run_db(
+            db, _first_account,
             (Account.social_id == social_id) & 
             (Account.social_provider == provider)
-        ).first()
+        )
         
         if not account:
-            existing_email = db.query(Account).filter(Account.email == email).first()
+            existing_email = await run_db(db, _first_account, Account.email == email)
             if existing_email:
                 raise HTTPException(
                     status_code=400,
@@ -84,10 +100,10 @@ async def social_callback_get(provider: str, request: Request, db: Session = Dep
                 social_id=social_id,
                 social_provider=provider
             )
-            db.add(account)
-            db.commit()
+            await run_db(db, _save, account)
+            read_router.pin(account.username)
         
-        access_token = create_access_token(data={"sub": account.username})
+        access_token = create_access_token(data={"sub": account.username}, account=account)
         
         return JSONResponse({
             "access_token": access_token,
@@ -101,7 +117,7 @@ async def social_callback_get(provider: str, request: Request, db: Session = Dep
         )
 
 @router.post('/callback/{provider}')
-async def social_callback_post(provider: str, request: Request, db: Session = Depends(get_db)):
+async def social_callback_post(provider: str, request: Request, db = Depends(get_db)):
     """Handle social media token verification."""
     try:
         body = await request.json()
@@ -115,7 +131,7 @@ async def social_callback_post(provider: str, request: Request, db: Session = De
                 detail="Token and email are required"
             )
 
-        account = db.query(Account).filter(Account.email == email).first()
+        account = await run_db(db, _first_account, Account.email == email)
 
         if not account:
             username = f"{name.lower().replace(' ', '_')}_{datetime.now().timestamp()}"
@@ -125,10 +141,10 @@ async def social_callback_post(provider: str, request: Request, db: Session = De
                 social_id=token,
                 social_provider='google'
             )
-            db.add(account)
-            db.commit()
+            await run_db(db, _save, account)
+            read_router.pin(account.username)
 
-        access_token = create_access_token(data={"sub": account.username})
+        access_token = create_access_token(data={"sub": account.username}, account=account)
         
         return JSONResponse({
             "access_token": access_token,
@@ -142,36 +158,36 @@ async def social_callback_post(provider: str, request: Request, db: Session = De
         )
 
 @router.post("/register", response_model=Token)
-async def register(user: UserRegister, db: Session = Depends(get_db)):
+async def register(user: UserRegister, db = Depends(get_db)):
     """Register a new user."""
-    db_user = db.query(Account).filter(Account.email == user.email).first()
+    db_user = await run_db(db, _first_account, Account.email == user.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
-    db_user = db.query(Account).filter(Account.username == user.username).first()
+    db_user = await run_db(db, _first_account, Account.username == user.username)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = Account(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
-    db.add(new_user)
-    db.commit()
+    await run_db(db, _save, new_user)
+    read_router.pin(user.username)
     
-    access_token = create_access_token(data={"sub": user.username})
+    access_token = create_access_token(data={"sub": new_user.username}, account=new_user)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.post("/account/details", response_model=AccountResponse)
-async def get_account_details(current_user: Account = Depends(get_current_user)):
+async def get_account_details(current_user: Principal = Depends(get_token_user)):
     """Get current user's account details."""
     return AccountResponse(
         username=current_user.username,
@@ -182,8 +198,8 @@ async def get_account_details(current_user: Account = Depends(get_current_user))
 @router.post("/account/update", response_model=Token)
 async def update_account(
     update_data: AccountUpdate,
-    current_user: Account = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """Update account credentials."""
     if current_user.social_provider:
@@ -192,45 +208,57 @@ async def update_account(
             detail="Social login accounts cannot be updated through this endpoint"
         )
 
-    if not verify_password(update_data.current_password, current_user.hashed_password):
+    # The principal is a cached snapshot; check and modify the live row
+    account = await run_db(db, _first_account, Account.id == current_user.id)
+    if account is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+
+    if not await verify_password_async(update_data.current_password, account.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password"
         )
 
     if update_data.new_username:
-        existing_user = db.query(Account).filter(
+        existing_user = await run_db(
+            db, _first_account,
             Account.username == update_data.new_username,
             Account.id != current_user.id
-        ).first()
+        )
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Username already taken"
             )
-        current_user.username = update_data.new_username
+        account.username = update_data.new_username
 
     if update_data.new_email:
-        existing_user = db.query(Account).filter(
+        existing_user = await run_db(
+            db, _first_account,
             Account.email == update_data.new_email,
             Account.id != current_user.id
-        ).first()
+        )
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Email already registered"
             )
-        current_user.email = update_data.new_email
+        account.email = update_data.new_email
 
     if update_data.new_password:
-        current_user.hashed_password = get_password_hash(update_data.new_password)
+        account.hashed_password = await get_password_hash_async(update_data.new_password)
 
     try:
-        db.commit()
-        access_token = create_access_token(data={"sub": current_user.username})
+        await run_db(db, Session.commit)
+        invalidate_principal(account.id)
+        read_router.pin(current_user.username, account.username)
+        access_token = create_access_token(data={"sub": account.username}, account=account)
         return {"access_token": access_token, "token_type": "bearer"}
     except Exception as e:
-        db.rollback()
+        await run_db(db, Session.rollback)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -239,30 +267,39 @@ async def update_account(
 @router.post("/account/delete")
 async def delete_account(
     delete_data: AccountDelete,
-    current_user: Account = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: Principal = Depends(get_current_user),
+    db = Depends(get_db)
 ):
     """Delete user account."""
-    if not current_user.social_provider:
-        if not verify_password(delete_data.password, current_user.hashed_password):
+    # The principal is a cached snapshot; check the password of the live row
+    account = await run_db(db, _first_account, Account.id == current_user.id)
+    if account is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials"
+        )
+
+    if not account.social_provider:
+        if not await verify_password_async(delete_data.password, account.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Incorrect password"
             )
 
     try:
-        db.delete(current_user)
-        db.commit()
+        await run_db(db, _delete_account, current_user.id)
+        invalidate_principal(current_user.id)
+        read_router.pin(current_user.username)
         return {"message": "Account successfully deleted"}
     except Exception as e:
-        db.rollback()
+        await run_db(db, Session.rollback)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
 @router.get("/test-auth")
-async def test_auth(current_user: Account = Depends(get_current_user)):
+async def test_auth(current_user: Principal = Depends(get_token_user)):
     """Test authentication endpoint."""
     return {
         "message": "Authentication successful",
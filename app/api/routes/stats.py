@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+
+from app.core.metrics import collect_stats
+from app.core.request_metrics import render_prometheus
+from app.api.dependencies import get_metrics_reader, get_token_user
+
+router = APIRouter(tags=["Monitoring"])
+
+@router.get("/stats")
+async def get_stats(current_user = Depends(get_token_user)):
+    """Get runtime statistics (hashing pool, caches, connection pool)."""
+    return collect_stats()
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics(reader = Depends(get_metrics_reader)):
+    """Request metrics and runtime statistics in Prometheus text format (this worker)."""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -1,32 +1,113 @@
-from typing import List
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 
-from app.config.database import get_db
-from app.models.schemas import UserResponse
+from app.config.database import open_read_session, read_session, run_db, session_holds
+from app.config.settings import (DB_ASYNC, USERS_PAGE_SIZE, USERS_MAX_PAGE_SIZE,
+                                 USERS_STREAM_BATCH_SIZE)
+from app.core.request_metrics import count_rows
+from app.models.schemas import UserPage, UserQuery, UserResponse
 from app.models.database import User
-from app.api.dependencies import get_current_user
+from app.models.filters import user_filter_clauses
+from app.utils.serialization import (USER_RESPONSE_COLUMNS, USER_RESPONSE_FIELDS, dumps,
+                                     ndjson_lines, user_dicts)
+from app.api.dependencies import get_read_db, get_token_user
 
 router = APIRouter(tags=["Users"])
 
+# The handlers below return pre-rendered JSON, so response_model only documents
+# the schema; FastAPI does not validate or re-encode the rows.
+
 @router.post("/users/all", response_model=List[UserResponse])
 async def get_users(
-    current_user = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user = Depends(get_token_user),
+    db = Depends(get_read_db)
 ):
     """Get all users."""
     try:
-        users = db.query(User).all()
-        return [
-            UserResponse(
-                id=user.id,
-                name=user.name,
-                age=user.age,
-                city=user.city,
-                salary=user.salary,
-                join_date=user.join_date.isoformat()
-            )
-            for user in users
-        ]
+        rows = await run_db(
+            db, lambda session: session.execute(select(*USER_RESPONSE_COLUMNS)).all()
+        )
+        return Response(content=dumps(user_dicts(rows)), media_type="application/json")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/users/page", response_model=UserPage)
+async def get_users_page(
+    cursor: Optional[int] = Query(None, ge=0, description="Last user id of the previous page"),
+    limit: int = Query(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE),
+    current_user = Depends(get_token_user),
+    db = Depends(get_read_db)
+):
+    """Get one page of users ordered by id (keyset pagination)."""
+    statement = select(*USER_RESPONSE_COLUMNS).order_by(User.id).limit(limit)
+    if cursor is not None:
+        statement = statement.where(User.id > cursor)
+
+    items = user_dicts(await run_db(db, lambda session: session.execute(statement).all()))
+    next_cursor = items[-1]["id"] if len(items) == limit else None
+    return Response(
+        content=dumps({"items": items, "next_cursor": next_cursor}),
+        media_type="application/json"
+    )
+
+@router.post("/users/query")
+async def query_users(
+    query: UserQuery,
+    current_user = Depends(get_token_user),
+    db = Depends(get_read_db)
+):
+    """Filter, sort and project users server-side (offset pagination)."""
+    fields = tuple(query.fields or USER_RESPONSE_FIELDS)
+    sort_column = getattr(User, query.sort_by)
+    order = sort_column.desc() if query.descending else sort_column.asc()
+    statement = (
+        select(*(getattr(User, field) for field in fields))
+        .where(*user_filter_clauses(query))
+        .order_by(order, User.id)
+        .offset(query.offset)
+        .limit(query.limit)
+    )
+
+    items = user_dicts(await run_db(db, lambda session: session.execute(statement).all()), fields)
+    next_offset = query.offset + len(items) if len(items) == query.limit else None
+    return Response(
+        content=dumps({"items": items, "next_offset": next_offset}),
+        media_type="application/json"
+    )
+
+def _stream_statement():
+    return (
+        select(*USER_RESPONSE_COLUMNS)
+        .order_by(User.id)
+        .execution_options(yield_per=USERS_STREAM_BATCH_SIZE)
+    )
+
+def _stream_users_sync():
+    with session_holds.timer("/users/stream"):
+        db = read_session()
+        try:
+            for partition in db.execute(_stream_statement()).partitions():
+                count_rows(len(partition))
+                yield ndjson_lines(partition)
+        finally:
+            db.close()
+
+async def _stream_users_async():
+    with session_holds.timer("/users/stream"):
+        db = await open_read_session()
+        try:
+            result = await db.stream(_stream_statement())
+            async for partition in result.partitions():
+                count_rows(len(partition))
+                yield ndjson_lines(partition)
+        finally:
+            await db.close()
+
+@router.post("/users/stream")
+async def stream_users(current_user = Depends(get_token_user)):
+    """Stream all users as NDJSON, fetched through a server-side cursor."""
+    # Uses its own session: the rows are read while the response is being sent
+    rows = _stream_users_async() if DB_ASYNC else _stream_users_sync()
+    return StreamingResponse(rows, media_type="application/x-ndjson")
@@ -0,0 +1,160 @@
+"""Maintenance commands, e.g. ``python -m app.cli rebuild-analytics``."""
+import argparse
+import sys
+import time
+
+from app.config.database import SessionLocal, engine
+from app.config.settings import ANALYTICS_MATERIALIZED, ANALYTICS_SNAPSHOT
+
+
+def _refresh_derived(rebuild_materialized: bool):
+    """Refresh what is derived from ``users`` after changes that bypassed the ORM.
+
+    Only shared state can be refreshed from here: the caches held in the
+    memory of running servers are not reachable from this process.
+    """
+    from app.analytics import materialized
+    from app.core.response_cache import response_cache
+
+    if rebuild_materialized:
+        db = SessionLocal()
+        try:
+            materialized.rebuild(db)
+        finally:
+            db.close()
+    if response_cache.backend is not None and response_cache.backend.shared:
+        response_cache.bump_data_version()
+        print("Shared analytics response cache invalidated")
+    print("Restart running servers so their in-memory analytics caches "
+          "(responses, quantile sketches, time series) see these changes")
+
+
+def rebuild_analytics(args):
+    """Recompute the materialized analytics tables from scratch."""
+    _refresh_derived(rebuild_materialized=True)
+    print("Analytics aggregates rebuilt")
+
+
+def snapshot_users(args):
+    """Write a fresh columnar snapshot of users for the analytics endpoints."""
+    from app.analytics.snapshot import users_snapshot
+
+    db = SessionLocal()
+    try:
+        version = users_snapshot.write(db)
+    finally:
+        db.close()
+    print(f"Users snapshot {version} written ({users_snapshot.rows_written} rows)")
+
+
+def migrate(args):
+    """Apply (or, with --to, revert) schema migrations."""
+    from app import migrations
+
+    changed = migrations.migrate(engine, target=args.to)
+    print(f"Database at revision {migrations.current_version(engine)}"
+          + ("" if changed else " (nothing to do)"))
+
+
+def migration_status(args):
+    """List migration revisions and whether each is applied."""
+    from sqlalchemy.exc import DBAPIError
+
+    from app import migrations
+
+    with engine.connect() as connection:
+        try:
+            applied = migrations.applied_versions(connection)
+        except DBAPIError:
+            applied = set()
+    for revision in migrations.revisions():
+        state = "applied" if revision.version in applied else "pending"
+        print(f"{revision.version:04d} {state:8} {revision.description}")
+
+
+def check_schema(args):
+    """Report pending migrations and drift between the models and the database."""
+    from app import migrations
+    from app.config.database import Base
+    from app.migrations.drift import schema_drift
+
+    import app.models.database  # noqa: F401  (registers the models)
+
+    problems = []
+    current, latest = migrations.current_version(engine), migrations.head()
+    if current < latest:
+        problems.append(f"migrations: database at revision {current}, latest is {latest}")
+    problems += schema_drift(engine, Base.metadata)
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    print("Schema matches the models")
+
+
+def seed(args):
+    """Migrate, then create the admin account and random users (bulk COPY)."""
+    from app import migrations
+    from app.utils.db_utils import ensure_admin, seed_users
+
+    migrations.migrate(engine)
+    db = SessionLocal()
+    try:
+        if ensure_admin(db, args.admin_password):
+            print("Admin account created")
+    finally:
+        db.close()
+
+    if args.users:
+        started = time.perf_counter()
+        inserted = seed_users(
+            args.users,
+            batch_size=args.batch_size,
+            seed=args.seed,
+            truncate=args.truncate,
+            progress=lambda done: print(f"  {done}/{args.users} users", end="\r", flush=True)
+        )
+        elapsed = time.perf_counter() - started
+        print(f"Inserted {inserted} users in {elapsed:.1f}s ({inserted / elapsed:,.0f} rows/s)")
+
+    _refresh_derived(rebuild_materialized=ANALYTICS_MATERIALIZED)
+    if ANALYTICS_SNAPSHOT:
+        snapshot_users(args)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-analytics", help=rebuild_analytics.__doc__)
+    rebuild.set_defaults(handler=rebuild_analytics)
+
+    snapshot = commands.add_parser("snapshot-users", help=snapshot_users.__doc__)
+    snapshot.set_defaults(handler=snapshot_users)
+
+    migrating = commands.add_parser("migrate", help=migrate.__doc__)
+    migrating.add_argument("--to", type=int, default=None,
+                           help="target revision (default: latest; lower reverts)")
+    migrating.set_defaults(handler=migrate)
+
+    status = commands.add_parser("migrations", help=migration_status.__doc__)
+    status.set_defaults(handler=migration_status)
+
+    check = commands.add_parser("check-schema", help=check_schema.__doc__)
+    check.set_defaults(handler=check_schema)
+
+    seeding = commands.add_parser("seed", help=seed.__doc__)
+    seeding.add_argument("--users", type=int, default=1000, help="number of users to add")
+    seeding.add_argument("--batch-size", type=int, default=100000, help="rows per COPY batch")
+    seeding.add_argument("--seed", type=int, default=None, help="random seed for repeatable data")
+    seeding.add_argument("--truncate", action="store_true", help="delete existing users first")
+    seeding.add_argument("--admin-password", default="admin123",
+                         help="password of the admin account created on an empty database")
+    seeding.set_defaults(handler=seed)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
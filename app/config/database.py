@@ -1,17 +1,240 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from greenlet import getcurrent
+from sqlalchemy import create_engine, make_url, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from .settings import DATABASE_URL
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from sqlalchemy.util import await_only
+from starlette.concurrency import run_in_threadpool
+from app.core.metrics import register_stats
+from app.core.pool import PoolStats, SessionHolds, instrumented_pool
+from app.core.replicas import ReadRouter, Replica
+from app.core.request_metrics import instrument_engine
+from .settings import (DATABASE_URL, ASYNC_DATABASE_URL, DATABASE_REPLICA_URLS, DB_ASYNC,
+                       DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE, DB_POOL_SIZE,
+                       DB_POOL_TIMEOUT, DB_READ_YOUR_WRITES_SECONDS, DB_REPLICA_CHECK_INTERVAL,
+                       DB_REPLICA_MAX_LAG, DB_STATEMENT_TIMEOUT_MS, REQUEST_METRICS)
+
+POOL_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": DB_POOL_PRE_PING,
+}
+
+def _connect_args(url, is_async: bool) -> dict:
+    """Driver arguments applying DB_STATEMENT_TIMEOUT_MS to every connection."""
+    if make_url(url).get_backend_name() == "sqlite":
+        # Pooled connections are used from threadpool threads
+        return {"check_same_thread": False}
+    if not DB_STATEMENT_TIMEOUT_MS:
+        return {}
+    if is_async:
+        return {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+    return {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+
+pool_stats = PoolStats()
+session_holds = SessionHolds()
 
 # SQLAlchemy setup
-engine = create_engine(DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=instrumented_pool(QueuePool, pool_stats),
+    connect_args=_connect_args(DATABASE_URL, is_async=False),
+    **POOL_OPTIONS
+)
+# Objects stay loaded after commit so handlers never trigger a lazy refresh
+# (a blocking query, or an error under asyncio) outside run_db.
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
 Base = declarative_base()
 
-def get_db():
-    """Database session dependency."""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Async engine used for request handling when DB_ASYNC is enabled
+async_pool_stats = PoolStats()
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    poolclass=instrumented_pool(AsyncAdaptedQueuePool, async_pool_stats),
+    connect_args=_connect_args(ASYNC_DATABASE_URL, is_async=True),
+    **POOL_OPTIONS
+) if DB_ASYNC else None
+AsyncSessionLocal = (
+    async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    if DB_ASYNC else None
+)
+
+def _replica(index: int, url: str) -> Replica:
+    """Engine and session factory for one replica, in the same mode as the primary."""
+    stats = PoolStats()
+    if DB_ASYNC:
+        async_url = make_url(url).set(drivername="postgresql+asyncpg")
+        replica_engine = create_async_engine(
+            async_url,
+            poolclass=instrumented_pool(AsyncAdaptedQueuePool, stats),
+            connect_args=_connect_args(async_url, is_async=True),
+            **POOL_OPTIONS
+        )
+        factory = async_sessionmaker(replica_engine, autoflush=False, expire_on_commit=False)
+    else:
+        replica_engine = create_engine(
+            url,
+            poolclass=instrumented_pool(QueuePool, stats),
+            connect_args=_connect_args(url, is_async=False),
+            **POOL_OPTIONS
+        )
+        factory = sessionmaker(autoflush=False, expire_on_commit=False, bind=replica_engine)
+    display_url = make_url(url).render_as_string(hide_password=True)
+    return Replica(f"replica_{index}", display_url, replica_engine, factory, stats)
+
+read_router = ReadRouter(
+    [_replica(index, url) for index, url in enumerate(DATABASE_REPLICA_URLS)],
+    pin_seconds=DB_READ_YOUR_WRITES_SECONDS,
+    max_lag=DB_REPLICA_MAX_LAG,
+    interval=DB_REPLICA_CHECK_INTERVAL,
+)
+
+if REQUEST_METRICS:
+    # Statement timings and row counts for the per-request breakdown
+    for instrumented in [engine, async_engine, *(replica.engine for replica in read_router.replicas)]:
+        if instrumented is not None:
+            instrument_engine(getattr(instrumented, "sync_engine", instrumented))
+
+register_stats("db_pool", lambda: pool_stats.snapshot(engine.pool))
+if DB_ASYNC:
+    register_stats("db_pool_async", lambda: async_pool_stats.snapshot(async_engine.pool))
+register_stats("db_sessions", session_holds.stats)
+if read_router.replicas:
+    register_stats("db_replicas", read_router.stats)
+
+# Replay lag of a standby; 0 when it has replayed everything it received
+_LAG_QUERY = text(
+    "SELECT CASE WHEN NOT pg_is_in_recovery() "
+    "OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+async def _probe_replica(replica: Replica) -> float:
+    if DB_ASYNC:
+        async with replica.engine.connect() as connection:
+            return float((await connection.execute(_LAG_QUERY)).scalar() or 0)
+
+    def probe():
+        with replica.engine.connect() as connection:
+            return float(connection.execute(_LAG_QUERY).scalar() or 0)
+    return await run_in_threadpool(probe)
+
+def start_replica_checks():
+    """Start periodic replica health checks (call from the running event loop)."""
+    read_router.start(_probe_replica)
+
+def read_session(subject: str = None):
+    """Sync read-only session on a healthy replica, or on the primary.
+
+    The connection is checked out up front, so a replica that cannot be
+    reached is taken out of rotation and the primary is used instead.
+    """
+    replica = read_router.choose(subject)
+    if replica is not None:
+        db = replica.session_factory()
+        try:
+            db.connection()
+            return db
+        except (DBAPIError, OSError) as error:
+            db.close()
+            read_router.mark_down(replica, error)
+    return SessionLocal()
+
+async def open_read_session(subject: str = None):
+    """Read-only session for the current mode (see ``read_session``)."""
+    if not DB_ASYNC:
+        return await run_in_threadpool(read_session, subject)
+
+    replica = read_router.choose(subject)
+    if replica is not None:
+        db = replica.session_factory()
+        try:
+            await db.connection()
+            return db
+        except (DBAPIError, OSError) as error:
+            await db.close()
+            read_router.mark_down(replica, error)
+    return AsyncSessionLocal()
+
+async def close_session(db):
+    if isinstance(db, AsyncSession):
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+def route_name(request: Request) -> str:
+    route = request.scope.get("route")
+    return getattr(route, "path", request.url.path)
+
+async def get_db(request: Request):
+    """Database session dependency (AsyncSession when DB_ASYNC is enabled)."""
+    with session_holds.timer(route_name(request)):
+        if DB_ASYNC:
+            async with AsyncSessionLocal() as db:
+                yield db
+            return
+
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            await run_in_threadpool(db.close)
+
+async def run_db(db, fn, *args, **kwargs):
+    """Run ``fn(session, *args, **kwargs)`` off the request coroutine.
+
+    With a plain Session the function runs in the threadpool. With an
+    AsyncSession it runs on the session's sync facade, in a greenlet on the
+    event loop thread: every query is awaited through asyncpg, but any other
+    work ``fn`` does blocks the loop, so ``fn`` must hand CPU-bound work and
+    blocking waits to ``offload``.
+    """
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(fn, db, *args, **kwargs)
+
+def offload(fn, *args, **kwargs):
+    """``fn(*args, **kwargs)``, in the threadpool when called under ``run_db``
+    with an AsyncSession, so CPU-bound work and blocking waits do not stall the
+    event loop. Elsewhere (already in a thread) it is a plain call."""
+    # Only the greenlets SQLAlchemy runs sync facades in have a driver to await through
+    if getattr(getcurrent(), "driver", None) is None:
+        return fn(*args, **kwargs)
+    return await_only(run_in_threadpool(fn, *args, **kwargs))
+
+async def run_in_new_session(fn, *args, **kwargs):
+    """Like run_db (including its ``offload`` rule), but in a dedicated session
+    not tied to any request.
+
+    Used for work that may outlive the request that started it, such as
+    computations shared between concurrent requests.
+    """
+    with session_holds.timer(_task_name(fn)):
+        if DB_ASYNC:
+            async with AsyncSessionLocal() as db:
+                return await db.run_sync(fn, *args, **kwargs)
+
+        def call():
+            db = SessionLocal()
+            try:
+                return fn(db, *args, **kwargs)
+            finally:
+                db.close()
+        return await run_in_threadpool(call)
+
+async def run_in_read_session(fn, *args, **kwargs):
+    """Like run_in_new_session, on a read replica when one is available."""
+    with session_holds.timer(_task_name(fn)):
+        db = await open_read_session()
+        try:
+            return await run_db(db, fn, *args, **kwargs)
+        finally:
+            await close_session(db)
+
+def _task_name(fn) -> str:
+    return f"task:{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
@@ -9,13 +9,140 @@ DB_USERNAME = os.getenv("DB_USERNAME")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOSTPORT = os.getenv("DB_HOSTPORT")
 DB_DBNAME = os.getenv("DB_DBNAME")
-DATABASE_URL = f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOSTPORT}/{DB_DBNAME}"
+# A full DATABASE_URL / ASYNC_DATABASE_URL overrides the parts above (used by
+# the load benchmarks, e.g. with a SQLite stand-in)
+DATABASE_URL = (
+    os.getenv("DATABASE_URL")
+    or f"postgresql://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOSTPORT}/{DB_DBNAME}"
+)
+ASYNC_DATABASE_URL = (
+    os.getenv("ASYNC_DATABASE_URL")
+    or f"postgresql+asyncpg://{DB_USERNAME}:{DB_PASSWORD}@{DB_HOSTPORT}/{DB_DBNAME}"
+)
+
+# Serve requests through SQLAlchemy asyncio (asyncpg) instead of the sync engine
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+
+# Connection pool, per engine and per worker process: each uvicorn worker may
+# open up to DB_POOL_SIZE + DB_MAX_OVERFLOW connections
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+# Server-side statement timeout in milliseconds (0 disables it)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+
+# Read replicas: comma-separated postgresql:// URLs serving read-only endpoints.
+# Replicas lagging more than DB_REPLICA_MAX_LAG seconds (0 = no limit) are
+# skipped; a client's reads go to the primary for DB_READ_YOUR_WRITES_SECONDS
+# after it writes
+DATABASE_REPLICA_URLS = [
+    url.strip() for url in os.getenv("DATABASE_REPLICA_URLS", "").split(",") if url.strip()
+]
+DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG", "10"))
+DB_READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
 
 # Security configuration
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# JWT signing keys as "kid:secret,kid:secret". The first signs new tokens and
+# all of them verify, so a key can be rotated in front of the old one and the
+# old one removed once its tokens have expired. Secrets need at least 32
+# characters (parsed by app.core.tokens). Defaults to SECRET_KEY under
+# the kid "default". Tokens without a kid (issued before kids were added) are
+# verified with SECRET_KEY while JWT_ACCEPT_UNKEYED is true.
+JWT_SIGNING_KEYS = os.getenv("JWT_SIGNING_KEYS", "")
+JWT_ACCEPT_UNKEYED = os.getenv("JWT_ACCEPT_UNKEYED", "true").lower() == "true"
+# Verified tokens cached by hash until they expire (size 0 disables)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# Embed the account id, email and provider in new tokens so read-only
+# endpoints authenticate without looking up the account
+JWT_EMBED_ACCOUNT = os.getenv("JWT_EMBED_ACCOUNT", "false").lower() == "true"
+
+# Password hashing pool: bcrypt runs on these threads, with at most
+# HASH_QUEUE_SIZE requests waiting before new ones are rejected with 503
+HASH_POOL_SIZE = int(os.getenv("HASH_POOL_SIZE", "4"))
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", "32"))
+
+# Verified-principal cache for get_current_user (size 0 disables it)
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))
+
+# User listing: keyset page sizes and server-side cursor batch size for streaming
+USERS_PAGE_SIZE = int(os.getenv("USERS_PAGE_SIZE", "100"))
+USERS_MAX_PAGE_SIZE = int(os.getenv("USERS_MAX_PAGE_SIZE", "1000"))
+USERS_STREAM_BATCH_SIZE = int(os.getenv("USERS_STREAM_BATCH_SIZE", "1000"))
+
+# Analytics configuration
+ANALYTICS_MATERIALIZED = os.getenv("ANALYTICS_MATERIALIZED", "false").lower() == "true"
+ANALYTICS_SALARY_BIN_WIDTH = float(os.getenv("ANALYTICS_SALARY_BIN_WIDTH", "100"))
+
+# pandas analytics read users in chunks of ANALYTICS_CHUNK_ROWS rows reduced to
+# partial aggregates; medians are exact up to ANALYTICS_EXACT_MEDIAN_ROWS values
+# and estimated with a KLL sketch beyond
+ANALYTICS_CHUNK_ROWS = int(os.getenv("ANALYTICS_CHUNK_ROWS", "100000"))
+ANALYTICS_EXACT_MEDIAN_ROWS = int(os.getenv("ANALYTICS_EXACT_MEDIAN_ROWS", "1000000"))
+
+# Process pool (per worker process; 0 or 1 = off) that reduces those chunks in
+# parallel, one id-range shard per pool process, for scans matching at least
+# ANALYTICS_PARALLEL_MIN_ROWS users
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", "0"))
+ANALYTICS_PARALLEL_MIN_ROWS = int(os.getenv("ANALYTICS_PARALLEL_MIN_ROWS", "200000"))
+# Seconds a scan waits for its shards before failing with 504
+ANALYTICS_PARALLEL_TIMEOUT = float(os.getenv("ANALYTICS_PARALLEL_TIMEOUT", "120"))
+
+# Columnar users snapshot (Arrow IPC, needs pyarrow) that analytics endpoints
+# read instead of Postgres while it is at most ANALYTICS_SNAPSHOT_MAX_AGE
+# seconds old (0 = any age); rewritten every ANALYTICS_SNAPSHOT_INTERVAL
+# seconds when users changed
+ANALYTICS_SNAPSHOT = os.getenv("ANALYTICS_SNAPSHOT", "false").lower() == "true"
+ANALYTICS_SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR", "snapshots")
+ANALYTICS_SNAPSHOT_INTERVAL = float(os.getenv("ANALYTICS_SNAPSHOT_INTERVAL", "60"))
+ANALYTICS_SNAPSHOT_MAX_AGE = float(os.getenv("ANALYTICS_SNAPSHOT_MAX_AGE", "900"))
+
+# Analytics response cache: "memory" (per process), "redis" (shared) or "none".
+# Memory caches are only invalidated by writes made through their own process,
+# so use "redis" when running several workers
+ANALYTICS_CACHE_BACKEND = os.getenv("ANALYTICS_CACHE_BACKEND", "memory").lower()
+ANALYTICS_CACHE_SIZE = int(os.getenv("ANALYTICS_CACHE_SIZE", "256"))
+ANALYTICS_CACHE_TTL = float(os.getenv("ANALYTICS_CACHE_TTL", "300"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Seconds a request waits on a shared (coalesced) analytics computation
+ANALYTICS_COMPUTE_TIMEOUT = float(os.getenv("ANALYTICS_COMPUTE_TIMEOUT", "30"))
+
+# Background analytics jobs (mode=async): ANALYTICS_JOB_WORKERS run at once per
+# process, ANALYTICS_JOB_QUEUE_SIZE may wait (503 beyond), each user may have
+# ANALYTICS_JOBS_PER_USER unfinished (429 beyond), and finished jobs keep their
+# result for ANALYTICS_JOB_RESULT_TTL seconds (at most ANALYTICS_JOB_MAX_RESULTS)
+ANALYTICS_JOB_WORKERS = int(os.getenv("ANALYTICS_JOB_WORKERS", "2"))
+ANALYTICS_JOB_QUEUE_SIZE = int(os.getenv("ANALYTICS_JOB_QUEUE_SIZE", "100"))
+ANALYTICS_JOBS_PER_USER = int(os.getenv("ANALYTICS_JOBS_PER_USER", "3"))
+ANALYTICS_JOB_RESULT_TTL = float(os.getenv("ANALYTICS_JOB_RESULT_TTL", "600"))
+ANALYTICS_JOB_MAX_RESULTS = int(os.getenv("ANALYTICS_JOB_MAX_RESULTS", "1000"))
+ANALYTICS_JOB_TIMEOUT = float(os.getenv("ANALYTICS_JOB_TIMEOUT", "3600"))
+
+# Quantile sketches: KLL accuracy parameter and minimum seconds between rebuilds
+SKETCH_K = int(os.getenv("SKETCH_K", "200"))
+SKETCH_REBUILD_INTERVAL = float(os.getenv("SKETCH_REBUILD_INTERVAL", "300"))
+
+# Time-series analytics: most buckets per request and series (interval and
+# filters) whose closed buckets are kept in memory
+TIMESERIES_MAX_BUCKETS = int(os.getenv("TIMESERIES_MAX_BUCKETS", "3700"))
+TIMESERIES_CACHE_SERIES = int(os.getenv("TIMESERIES_CACHE_SERIES", "64"))
+
+# Per-request timing (DB, bcrypt, JWT, pandas) exported on /metrics; requests
+# slower than SLOW_REQUEST_MS (0 = off) are logged with their query breakdown
+REQUEST_METRICS = os.getenv("REQUEST_METRICS", "true").lower() == "true"
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS", "0"))
+# Bearer token Prometheus scrapes /metrics with; user access tokens are
+# accepted too. Empty = user access tokens only
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
 # OAuth Configuration
 GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
 GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -0,0 +1,262 @@
+"""Background analytics jobs: submit now, poll for the result later.
+
+``JobQueue.submit`` records a job and returns at once. A fixed number of
+worker tasks on the event loop run queued jobs in order and store each
+result, the same JSON body the synchronous endpoint would send. Clients
+poll the job until it has succeeded or failed. The queue is bounded: 503
+when full, 429 when a user already has ANALYTICS_JOBS_PER_USER unfinished
+jobs. Finished jobs are kept for ANALYTICS_JOB_RESULT_TTL seconds.
+
+Job records live in a store implementing ``add``/``get``/``save``/
+``unfinished``/``stats``. The in-process store is per worker, so a client
+must poll the worker it submitted to. A shared store (e.g. Redis) can back
+the same interface later. The queue and the running computations always
+stay in the process that accepted the job.
+"""
+import asyncio
+import logging
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Optional
+
+import orjson
+from fastapi import HTTPException, status
+
+from app.config.settings import (ANALYTICS_JOB_MAX_RESULTS, ANALYTICS_JOB_QUEUE_SIZE,
+                                 ANALYTICS_JOB_RESULT_TTL, ANALYTICS_JOB_WORKERS,
+                                 ANALYTICS_JOBS_PER_USER)
+from app.core.metrics import register_stats
+from app.core.request_metrics import track_timings
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED = (SUCCEEDED, FAILED)
+
+
+@dataclass
+class Job:
+    """One analytics computation requested with ``mode=async``."""
+    id: str
+    owner: int
+    name: str
+    status: str = QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    error: Optional[dict] = None
+    result: Optional[bytes] = None
+    # Sent with the result once the job has succeeded (e.g. which snapshot served it)
+    headers: dict = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+
+class MemoryJobStore:
+    """In-process job records; finished ones expire after ``ttl`` seconds and
+    the oldest are dropped beyond ``max_finished``."""
+
+    def __init__(self, ttl: float, max_finished: int):
+        self.ttl = ttl
+        self.max_finished = max_finished
+        self._jobs = {}
+        # finished job id -> expiry, in finishing order
+        self._finished = OrderedDict()
+        self._lock = threading.Lock()
+        self.expired = 0
+
+    def _purge(self):
+        now = time.time()
+        while self._finished:
+            job_id, expires_at = next(iter(self._finished.items()))
+            if expires_at > now and len(self._finished) <= self.max_finished:
+                break
+            del self._finished[job_id]
+            self._jobs.pop(job_id, None)
+            self.expired += 1
+
+    def add(self, job: Job):
+        with self._lock:
+            self._purge()
+            self._jobs[job.id] = job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._purge()
+            return self._jobs.get(job_id)
+
+    def save(self, job: Job):
+        with self._lock:
+            self._jobs[job.id] = job
+            if job.finished:
+                self._finished[job.id] = job.finished_at + self.ttl
+
+    def unfinished(self, owner: int) -> int:
+        """Queued and running jobs of ``owner``."""
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job.owner == owner and not job.finished)
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict.fromkeys((QUEUED, RUNNING, SUCCEEDED, FAILED), 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return {"backend": "memory", **counts, "expired": self.expired}
+
+
+def _timestamp(seconds: Optional[float]) -> Optional[str]:
+    if seconds is None:
+        return None
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat()
+
+
+class JobQueue:
+    """Bounded FIFO of jobs run by ``workers`` tasks on the event loop."""
+
+    def __init__(self, store, workers: int, queue_size: int, per_user: int):
+        self.store = store
+        self.workers = workers
+        self.queue_size = queue_size
+        self.per_user = per_user
+        self._queue = None
+        self._tasks = []
+        self._order = []
+        # job id -> timings of a job running in this process
+        self._running = {}
+        self.submitted = 0
+        self.rejected = 0
+
+    def _ensure_started(self):
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._tasks = [asyncio.ensure_future(self._worker(self._queue)) for _ in range(self.workers)]
+
+    def start(self):
+        """Start the worker tasks (call from the running event loop)."""
+        self._ensure_started()
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._queue = None
+        self._tasks = []
+        self._order = []
+
+    def submit(self, owner: int, name: str, run, headers=None) -> Job:
+        """Queue ``await run()`` (returning the JSON result body) for ``owner``.
+
+        ``headers()``, if given, is called when the job succeeds and its
+        result is served with the headers it returns.
+        """
+        self._ensure_started()
+        if self.store.unfinished(owner) >= self.per_user:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=f"At most {self.per_user} unfinished analytics jobs per user",
+                headers={"Retry-After": "5"},
+            )
+        if self._queue.full():
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Analytics job queue is full, please retry shortly",
+                headers={"Retry-After": "5"},
+            )
+        job = Job(id=secrets.token_urlsafe(16), owner=owner, name=name)
+        self.store.add(job)
+        self._queue.put_nowait((job, run, headers))
+        self._order.append(job.id)
+        self.submitted += 1
+        return job
+
+    def get(self, job_id: str, owner: int) -> Optional[Job]:
+        """``owner``'s job, or None if it does not exist (any more) or is someone else's."""
+        job = self.store.get(job_id)
+        return job if job is not None and job.owner == owner else None
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            job, run, headers = await queue.get()
+            self._order.remove(job.id)
+            await self._run(job, run, headers)
+
+    async def _run(self, job: Job, run, headers=None):
+        job.status = RUNNING
+        job.started_at = time.time()
+        self.store.save(job)
+        with track_timings() as timings:
+            self._running[job.id] = timings
+            try:
+                job.result = await run()
+                job.headers = headers() if headers is not None else {}
+                job.status = SUCCEEDED
+            except HTTPException as error:
+                job.status = FAILED
+                job.error = {"status_code": error.status_code, "detail": error.detail}
+            except Exception:
+                logger.exception("Analytics job %s (%s) failed", job.id, job.name)
+                job.status = FAILED
+                job.error = {"status_code": 500, "detail": "Internal Server Error"}
+            finally:
+                del self._running[job.id]
+        job.finished_at = time.time()
+        self.store.save(job)
+
+    def _progress(self, job: Job) -> Optional[dict]:
+        timings = self._running.get(job.id)
+        if timings is None:
+            return None
+        return {
+            "elapsed_ms": round((time.time() - job.started_at) * 1000, 1),
+            "queries": timings.queries,
+            "rows_read": timings.rows,
+        }
+
+    def render(self, job: Job) -> bytes:
+        """Status of ``job`` as JSON, with its result once it has succeeded."""
+        body = {
+            "id": job.id,
+            "name": job.name,
+            "status": job.status,
+            "created_at": _timestamp(job.created_at),
+            "started_at": _timestamp(job.started_at),
+            "finished_at": _timestamp(job.finished_at),
+        }
+        if job.status == QUEUED and job.id in self._order:
+            body["position"] = self._order.index(job.id) + 1
+        if job.status == RUNNING:
+            body["progress"] = self._progress(job)
+        if job.error is not None:
+            body["error"] = job.error
+        if job.status == SUCCEEDED:
+            body["result"] = orjson.Fragment(job.result)
+        return orjson.dumps(body)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            **self.store.stats(),
+        }
+
+
+analytics_jobs = JobQueue(
+    MemoryJobStore(ttl=ANALYTICS_JOB_RESULT_TTL, max_finished=ANALYTICS_JOB_MAX_RESULTS),
+    workers=ANALYTICS_JOB_WORKERS,
+    queue_size=ANALYTICS_JOB_QUEUE_SIZE,
+    per_user=ANALYTICS_JOBS_PER_USER,
+)
+register_stats("analytics_jobs", analytics_jobs.stats)
@@ -0,0 +1,10 @@
+"""Registry of runtime statistics exposed by the /stats endpoint."""
+_providers = {}
+
+def register_stats(name: str, provider):
+    """Register a zero-argument callable returning a dict of statistics."""
+    _providers[name] = provider
+
+def collect_stats() -> dict:
+    """Snapshot every registered statistics provider."""
+    return {name: provider() for name, provider in _providers.items()}
@@ -0,0 +1,106 @@
+"""Connection pool instrumentation for the SQLAlchemy engines.
+
+``instrumented_pool`` wraps a queue pool class so every checkout records how
+long it waited for a connection, whether it had to open an overflow
+connection and whether it timed out. ``SessionHolds`` records how long each
+route (or background task) kept a session open, which is what actually ties
+up pooled connections under load.
+"""
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+
+class PoolStats:
+    """Checkout counters for one pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.overflow_events = 0
+        self.timeouts = 0
+
+    def record_checkout(self, waited: float, overflowed: bool):
+        with self._lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            if overflowed:
+                self.overflow_events += 1
+
+    def record_timeout(self, waited: float):
+        with self._lock:
+            self.timeouts += 1
+            self.wait_max = max(self.wait_max, waited)
+
+    def snapshot(self, pool) -> dict:
+        """Counters plus the live state of ``pool`` (the engine's current pool)."""
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "wait_avg_ms": round(1000 * self.wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(1000 * self.wait_max, 3),
+            "overflow_events": self.overflow_events,
+            "timeouts": self.timeouts,
+        }
+
+
+def instrumented_pool(pool_class, stats: PoolStats):
+    """Subclass of ``pool_class`` reporting checkouts to ``stats``.
+
+    A subclass rather than pool events, because the wait happens inside
+    ``_do_get`` before any event fires. Pools recreated after ``dispose``
+    keep the class and therefore the same counters.
+    """
+    def _do_get(self):
+        overflow = self.overflow()
+        start = perf_counter()
+        try:
+            record = pool_class._do_get(self)
+        except PoolTimeoutError:
+            stats.record_timeout(perf_counter() - start)
+            raise
+        stats.record_checkout(perf_counter() - start, self.overflow() > max(overflow, 0))
+        return record
+
+    return type(f"Instrumented{pool_class.__name__}", (pool_class,), {"_do_get": _do_get})
+
+
+class SessionHolds:
+    """Count, total and maximum session hold time per route."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            count, total, longest = self._routes.get(name, (0, 0.0, 0.0))
+            self._routes[name] = (count + 1, total + seconds, max(longest, seconds))
+
+    @contextmanager
+    def timer(self, name: str):
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, perf_counter() - start)
+
+    def stats(self) -> dict:
+        with self._lock:
+            routes = dict(self._routes)
+        return {
+            name: {
+                "sessions": count,
+                "hold_avg_ms": round(1000 * total / count, 3),
+                "hold_max_ms": round(1000 * longest, 3),
+            }
+            for name, (count, total, longest) in sorted(routes.items())
+        }
@@ -0,0 +1,68 @@
+"""Cache of authenticated principals resolved by get_current_user."""
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from app.config.settings import (ACCESS_TOKEN_EXPIRE_MINUTES, PRINCIPAL_CACHE_SIZE,
+                                 PRINCIPAL_CACHE_TTL)
+from app.core.cache import TTLCache
+from app.core.metrics import register_stats
+
+@dataclass(frozen=True)
+class Principal:
+    """Detached snapshot of the Account behind a verified token."""
+    id: int
+    username: str
+    email: Optional[str]
+    hashed_password: Optional[str]
+    social_provider: Optional[str]
+
+    @classmethod
+    def from_account(cls, account) -> "Principal":
+        return cls(
+            id=account.id,
+            username=account.username,
+            email=account.email,
+            hashed_password=account.hashed_password,
+            social_provider=account.social_provider,
+        )
+
+    @classmethod
+    def from_claims(cls, claims: dict) -> Optional["Principal"]:
+        """Principal from a token's embedded account claims, None if it has none."""
+        if "uid" not in claims:
+            return None
+        return cls(
+            id=claims["uid"],
+            username=claims["sub"],
+            email=claims.get("email"),
+            hashed_password=None,
+            social_provider=claims.get("sp"),
+        )
+
+# Keyed by the token digest; entries never outlive the token's expiry.
+# Invalidation is per process, so with several workers a change can take up
+# to PRINCIPAL_CACHE_TTL seconds to be seen everywhere.
+principal_cache = TTLCache(maxsize=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL)
+register_stats("principal_cache", principal_cache.stats)
+
+# Accounts changed by this process and the (whole) second they changed in;
+# embedded claims in tokens issued up to that second are no longer trusted.
+# ``iat`` only has whole seconds, so a token from the same second as the
+# change may predate it and is looked up instead
+_changed_accounts = TTLCache(maxsize=max(PRINCIPAL_CACHE_SIZE, 1000), ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+
+def invalidate_principal(account_id: int) -> int:
+    """Drop every cached token that resolves to the given account."""
+    _changed_accounts.set(account_id, int(time.time()))
+    return principal_cache.pop_where(lambda principal: principal.id == account_id)
+
+def embedded_principal(claims: dict) -> Optional[Principal]:
+    """Principal from embedded claims, unless the account changed since the token was issued."""
+    principal = Principal.from_claims(claims)
+    if principal is None:
+        return None
+    changed_at = _changed_accounts.get(principal.id)
+    if changed_at is not None and claims.get("iat", 0) <= changed_at:
+        return None
+    return principal
@@ -0,0 +1,132 @@
+"""Routing of read-only sessions across read replicas.
+
+Reads are spread round-robin over the replicas that passed their last health
+check. The primary serves them instead when no replica is healthy, when the
+caller recently wrote (read-your-writes, tracked per token subject), and for
+a short window after any committed change to ``users``, so shared analytics
+results are not computed from a replica that has not caught up yet.
+"""
+import asyncio
+import itertools
+import threading
+from time import monotonic
+
+from app.core.cache import TTLCache
+
+_PIN_CACHE_SIZE = 100000
+
+
+class Replica:
+    """One read replica: its session factory and last health check."""
+
+    def __init__(self, name: str, url: str, engine, session_factory, pool_stats):
+        self.name = name
+        self.url = url
+        self.engine = engine
+        self.session_factory = session_factory
+        self.pool_stats = pool_stats
+        self.healthy = True
+        self.lag = None
+        self.last_error = None
+        self.sessions = 0
+        self.failures = 0
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "lag_seconds": self.lag,
+            "last_error": self.last_error,
+            "sessions": self.sessions,
+            "failures": self.failures,
+            "pool": self.pool_stats.snapshot(self.engine.pool),
+        }
+
+
+class ReadRouter:
+    """Pick the replica (or None for the primary) serving a read-only session."""
+
+    def __init__(self, replicas, pin_seconds: float, max_lag: float, interval: float):
+        self.replicas = replicas
+        self.pin_seconds = pin_seconds
+        self.max_lag = max_lag
+        self.interval = interval
+        self._next = itertools.count()
+        self._pins = TTLCache(maxsize=_PIN_CACHE_SIZE, ttl=pin_seconds)
+        self._primary_until = 0.0
+        self._lock = threading.Lock()
+        self._task = None
+        self.primary_reads = 0
+        self.pinned_reads = 0
+
+    def pin(self, *subjects):
+        """Send reads for these token subjects to the primary for ``pin_seconds``."""
+        if self.replicas:
+            for subject in subjects:
+                if subject:
+                    self._pins.set(subject, True)
+
+    def hold_primary(self, changes=None):
+        """Send every read to the primary for ``pin_seconds`` (users commit hook)."""
+        if self.replicas:
+            self._primary_until = monotonic() + self.pin_seconds
+
+    def choose(self, subject: str = None):
+        """Replica for the next read-only session, or None for the primary."""
+        if not self.replicas:
+            return None
+        with self._lock:
+            if subject and self._pins.get(subject):
+                self.pinned_reads += 1
+                return None
+            healthy = [replica for replica in self.replicas if replica.healthy]
+            if not healthy or monotonic() < self._primary_until:
+                self.primary_reads += 1
+                return None
+            replica = healthy[next(self._next) % len(healthy)]
+            replica.sessions += 1
+            return replica
+
+    def mark_down(self, replica: Replica, error):
+        """Take a replica out of rotation until its next successful check."""
+        replica.healthy = False
+        replica.last_error = str(error)
+        replica.failures += 1
+
+    async def check(self, probe):
+        """Probe every replica once; ``probe(replica)`` returns its lag in seconds."""
+        for replica in self.replicas:
+            try:
+                lag = await asyncio.wait_for(probe(replica), timeout=self.interval)
+            except Exception as error:
+                self.mark_down(replica, str(error) or type(error).__name__)
+                continue
+            replica.lag = round(lag, 3)
+            if self.max_lag and lag > self.max_lag:
+                replica.healthy = False
+                replica.last_error = f"replication lag {lag:.1f}s exceeds {self.max_lag:g}s"
+            else:
+                replica.healthy = True
+                replica.last_error = None
+
+    async def _run(self, probe):
+        while True:
+            await self.check(probe)
+            await asyncio.sleep(self.interval)
+
+    def start(self, probe):
+        """Start the periodic health checks on the running event loop."""
+        if self.replicas and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run(probe))
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "primary_reads": self.primary_reads,
+            "pinned_reads": self.pinned_reads,
+            "replicas": {replica.name: replica.stats() for replica in self.replicas},
+        }
@@ -0,0 +1,320 @@
+"""Per-request timing breakdown and the Prometheus /metrics exposition.
+
+``RequestMetricsMiddleware`` starts a ``RequestTimings`` for every HTTP
+request in a context variable. Work on the request path adds to it: cursor
+events on the engines time each statement and count the rows it returned,
+and ``timed(phase)`` covers bcrypt, JWT and pandas; ``add_timing`` records
+time measured elsewhere, such as the wait for a hashing thread
+(``bcrypt_wait``). Context variables are
+copied into threadpool calls and tasks, which share the same
+``RequestTimings``, so work done off the event loop is attributed too.
+
+When the response is finished the totals are folded into per-route
+histograms. Phases may overlap (e.g. a pandas fallback reading from the
+database) and are not subtracted from each other. Metrics are per process.
+"""
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+from app.config.settings import SLOW_REQUEST_MS
+from app.core.metrics import collect_stats
+
+PHASES = ("db", "bcrypt", "bcrypt_wait", "jwt", "pandas")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+# Statements kept per request for the slow request log
+_SLOW_LOG_STATEMENTS = 5
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar("request_timings", default=None)
+_active = ContextVar("request_timing_phases", default=frozenset())
+
+
+class RequestTimings:
+    """Time spent per phase and database work of one request."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.queries = 0
+        self.rows = 0
+        # statement -> [executions, seconds, rows], only for the slow log
+        self.statements = {} if SLOW_REQUEST_MS else None
+
+    def add(self, phase: str, seconds: float):
+        with self._lock:
+            self.phases[phase] += seconds
+
+    def add_query(self, statement: str, seconds: float, rows: int):
+        with self._lock:
+            self.phases["db"] += seconds
+            self.queries += 1
+            self.rows += rows
+            if self.statements is not None:
+                entry = self.statements.setdefault(statement, [0, 0.0, 0])
+                entry[0] += 1
+                entry[1] += seconds
+                entry[2] += rows
+
+
+@contextmanager
+def timed(phase: str):
+    """Add the time spent in the block (or decorated function) to ``phase``.
+
+    Nested blocks of the same phase are counted once.
+    """
+    timings = _current.get()
+    active = _active.get()
+    if timings is None or phase in active:
+        yield
+        return
+    token = _active.set(active | {phase})
+    started = perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, perf_counter() - started)
+        _active.reset(token)
+
+
+@contextmanager
+def track_timings():
+    """Collect the timings of work started in the block, outside any request
+    (background jobs); yields the RequestTimings."""
+    timings = RequestTimings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+def add_timing(phase: str, seconds: float):
+    """Add ``seconds`` measured outside a ``timed`` block to ``phase``."""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+def count_rows(rows: int):
+    """Add rows fetched outside statement execution (server-side cursors)."""
+    timings = _current.get()
+    if timings is not None:
+        with timings._lock:
+            timings.rows += rows
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("request_metrics_started", []).append(perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    timings = _current.get()
+    started = conn.info.get("request_metrics_started")
+    if timings is None or not started:
+        return
+    elapsed = perf_counter() - started.pop()
+    # Only statements returning rows count as fetched rows; drivers report
+    # -1 when they do not know (e.g. server-side cursors before fetching)
+    rows = cursor.rowcount if cursor.description is not None and cursor.rowcount > 0 else 0
+    timings.add_query(statement, elapsed, rows)
+
+
+def instrument_engine(engine):
+    """Time statements run on ``engine`` (a sync Engine or ``AsyncEngine.sync_engine``)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label tuple."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, labels: tuple, value: float):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def render(self, name: str, label_names: tuple) -> list:
+        lines = []
+        for labels, (counts, total) in sorted(self.series.items()):
+            base = _labels(label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{{{base},le="{bound:g}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{name}_bucket{{{base},le="+Inf"}} {cumulative}')
+            lines.append(f"{name}_sum{{{base}}} {total:.6f}")
+            lines.append(f"{name}_count{{{base}}} {cumulative}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+class RequestMetrics:
+    """Per-route request counters and histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.phases = Histogram(LATENCY_BUCKETS)
+        self.rows = Histogram(ROWS_BUCKETS)
+        self.queries = {}
+
+    def observe(self, method: str, route: str, status: int, seconds: float, timings: RequestTimings):
+        with self._lock:
+            key = (method, route, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.duration.observe((method, route), seconds)
+            for phase, phase_seconds in timings.phases.items():
+                if phase_seconds:
+                    self.phases.observe((method, route, phase), phase_seconds)
+            self.rows.observe((method, route), timings.rows)
+            self.queries[(method, route)] = self.queries.get((method, route), 0) + timings.queries
+
+    def render(self) -> list:
+        with self._lock:
+            lines = [
+                "# HELP http_requests_total Requests by route and status.",
+                "# TYPE http_requests_total counter",
+            ]
+            lines += [
+                f"http_requests_total{{{_labels(('method', 'route', 'status'), key)}}} {count}"
+                for key, count in sorted(self.requests.items())
+            ]
+            lines += [
+                "# HELP http_request_duration_seconds Request latency by route.",
+                "# TYPE http_request_duration_seconds histogram",
+            ]
+            lines += self.duration.render("http_request_duration_seconds", ("method", "route"))
+            lines += [
+                "# HELP http_request_phase_seconds Time per request spent in db, bcrypt, bcrypt_wait, jwt or pandas.",
+                "# TYPE http_request_phase_seconds histogram",
+            ]
+            lines += self.phases.render("http_request_phase_seconds", ("method", "route", "phase"))
+            lines += [
+                "# HELP http_request_db_rows Rows fetched from the database per request.",
+                "# TYPE http_request_db_rows histogram",
+            ]
+            lines += self.rows.render("http_request_db_rows", ("method", "route"))
+            lines += [
+                "# HELP http_request_db_queries_total Statements executed by route.",
+                "# TYPE http_request_db_queries_total counter",
+            ]
+            lines += [
+                f"http_request_db_queries_total{{{_labels(('method', 'route'), key)}}} {count}"
+                for key, count in sorted(self.queries.items())
+            ]
+        return lines
+
+
+request_metrics = RequestMetrics()
+
+
+def _flatten(prefix: str, value, out: list):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(f"{prefix}.{key}" if prefix else str(key), item, out)
+    elif isinstance(value, (bool, int, float)):
+        out.append((prefix, float(value)))
+
+
+def render_prometheus() -> str:
+    """Request metrics plus every numeric /stats value in Prometheus text format."""
+    lines = request_metrics.render()
+    lines += [
+        "# HELP app_stat Numeric runtime statistics from /stats.",
+        "# TYPE app_stat gauge",
+    ]
+    for provider, stats in collect_stats().items():
+        values = []
+        _flatten("", stats, values)
+        lines += [
+            f"app_stat{{{_labels(('provider', 'key'), (provider, key))}}} {value:g}"
+            for key, value in values
+        ]
+    return "\n".join(lines) + "\n"
+
+
+def _log_slow_request(method: str, route: str, status: int, seconds: float, timings: RequestTimings):
+    phases = "".join(
+        f" {phase}={value * 1000:.1f}ms" for phase, value in timings.phases.items() if value
+    )
+    statements = sorted(timings.statements.items(), key=lambda item: item[1][1], reverse=True)
+    breakdown = "".join(
+        f"\n  {elapsed * 1000:8.1f}ms x{count} rows={rows} {' '.join(statement.split())[:300]}"
+        for statement, (count, elapsed, rows) in statements[:_SLOW_LOG_STATEMENTS]
+    )
+    logger.warning(
+        "Slow request %s %s %s %.1fms queries=%d rows=%d%s%s",
+        method, route, status, seconds * 1000, timings.queries, timings.rows, phases, breakdown
+    )
+
+
+def _route_template(scope) -> str:
+    """Path template of the matched route; never the raw path, to bound cardinality."""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Only API routes record themselves in the scope (not e.g. /docs)
+    for route in getattr(scope.get("app"), "routes", ()):
+        if route.matches(scope)[0] == Match.FULL:
+            return getattr(route, "path", "unmatched")
+    return "unmatched"
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware timing each HTTP request until its response is fully sent."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        started = perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = perf_counter() - started
+            _current.reset(token)
+            route = _route_template(scope)
+            request_metrics.observe(scope["method"], route, status, elapsed, timings)
+            if SLOW_REQUEST_MS and elapsed * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope["method"], route, status, elapsed, timings)
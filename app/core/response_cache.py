@@ -0,0 +1,201 @@
+"""Shared cache of rendered analytics responses.
+
+Entries are keyed by endpoint, parameters and a data-version counter that
+every committed write to ``users`` bumps, so a write makes all earlier
+entries unreachable without scanning the cache. The version also drives
+the ``ETag`` header. A client repeating a request with ``If-None-Match``
+gets a 304 without the result being looked up or computed.
+
+Misses go through a SingleFlight, so concurrent identical requests (a
+dashboard opened by many clients at once) share one computation.
+
+Backends implement ``get``/``set``/``get_version``/``bump_version``/``stats``.
+The in-process backend is per worker: a write only invalidates the entries
+of the worker that committed it, and other workers keep serving (and
+revalidating) their entries until ANALYTICS_CACHE_TTL expires. Its version
+starts from a random per-process prefix, so ETags never repeat across
+workers or restarts. Run with the Redis backend, which shares entries and
+the version across workers and hosts, when serving with several workers.
+"""
+import hashlib
+import secrets
+import threading
+
+import orjson
+from fastapi import Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from app.config.database import offload
+from app.config.settings import (ANALYTICS_CACHE_BACKEND, ANALYTICS_CACHE_SIZE,
+                                 ANALYTICS_CACHE_TTL, ANALYTICS_COMPUTE_TIMEOUT, REDIS_URL)
+from app.core.cache import TTLCache
+from app.core.metrics import register_stats
+from app.core.singleflight import SingleFlight
+from app.models.events import on_users_committed
+
+
+class MemoryCacheBackend:
+    """In-process LRU backend."""
+
+    blocking = False
+    shared = False
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Tells this process's versions apart from other workers' and earlier boots'
+        self._boot = secrets.token_hex(8)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        return self._cache.get(key)
+
+    def set(self, key: str, value: bytes):
+        self._cache.set(key, value)
+
+    def get_version(self) -> str:
+        return f"{self._boot}.{self._version}"
+
+    def bump_version(self) -> str:
+        with self._lock:
+            self._version += 1
+            return f"{self._boot}.{self._version}"
+
+    def stats(self) -> dict:
+        return {"backend": "memory", "data_version": self._version, **self._cache.stats()}
+
+
+class RedisCacheBackend:
+    """Backend for any client with the redis-py ``get``/``set``/``incr`` API."""
+
+    blocking = True
+    shared = True
+
+    def __init__(self, client, ttl: float, prefix: str = "analytics:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes):
+        self.client.set(self.prefix + key, value, ex=max(int(self.ttl), 1))
+
+    def get_version(self) -> int:
+        return int(self.client.get(self.prefix + "version") or 0)
+
+    def bump_version(self) -> int:
+        return self.client.incr(self.prefix + "version")
+
+    def stats(self) -> dict:
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+def create_backend():
+    """Build the backend selected by ANALYTICS_CACHE_BACKEND (None disables caching)."""
+    if ANALYTICS_CACHE_BACKEND == "memory":
+        return MemoryCacheBackend(maxsize=ANALYTICS_CACHE_SIZE, ttl=ANALYTICS_CACHE_TTL)
+    if ANALYTICS_CACHE_BACKEND == "redis":
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError(
+                "ANALYTICS_CACHE_BACKEND=redis needs the redis package (pip install redis)"
+            ) from None
+
+        return RedisCacheBackend(redis.Redis.from_url(REDIS_URL), ttl=ANALYTICS_CACHE_TTL)
+    return None
+
+
+def _dumps(payload) -> bytes:
+    return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or any(value.removeprefix("W/") == etag for value in candidates)
+
+
+class ResponseCache:
+    """Serve JSON payloads through a cache backend with ETag revalidation."""
+
+    def __init__(self, backend, flights: SingleFlight):
+        self.backend = backend
+        self.flights = flights
+
+    async def _call(self, fn, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    def bump_data_version(self, changes=None):
+        """Invalidate every cached entry (session commit hook, bulk loads)."""
+        if self.backend is None:
+            return
+        if self.backend.blocking:
+            # Commit hooks of an AsyncSession run on the event loop: a network
+            # round trip there would stall every other request
+            offload(self.backend.bump_version)
+        else:
+            self.backend.bump_version()
+
+    async def respond(self, request: Request, name: str, params, compute) -> Response:
+        """Return the cached response for ``name``/``params`` or await ``compute()``.
+
+        ``compute`` must not rely on request-scoped resources such as the
+        request's DB session: its result may be shared with other requests.
+        """
+        params_key = orjson.dumps(params, option=orjson.OPT_SORT_KEYS).decode()
+        if self.backend is None:
+            body = await self.flights.do(f"{name}:{params_key}", lambda: self._render(compute))
+            return Response(body, media_type="application/json")
+
+        version = await self._call(self.backend.get_version)
+        key = f"{name}:{version}:{params_key}"
+        etag = '"' + hashlib.sha1(key.encode()).hexdigest() + '"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        body = await self._cached(key, compute)
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def render(self, name: str, params, compute, timeout: float = None) -> bytes:
+        """The JSON body ``respond`` would send, without a request (background jobs)."""
+        params_key = orjson.dumps(params, option=orjson.OPT_SORT_KEYS).decode()
+        if self.backend is None:
+            return await self.flights.do(f"{name}:{params_key}", lambda: self._render(compute), timeout)
+        version = await self._call(self.backend.get_version)
+        return await self._cached(f"{name}:{version}:{params_key}", compute, timeout)
+
+    async def _cached(self, key: str, compute, timeout: float = None) -> bytes:
+        body = await self._call(self.backend.get, key)
+        if body is None:
+            body = await self.flights.do(key, lambda: self._render(compute, key), timeout)
+        return body
+
+    async def _render(self, compute, key: str = None) -> bytes:
+        body = _dumps(await compute())
+        if key is not None:
+            await self._call(self.backend.set, key, body)
+        return body
+
+    def stats(self) -> dict:
+        return self.backend.stats() if self.backend is not None else {"backend": "none"}
+
+
+response_cache = ResponseCache(create_backend(), SingleFlight(timeout=ANALYTICS_COMPUTE_TIMEOUT))
+on_users_committed(response_cache.bump_data_version)
+register_stats("analytics_cache", response_cache.stats)
+register_stats("analytics_single_flight", response_cache.flights.stats)
@@ -1,11 +1,55 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from time import perf_counter
 from typing import Optional
-from jose import jwt
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
-from app.config.settings import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.config.settings import (ACCESS_TOKEN_EXPIRE_MINUTES, HASH_POOL_SIZE, HASH_QUEUE_SIZE,
+                                 JWT_EMBED_ACCOUNT)
+from app.core.metrics import register_stats
+from app.core.request_metrics import add_timing, timed
+from app.core.tokens import signing_keys
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL while hashing, so a thread pool gives real parallelism
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_POOL_SIZE, thread_name_prefix="bcrypt")
+
+class HashPoolStats:
+    """Counters for the password hashing pool."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.running = 0
+        self.completed = 0
+        self.rejected = 0
+        self.hash_seconds_total = 0.0
+        self.hash_seconds_max = 0.0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            completed = self.completed or 1
+            return {
+                "pool_size": HASH_POOL_SIZE,
+                "queue_size": HASH_QUEUE_SIZE,
+                "queue_depth": self.pending - self.running,
+                "running": self.running,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "hash_seconds_avg": self.hash_seconds_total / completed,
+                "hash_seconds_max": self.hash_seconds_max,
+                "wait_seconds_avg": self.wait_seconds_total / completed,
+                "wait_seconds_max": self.wait_seconds_max,
+            }
+
+hash_pool_stats = HashPoolStats()
+register_stats("password_hashing", hash_pool_stats.snapshot)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash."""
     return pwd_context.verify(plain_password, hashed_password)
@@ -14,13 +58,86 @@ def get_password_hash(password: str) -> str:
     """Generate password hash."""
     return pwd_context.hash(password)
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
-    """Create JWT access token."""
+async def _run_in_hash_pool(fn, *args):
+    """Run a bcrypt call on the hashing pool, rejecting with 503 when saturated."""
+    stats = hash_pool_stats
+    with stats.lock:
+        if stats.pending >= HASH_POOL_SIZE + HASH_QUEUE_SIZE:
+            stats.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server is busy, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        stats.pending += 1
+    submitted = perf_counter()
+    # Hashing and queueing time of this call, reported as separate phases
+    spent = {}
+
+    def job():
+        started = perf_counter()
+        with stats.lock:
+            stats.running += 1
+        try:
+            return fn(*args)
+        finally:
+            elapsed = perf_counter() - started
+            waited = started - submitted
+            spent.update(bcrypt=elapsed, bcrypt_wait=waited)
+            with stats.lock:
+                stats.running -= 1
+                stats.completed += 1
+                stats.hash_seconds_total += elapsed
+                stats.hash_seconds_max = max(stats.hash_seconds_max, elapsed)
+                stats.wait_seconds_total += waited
+                stats.wait_seconds_max = max(stats.wait_seconds_max, waited)
+
+    def release(future):
+        # Runs once the job finished or was cancelled, even if the caller gave up
+        with stats.lock:
+            stats.pending -= 1
+
+    try:
+        future = _hash_executor.submit(job)
+    except BaseException:
+        release(None)
+        raise
+    future.add_done_callback(release)
+    try:
+        return await asyncio.wrap_future(future)
+    finally:
+        if future.done():
+            for phase, seconds in spent.items():
+                add_timing(phase, seconds)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash on the hashing pool."""
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Generate password hash on the hashing pool."""
+    return await _run_in_hash_pool(get_password_hash, password)
+
+def account_claims(account) -> dict:
+    """Account fields embedded in tokens when JWT_EMBED_ACCOUNT is enabled."""
+    if not JWT_EMBED_ACCOUNT:
+        return {}
+    return {"uid": account.id, "email": account.email, "sp": account.social_provider}
+
+@timed("jwt")
+def create_access_token(data: dict, expires_delta: Optional[timedelta] = None, account=None) -> str:
+    """Create JWT access token signed with the active key (see app.core.tokens).
+
+    With JWT_EMBED_ACCOUNT, passing the ``account`` embeds its claims so
+    read-only endpoints can skip the accounts lookup.
+    """
     to_encode = data.copy()
+    if account is not None:
+        to_encode.update(account_claims(account))
+    now = datetime.utcnow()
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = now + expires_delta
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+        expire = now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode.update({"exp": expire, "iat": now})
+    return signing_keys.sign(to_encode)
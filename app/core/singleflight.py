@@ -0,0 +1,57 @@
+"""Coalesce concurrent identical computations into one in-flight task."""
+import asyncio
+
+from fastapi import HTTPException, status
+
+
+class SingleFlight:
+    """Run at most one ``fn()`` per key at a time and share its result.
+
+    Callers arriving while a computation for the same key is running wait on
+    it instead of starting their own. Each caller waits at most ``timeout``
+    seconds (504 afterwards); the shared task keeps running so later callers
+    can still pick up its result.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._calls = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.timeouts = 0
+        self.failures = 0
+
+    def _finished(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.failures += 1
+
+    async def do(self, key, fn, timeout: float = None):
+        """Await the shared result of ``fn()`` for ``key``."""
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._finished(key, done))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+                detail="Computation is taking too long, please retry shortly"
+            )
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "failures": self.failures,
+        }
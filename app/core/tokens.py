@@ -0,0 +1,100 @@
+"""JWT signing with rotating keys and verification through a token cache.
+
+Every token names the key that signed it in its ``kid`` header. Verified
+tokens are cached by their SHA-256 digest until they expire, so a token is
+decoded and its signature checked once per process rather than on every
+request, and raw tokens are never kept in memory.
+"""
+import hashlib
+import time
+
+from jose import JWTError, jwt
+
+from app.config.settings import (ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, JWT_ACCEPT_UNKEYED,
+                                 JWT_SIGNING_KEYS, SECRET_KEY, TOKEN_CACHE_SIZE)
+from app.core.cache import TTLCache
+from app.core.metrics import register_stats
+from app.core.request_metrics import timed
+
+
+# HS256 keys shorter than the 256-bit hash output weaken it (RFC 7518, 3.2)
+MIN_SECRET_LENGTH = 32
+
+
+def parse_signing_keys(value: str) -> dict:
+    """``{kid: secret}`` from ``kid:secret,kid:secret``, in order.
+
+    Raises ValueError on an entry without a kid, a duplicate kid, or a
+    secret shorter than MIN_SECRET_LENGTH characters (including an empty one).
+    """
+    keys = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        kid, _, secret = (part.strip() for part in entry.partition(":"))
+        if not kid:
+            raise ValueError("JWT_SIGNING_KEYS: every entry needs a kid, as kid:secret")
+        if kid in keys:
+            raise ValueError(f"JWT_SIGNING_KEYS: kid {kid!r} is listed twice")
+        if len(secret) < MIN_SECRET_LENGTH:
+            raise ValueError(
+                f"JWT_SIGNING_KEYS: the secret of kid {kid!r} must have at least "
+                f"{MIN_SECRET_LENGTH} characters"
+            )
+        keys[kid] = secret
+    return keys
+
+
+class SigningKeys:
+    """The active signing key plus every key still accepted for verification."""
+
+    def __init__(self, keys: dict, unkeyed_secret: str = None):
+        self.keys = dict(keys)
+        self.active_kid = next(iter(self.keys))
+        self.unkeyed_secret = unkeyed_secret
+
+    def sign(self, claims: dict) -> str:
+        return jwt.encode(
+            claims, self.keys[self.active_kid], algorithm=ALGORITHM,
+            headers={"kid": self.active_kid}
+        )
+
+    def secret_for(self, token: str) -> str:
+        """Secret of the key named by the token's ``kid``; JWTError if not accepted."""
+        kid = jwt.get_unverified_header(token).get("kid")
+        if kid is None and self.unkeyed_secret:
+            return self.unkeyed_secret
+        try:
+            return self.keys[kid]
+        except (KeyError, TypeError):
+            raise JWTError("Unknown signing key")
+
+    def stats(self) -> dict:
+        return {"active_kid": self.active_kid, "kids": list(self.keys)}
+
+
+signing_keys = SigningKeys(
+    parse_signing_keys(JWT_SIGNING_KEYS) or {"default": SECRET_KEY},
+    SECRET_KEY if JWT_ACCEPT_UNKEYED else None
+)
+register_stats("jwt_keys", signing_keys.stats)
+
+verified_tokens = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+register_stats("verified_tokens", verified_tokens.stats)
+
+
+def token_digest(token: str) -> bytes:
+    """Cache key for a token."""
+    return hashlib.sha256(token.encode()).digest()
+
+
+def verify_token(token: str) -> dict:
+    """Claims of a validly signed, unexpired token; raises JWTError otherwise."""
+    digest = token_digest(token)
+    claims = verified_tokens.get(digest)
+    if claims is not None:
+        return claims
+    with timed("jwt"):
+        claims = jwt.decode(token, signing_keys.secret_for(token), algorithms=[ALGORITHM])
+    verified_tokens.set(digest, claims, ttl=claims.get("exp", 0) - time.time())
+    return claims
@@ -3,10 +3,16 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 import os
 from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 
-from app.api.routes import auth, users, analytics
+from app.api.routes import auth, users, analytics, stats
 from app.utils.db_utils import init_db
-from app.config.settings import SECRET_KEY
+from app.analytics.parallel import analytics_pool
+from app.analytics.snapshot import users_snapshot
+from app.config.database import read_router, run_in_read_session, start_replica_checks
+from app.config.settings import ANALYTICS_SNAPSHOT, REQUEST_METRICS, SECRET_KEY
+from app.core.jobs import analytics_jobs
+from app.core.request_metrics import RequestMetricsMiddleware
 
 # Load environment variables
 load_dotenv()
@@ -28,6 +34,10 @@ app = FastAPI(
         {
             "name": "Users",
             "description": "User operations"
+        },
+        {
+            "name": "Monitoring",
+            "description": "Runtime statistics"
         }
     ]
 )
@@ -73,15 +83,33 @@ async def add_security_headers(request: Request, call_next):
     response.headers["Cross-Origin-Embedder-Policy"] = "require-corp"
     return response
 
+# Added last so it is outermost and times the whole middleware stack
+if REQUEST_METRICS:
+    app.add_middleware(RequestMetricsMiddleware)
+
 # Include routers
 app.include_router(auth.router)
 app.include_router(users.router)
 app.include_router(analytics.router)
+app.include_router(stats.router)
 
 @app.on_event("startup")
 async def startup_event():
     """Initialize database on application startup."""
     init_db()
+    start_replica_checks()
+    if ANALYTICS_SNAPSHOT:
+        users_snapshot.start(run_in_read_session)
+    await run_in_threadpool(analytics_pool.start)
+    analytics_jobs.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background replica health checks, snapshot writes, analytics jobs and the analytics pool."""
+    read_router.stop()
+    users_snapshot.stop()
+    analytics_jobs.stop()
+    analytics_pool.stop()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,167 @@
+"""Versioned schema migrations.
+
+Revisions live in ``app/migrations/versions`` as ``NNNN_description.py``
+modules defining ``revision``, ``description``, ``upgrade(connection)`` and
+optionally ``downgrade(connection)``. They run from the CLI
+(``python -m app.cli migrate``), never at server startup, and every applied
+revision is recorded in ``schema_migrations``.
+
+A revision runs in one transaction together with its bookkeeping row unless
+it sets ``transactional = False``. It then runs in autocommit mode, which
+``CREATE INDEX CONCURRENTLY`` needs to build an index without blocking
+writes to a live table, and must be safe to re-run if interrupted.
+
+The revisions target PostgreSQL. They also apply to a SQLite stand-in
+(tests, load benchmarks), where runs are not locked against each other and
+indexes are built the plain way.
+"""
+import importlib
+import pkgutil
+import time
+from dataclasses import dataclass
+
+from sqlalchemy import (Column, DateTime, Integer, MetaData, String, Table, delete, func, insert,
+                        select, text)
+from sqlalchemy.exc import DBAPIError
+
+# Serializes concurrent migration runs (arbitrary pg_advisory_lock key)
+_LOCK_KEY = 8130457329
+_LOCK_POLL_SECONDS = 0.5
+
+migrations_table = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, server_default=func.now()),
+)
+
+
+@dataclass(frozen=True)
+class Revision:
+    version: int
+    description: str
+    module: object
+
+    @property
+    def transactional(self) -> bool:
+        return getattr(self.module, "transactional", True)
+
+
+def revisions() -> list:
+    """All revisions in ``app.migrations.versions``, oldest first."""
+    from app.migrations import versions
+
+    found = []
+    for info in pkgutil.iter_modules(versions.__path__):
+        module = importlib.import_module(f"{versions.__name__}.{info.name}")
+        found.append(Revision(module.revision, module.description, module))
+    found.sort(key=lambda revision: revision.version)
+    numbers = [revision.version for revision in found]
+    if len(set(numbers)) != len(numbers):
+        raise ValueError(f"Duplicate migration revision numbers: {numbers}")
+    return found
+
+
+def head() -> int:
+    """Number of the latest revision."""
+    return max((revision.version for revision in revisions()), default=0)
+
+
+def current_version(engine) -> int:
+    """Latest revision applied to the database (0 when it was never migrated)."""
+    with engine.connect() as connection:
+        try:
+            return connection.execute(select(func.max(migrations_table.c.version))).scalar() or 0
+        except DBAPIError:
+            return 0
+
+
+def applied_versions(connection) -> set:
+    return set(connection.execute(select(migrations_table.c.version)).scalars())
+
+
+def _run(engine, revision: Revision, step, bookkeeping):
+    if revision.transactional:
+        with engine.begin() as connection:
+            step(connection)
+            connection.execute(bookkeeping)
+        return
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        step(connection)
+        connection.execute(bookkeeping)
+
+
+def _acquire(lock):
+    # Poll instead of blocking in pg_advisory_lock: a waiting statement holds a
+    # snapshot, and the running migration's concurrent index builds would wait
+    # for it to finish, which never happens
+    while not lock.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": _LOCK_KEY}).scalar():
+        time.sleep(_LOCK_POLL_SECONDS)
+
+
+def migrate(engine, target: int = None, log=print) -> list:
+    """Upgrade (or downgrade) the database to ``target`` (default: head).
+
+    Returns the revision numbers that were applied or reverted.
+    """
+    target = head() if target is None else target
+    changed = []
+    locking = engine.dialect.name == "postgresql"
+    # Autocommit so the lock connection holds no transaction that concurrent
+    # index builds would wait for
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as lock:
+        if locking:
+            _acquire(lock)
+        try:
+            migrations_table.create(engine, checkfirst=True)
+            with engine.connect() as connection:
+                applied = applied_versions(connection)
+
+            for revision in revisions():
+                if revision.version <= target and revision.version not in applied:
+                    log(f"Applying {revision.version:04d} {revision.description}")
+                    _run(engine, revision, revision.module.upgrade, insert(migrations_table).values(
+                        version=revision.version, description=revision.description
+                    ))
+                    changed.append(revision.version)
+
+            for revision in reversed(revisions()):
+                if revision.version > target and revision.version in applied:
+                    downgrade = getattr(revision.module, "downgrade", None)
+                    if downgrade is None:
+                        raise RuntimeError(f"Revision {revision.version} cannot be downgraded")
+                    log(f"Reverting {revision.version:04d} {revision.description}")
+                    _run(engine, revision, downgrade, delete(migrations_table).where(
+                        migrations_table.c.version == revision.version
+                    ))
+                    changed.append(revision.version)
+        finally:
+            if locking:
+                lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": _LOCK_KEY})
+    return changed
+
+
+def create_index_concurrently(connection, name: str, definition: str):
+    """``CREATE INDEX CONCURRENTLY IF NOT EXISTS name definition``.
+
+    An interrupted concurrent build leaves an invalid index behind that
+    IF NOT EXISTS would keep; it is dropped and rebuilt. Other databases get
+    a plain index on the key columns, without any INCLUDE clause.
+    """
+    if connection.dialect.name != "postgresql":
+        key, _, _ = definition.partition(" INCLUDE ")
+        connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} {key}"))
+        return
+    valid = connection.execute(text(
+        "SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE c.relname = :name"
+    ), {"name": name}).scalar()
+    if valid is False:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    connection.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} {definition}"))
+
+
+def drop_index_concurrently(connection, name: str):
+    concurrently = " CONCURRENTLY" if connection.dialect.name == "postgresql" else ""
+    connection.execute(text(f"DROP INDEX{concurrently} IF EXISTS {name}"))
@@ -0,0 +1,116 @@
+"""Compare the ORM models with the schema actually deployed."""
+from sqlalchemy import Index, UniqueConstraint, inspect
+
+
+def _python_type(sql_type):
+    try:
+        return sql_type.python_type
+    except NotImplementedError:
+        return type(sql_type)
+
+
+def _sqlite_affinity(sql_type, dialect) -> str:
+    """SQLite's column affinity for a type (section 3.1 of its datatype docs)."""
+    name = sql_type.compile(dialect=dialect).upper()
+    if "INT" in name:
+        return "INTEGER"
+    if any(text in name for text in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if not name or "BLOB" in name:
+        return "BLOB"
+    if any(real in name for real in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+
+def _same_type(found, column, dialect) -> bool:
+    if dialect.name == "sqlite":
+        # SQLite stores declared types by affinity only (a TIMESTAMP column
+        # reflects as NUMERIC), so that is all there is to compare
+        return _sqlite_affinity(found, dialect) == _sqlite_affinity(column.type, dialect)
+    return _python_type(found) == _python_type(column.type)
+
+
+def _model_indexes(table, dialect) -> dict:
+    # Only PostgreSQL builds (and reports) INCLUDE columns
+    covering = dialect.name == "postgresql"
+    return {
+        index.name: (
+            tuple(column.name for column in index.columns),
+            bool(index.unique),
+            tuple(index.dialect_options["postgresql"]["include"] or ()) if covering else (),
+        )
+        for index in table.indexes
+        if isinstance(index, Index)
+    }
+
+
+def _database_indexes(inspector, table_name: str) -> dict:
+    indexes = {}
+    for index in inspector.get_indexes(table_name):
+        if index.get("duplicates_constraint"):
+            continue
+        include = tuple(index.get("dialect_options", {}).get("postgresql_include", ()))
+        columns = tuple(name for name in index["column_names"] if name not in include)
+        indexes[index["name"]] = (columns, bool(index["unique"]), include)
+    return indexes
+
+
+def schema_drift(engine, metadata) -> list:
+    """Human-readable differences between ``metadata`` and the database.
+
+    Covers tables, column presence, Python-level column types (type affinity
+    on SQLite), nullability, indexes (columns, uniqueness and, on PostgreSQL,
+    INCLUDE columns) and unique constraints.
+    """
+    dialect = engine.dialect
+    inspector = inspect(engine)
+    existing = set(inspector.get_table_names())
+    problems = []
+    for table in metadata.sorted_tables:
+        if table.name not in existing:
+            problems.append(f"table {table.name}: missing from the database")
+            continue
+
+        columns = {column["name"]: column for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            found = columns.pop(column.name, None)
+            where = f"column {table.name}.{column.name}"
+            if found is None:
+                problems.append(f"{where}: missing from the database")
+                continue
+            if not _same_type(found["type"], column, dialect):
+                problems.append(f"{where}: database type {found['type']}, model type {column.type}")
+            # SQLite reports primary key columns as nullable unless they were
+            # declared NOT NULL; the PRIMARY KEY itself is what is compared
+            nullable = found["nullable"] and not (dialect.name == "sqlite" and column.primary_key)
+            if nullable != column.nullable:
+                problems.append(
+                    f"{where}: {'nullable' if nullable else 'NOT NULL'} in the database"
+                )
+        for name in columns:
+            problems.append(f"column {table.name}.{name}: not in the models")
+
+        expected = _model_indexes(table, dialect)
+        actual = _database_indexes(inspector, table.name)
+        for name, signature in expected.items():
+            if name not in actual:
+                problems.append(f"index {name}: missing from the database")
+            elif actual[name] != signature:
+                problems.append(f"index {name}: database {actual[name]}, model {signature}")
+        for name in actual.keys() - expected.keys():
+            problems.append(f"index {name}: not in the models")
+
+        expected_unique = {
+            tuple(column.name for column in constraint.columns)
+            for constraint in table.constraints if isinstance(constraint, UniqueConstraint)
+        }
+        actual_unique = {
+            tuple(constraint["column_names"])
+            for constraint in inspector.get_unique_constraints(table.name)
+        }
+        for unique_columns in expected_unique - actual_unique:
+            problems.append(f"unique constraint on {table.name}{unique_columns}: missing from the database")
+        for unique_columns in actual_unique - expected_unique:
+            problems.append(f"unique constraint on {table.name}{unique_columns}: not in the models")
+    return problems
@@ -0,0 +1,63 @@
+"""Baseline: the schema previously created by ``Base.metadata.create_all``.
+
+Uses IF NOT EXISTS so databases created before migrations existed are
+adopted as they are.
+"""
+from sqlalchemy import text
+
+revision = 1
+description = "initial schema"
+
+STATEMENTS = [
+    """CREATE TABLE IF NOT EXISTS users (
+        id SERIAL PRIMARY KEY,
+        name VARCHAR,
+        age INTEGER,
+        city VARCHAR,
+        salary DOUBLE PRECISION,
+        join_date TIMESTAMP WITHOUT TIME ZONE
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_users_id ON users (id)",
+    """CREATE TABLE IF NOT EXISTS accounts (
+        id SERIAL PRIMARY KEY,
+        email VARCHAR,
+        username VARCHAR,
+        hashed_password VARCHAR,
+        social_id VARCHAR UNIQUE,
+        social_provider VARCHAR
+    )""",
+    "CREATE INDEX IF NOT EXISTS ix_accounts_id ON accounts (id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_accounts_email ON accounts (email)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_accounts_username ON accounts (username)",
+    """CREATE TABLE IF NOT EXISTS analytics_city (
+        city VARCHAR PRIMARY KEY,
+        count BIGINT NOT NULL,
+        salary_count BIGINT NOT NULL,
+        salary_sum DOUBLE PRECISION NOT NULL,
+        salary_sumsq DOUBLE PRECISION NOT NULL,
+        age_count BIGINT NOT NULL,
+        age_sum DOUBLE PRECISION NOT NULL,
+        age_sumsq DOUBLE PRECISION NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS analytics_age (
+        age INTEGER PRIMARY KEY,
+        count BIGINT NOT NULL,
+        salary_count BIGINT NOT NULL,
+        salary_sum DOUBLE PRECISION NOT NULL,
+        salary_sumsq DOUBLE PRECISION NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS analytics_salary_bins (
+        bin INTEGER PRIMARY KEY,
+        count BIGINT NOT NULL,
+        salary_sum DOUBLE PRECISION NOT NULL,
+        salary_sumsq DOUBLE PRECISION NOT NULL
+    )""",
+]
+
+
+def upgrade(connection):
+    for statement in STATEMENTS:
+        if connection.dialect.name == "sqlite":
+            # Only INTEGER PRIMARY KEY columns are assigned ids by SQLite
+            statement = statement.replace("SERIAL", "INTEGER")
+        connection.execute(text(statement))
@@ -1,6 +1,12 @@
-from sqlalchemy import Column, DateTime, Float, Integer, String
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column, DateTime, Float, Index, Integer, String
 from app.config.database import Base
 
+def utc_now() -> datetime:
+    """The current time the way ``User.join_date`` stores it: naive UTC."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 class User(Base):
     """Database model for users."""
     __tablename__ = "users"
@@ -9,8 +15,19 @@ class User(Base):
     name = Column(String)
     age = Column(Integer)
     city = Column(String)
-    salary = Column(Float)
-    join_date = Column(DateTime)
+    salary = Column(Float, index=True)
+    join_date = Column(DateTime, index=True)  # naive UTC, see utc_now
+
+    # Created and changed through app/migrations; keep both in sync
+    # (python -m app.cli check-schema reports drift)
+    __table_args__ = (
+        # City filters are usually combined with a join date window
+        Index("ix_users_city_join_date", "city", "join_date"),
+        # Covering indexes: per-city and per-age aggregates and filters on
+        # these columns can be answered from the index alone
+        Index("ix_users_city_covering", "city", postgresql_include=["age", "salary"]),
+        Index("ix_users_age_covering", "age", postgresql_include=["salary"]),
+    )
 
 class Account(Base):
     """Database model for user accounts."""
@@ -22,3 +39,35 @@ class Account(Base):
     hashed_password = Column(String, nullable=True)  # Made nullable for social login
     social_id = Column(String, unique=True, nullable=True)
     social_provider = Column(String, nullable=True)
+
+class CityAggregate(Base):
+    """Materialized per-city user statistics."""
+    __tablename__ = "analytics_city"
+
+    city = Column(String, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    salary_count = Column(BigInteger, nullable=False, default=0)
+    salary_sum = Column(Float, nullable=False, default=0)
+    salary_sumsq = Column(Float, nullable=False, default=0)
+    age_count = Column(BigInteger, nullable=False, default=0)
+    age_sum = Column(Float, nullable=False, default=0)
+    age_sumsq = Column(Float, nullable=False, default=0)
+
+class AgeAggregate(Base):
+    """Materialized per-age user statistics (buckets of one year)."""
+    __tablename__ = "analytics_age"
+
+    age = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    salary_count = Column(BigInteger, nullable=False, default=0)
+    salary_sum = Column(Float, nullable=False, default=0)
+    salary_sumsq = Column(Float, nullable=False, default=0)
+
+class SalaryBin(Base):
+    """Materialized fine-grained salary histogram (fixed-width bins)."""
+    __tablename__ = "analytics_salary_bins"
+
+    bin = Column(Integer, primary_key=True)
+    count = Column(BigInteger, nullable=False, default=0)
+    salary_sum = Column(Float, nullable=False, default=0)
+    salary_sumsq = Column(Float, nullable=False, default=0)
@@ -0,0 +1,92 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.models.database import User
+
+# Columns tracked for change notifications
+USER_COLUMNS = ("id", "name", "age", "city", "salary", "join_date")
+
+_flush_handlers = []
+_commit_handlers = []
+
+_PENDING_KEY = "user_changes_pending"
+_FLUSHED_KEY = "user_changes_flushed"
+
+
+def on_users_flushed(handler):
+    """Register ``handler(connection, changes)`` to run inside the flushing transaction.
+
+    ``changes`` is a list of ``(old, new)`` pairs of column dicts; ``old`` is
+    None for inserts and ``new`` is None for deletes.
+    """
+    _flush_handlers.append(handler)
+    return handler
+
+
+def on_users_committed(handler):
+    """Register ``handler(changes)`` to run after a transaction touching users commits."""
+    _commit_handlers.append(handler)
+    return handler
+
+
+def _current_values(obj) -> dict:
+    return {name: getattr(obj, name) for name in USER_COLUMNS}
+
+
+def _committed_values(obj) -> dict:
+    state = inspect(obj)
+    values = {}
+    for name in USER_COLUMNS:
+        history = state.attrs[name].history
+        if history.deleted:
+            values[name] = history.deleted[0]
+        elif history.unchanged:
+            values[name] = history.unchanged[0]
+        else:
+            values[name] = getattr(obj, name)
+    return values
+
+
+@event.listens_for(Session, "before_flush")
+def _capture_user_changes(session, flush_context, instances):
+    """Snapshot old/new User values while attributes can still be loaded."""
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, User):
+            changes.append((None, _current_values(obj)))
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            changes.append((_committed_values(obj), None))
+    for obj in session.dirty:
+        if isinstance(obj, User) and session.is_modified(obj, include_collections=False):
+            old, new = _committed_values(obj), _current_values(obj)
+            if old != new:
+                changes.append((old, new))
+    if changes:
+        session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+
+@event.listens_for(Session, "after_flush")
+def _dispatch_flushed_changes(session, flush_context):
+    changes = session.info.pop(_PENDING_KEY, None)
+    if not changes:
+        return
+    connection = session.connection()
+    for handler in _flush_handlers:
+        handler(connection, changes)
+    session.info.setdefault(_FLUSHED_KEY, []).extend(changes)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_committed_changes(session):
+    changes = session.info.pop(_FLUSHED_KEY, None)
+    if not changes:
+        return
+    for handler in _commit_handlers:
+        handler(changes)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop(_PENDING_KEY, None)
+    session.info.pop(_FLUSHED_KEY, None)
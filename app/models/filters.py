@@ -0,0 +1,64 @@
+from datetime import timezone
+
+import numpy as np
+
+from app.models.database import User
+from app.models.schemas import UserFilter
+
+
+def user_filter_clauses(filters: UserFilter) -> list:
+    """SQLAlchemy WHERE clauses for the bounds set on a UserFilter."""
+    if filters is None:
+        return []
+    clauses = []
+    if filters.city:
+        clauses.append(User.city.in_(filters.city))
+    if filters.min_age is not None:
+        clauses.append(User.age >= filters.min_age)
+    if filters.max_age is not None:
+        clauses.append(User.age <= filters.max_age)
+    if filters.min_salary is not None:
+        clauses.append(User.salary >= filters.min_salary)
+    if filters.max_salary is not None:
+        clauses.append(User.salary <= filters.max_salary)
+    if filters.joined_after is not None:
+        clauses.append(User.join_date >= _naive_utc(filters.joined_after))
+    if filters.joined_before is not None:
+        clauses.append(User.join_date <= _naive_utc(filters.joined_before))
+    return clauses
+
+
+def _naive_utc(value):
+    """join_date is stored without a time zone; compare aware bounds in UTC."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def filter_user_frame(frame, filters: UserFilter):
+    """Rows of a users DataFrame matching the same bounds as ``user_filter_clauses``."""
+    if not has_user_filters(filters):
+        return frame
+    mask = np.ones(len(frame), dtype=bool)
+    if filters.city:
+        mask &= frame['city'].isin(filters.city).to_numpy()
+    bounds = (
+        ('age', filters.min_age, filters.max_age),
+        ('salary', filters.min_salary, filters.max_salary),
+        ('join_date', filters.joined_after, filters.joined_before),
+    )
+    for column, lower, upper in bounds:
+        if column == 'join_date':
+            lower, upper = _naive_utc(lower), _naive_utc(upper)
+        if lower is not None:
+            mask &= (frame[column] >= lower).to_numpy()
+        if upper is not None:
+            mask &= (frame[column] <= upper).to_numpy()
+    return frame[mask]
+
+
+def has_user_filters(filters: UserFilter) -> bool:
+    """Whether any filter bound is set."""
+    if filters is None:
+        return False
+    return any(getattr(filters, name) is not None for name in UserFilter.model_fields)
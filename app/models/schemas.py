@@ -1,6 +1,12 @@
 from datetime import datetime
-from typing import Optional
-from pydantic import BaseModel, EmailStr
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel, EmailStr, Field, field_validator
+
+from app.config.settings import USERS_MAX_PAGE_SIZE, USERS_PAGE_SIZE
+
+UserField = Literal["id", "name", "age", "city", "salary", "join_date"]
+# "async" queues an analytics request as a background job
+AnalyticsMode = Literal["sync", "async"]
 
 class TokenData(BaseModel):
     """Pydantic model for token data."""
@@ -37,6 +43,95 @@ class UserResponse(UserBase):
     class Config:
         from_attributes = True
 
+class UserPage(BaseModel):
+    """Pydantic model for a keyset-paginated page of users."""
+    items: List[UserResponse]
+    next_cursor: Optional[int] = None
+
+class UserFilter(BaseModel):
+    """Pydantic model for filtering users (all bounds inclusive)."""
+    city: Optional[List[str]] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    min_salary: Optional[float] = None
+    max_salary: Optional[float] = None
+    joined_after: Optional[datetime] = None
+    joined_before: Optional[datetime] = None
+
+    @field_validator("city")
+    @classmethod
+    def check_city(cls, city):
+        # An empty list means no city filter, not a filter matching nothing
+        return city or None
+
+class UserQuery(UserFilter):
+    """Pydantic model for a filtered, sorted and projected user query."""
+    sort_by: UserField = "id"
+    descending: bool = False
+    fields: Optional[List[UserField]] = None
+    limit: int = Field(USERS_PAGE_SIZE, ge=1, le=USERS_MAX_PAGE_SIZE)
+    offset: int = Field(0, ge=0)
+
+def _strictly_increasing(edges):
+    if edges is not None:
+        if len(edges) < 2:
+            raise ValueError("at least two edges are required")
+        if any(upper <= lower for lower, upper in zip(edges, edges[1:])):
+            raise ValueError("edges must be strictly increasing")
+    return edges
+
+class AgeRangeQuery(UserFilter):
+    """Pydantic model for age range analytics; edges [18, 31, 46] mean 18-30 and 31-45."""
+    age_edges: Optional[List[int]] = None
+
+    @field_validator("age_edges")
+    @classmethod
+    def check_age_edges(cls, edges):
+        return _strictly_increasing(edges)
+
+class HistogramQuery(UserFilter):
+    """Pydantic model for salary histogram analytics (bin_edges overrides bins)."""
+    bins: int = Field(10, ge=1, le=1000)
+    bin_edges: Optional[List[float]] = None
+
+    @field_validator("bin_edges")
+    @classmethod
+    def check_bin_edges(cls, edges):
+        return _strictly_increasing(edges)
+
+class AnalyticsSummaryQuery(AgeRangeQuery, HistogramQuery):
+    """Pydantic model for computing every analytics grouping in one request."""
+
+class BatchAnalyticsQuery(UserFilter):
+    """Pydantic model for named analytics specs over one load of the filtered users.
+
+    Each spec is ``{"type": ..., **parameters}`` and is validated on its own
+    (see app.analytics.batch), so one bad spec does not reject the batch.
+    """
+    specs: Dict[str, Any] = Field(..., min_length=1, max_length=50)
+
+class TimeSeriesQuery(UserFilter):
+    """Pydantic model for join_date time series; the joined bounds select whole buckets."""
+    interval: Literal["day", "week", "month"] = "month"
+
+class RollingSalaryQuery(TimeSeriesQuery):
+    """Pydantic model for rolling average salary per city over ``window`` buckets."""
+    window: int = Field(3, ge=1, le=366)
+
+class QuantileQuery(BaseModel):
+    """Pydantic model for approximate quantile analytics."""
+    column: Literal["salary", "age"] = "salary"
+    quantiles: List[float] = Field([0.5, 0.9, 0.99], min_length=1)
+    city: Optional[List[str]] = None
+    group_by_city: bool = False
+
+    @field_validator("quantiles")
+    @classmethod
+    def check_quantiles(cls, quantiles):
+        if any(not 0 <= fraction <= 1 for fraction in quantiles):
+            raise ValueError("quantiles must be between 0 and 1")
+        return quantiles
+
 class UserLogin(BaseModel):
     """Pydantic model for login data validation."""
     username: str
@@ -1,10 +1,14 @@
-from datetime import datetime, timedelta
-import random
-from faker import Faker
+from datetime import datetime
+import io
+import numpy as np
+import pandas as pd
+from faker.providers.person.en_US import Provider as PersonProvider
+from sqlalchemy import insert, select, text
 from sqlalchemy.orm import Session
 
-from app.config.database import SessionLocal, Base, engine
-from app.models.database import User, Account
+from app import migrations
+from app.config.database import SessionLocal, engine
+from app.models.database import User, Account, utc_now
 from app.core.security import get_password_hash
 
 # Sample Data
@@ -17,40 +21,123 @@ CITIES = [
     'Zurich'
 ]
 
+SEED_COLUMNS = ("name", "age", "city", "salary", "join_date")
+
 def init_db():
-    """Initialize database and create sample data if not exists."""
-    Base.metadata.create_all(engine)
-    
-    db = SessionLocal()
-    
-    # Create admin account if it doesn't exist
-    if db.query(Account).count() == 0:
-        admin_password = get_password_hash("admin123")
-        admin_account = Account(
-            email="admin@example.com",
-            username="admin",
-            hashed_password=admin_password
+    """Refuse to start on a database behind the latest migration (one cheap query).
+
+    Migrations run from ``python -m app.cli migrate``, and sample data from
+    ``python -m app.cli seed``.
+    """
+    current, latest = migrations.current_version(engine), migrations.head()
+    if current < latest:
+        raise RuntimeError(
+            f"Database schema is at revision {current}, the code needs {latest}: "
+            "run `python -m app.cli migrate`"
         )
-        db.add(admin_account)
-        db.commit()
-    
-    # Create sample users if they don't exist
-    if db.query(User).count() == 0:
-        fake = Faker()
-        users = [
-            User(
-                name=fake.name(),
-                age=random.randint(18, 70),
-                city=random.choice(CITIES), 
-                salary=round(random.uniform(30000, 120000), 2),
-                join_date=datetime.now() - timedelta(days=random.randint(0, 1095))
-            )
-            for _ in range(1000)
-        ]
-        
-        db.bulk_save_objects(users)
-        db.commit()
-    db.close()
+
+def ensure_admin(db: Session, password: str) -> bool:
+    """Create the ``admin`` account if no account exists; return whether it did."""
+    if db.query(Account.id).first() is not None:
+        return False
+    db.add(Account(
+        email="admin@example.com",
+        username="admin",
+        hashed_password=get_password_hash(password)
+    ))
+    db.commit()
+    return True
+
+def _weighted_names(names) -> tuple:
+    values = np.array(list(names.keys()), dtype=object)
+    weights = np.array(list(names.values()), dtype=np.float64)
+    return values, weights / weights.sum()
+
+def generate_users(count: int, rng: np.random.Generator, now: datetime = None) -> pd.DataFrame:
+    """Random users with the same distributions as the original Faker seeding.
+
+    Join dates are naive UTC, counted back from ``now`` (default: the current UTC time).
+    """
+    now = now or utc_now()
+    first_names, first_weights = _weighted_names(PersonProvider.first_names)
+    last_names, last_weights = _weighted_names(PersonProvider.last_names)
+    names = (
+        rng.choice(first_names, size=count, p=first_weights)
+        + " "
+        + rng.choice(last_names, size=count, p=last_weights)
+    )
+    days = rng.integers(0, 1095, size=count, endpoint=True)
+    return pd.DataFrame({
+        "name": names,
+        "age": rng.integers(18, 70, size=count, endpoint=True),
+        "city": rng.choice(np.array(CITIES, dtype=object), size=count),
+        "salary": np.round(rng.uniform(30000, 120000, size=count), 2),
+        "join_date": np.datetime64(now, "us") - days.astype("timedelta64[D]"),
+    }, columns=list(SEED_COLUMNS))
+
+def _copy_frame(connection, frame: pd.DataFrame):
+    """Append a frame to ``users`` with COPY (psycopg2) or a bulk INSERT."""
+    if connection.dialect.driver != "psycopg2":
+        connection.execute(insert(User), frame.to_dict("records"))
+        return
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {User.__tablename__} ({', '.join(SEED_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+    finally:
+        cursor.close()
+
+def _delete_users(connection):
+    """Delete every user and restart ids at 1 (PostgreSQL sequence or SQLite counter)."""
+    table = User.__tablename__
+    connection.execute(text(f"DELETE FROM {table}"))
+    if connection.dialect.name == "postgresql":
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), 1, false)"
+        ))
+    elif connection.dialect.name == "sqlite":
+        # Only AUTOINCREMENT tables keep a counter; plain rowids restart by themselves
+        if connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_sequence'"
+        )).first() is not None:
+            connection.execute(text("DELETE FROM sqlite_sequence WHERE name = :table"),
+                               {"table": table})
+
+def seed_users(count: int, batch_size: int = 100000, seed: int = None,
+               truncate: bool = False, progress=None) -> int:
+    """Insert ``count`` random users in batches and return the number inserted.
+
+    Rows are loaded with COPY and bypass the session events, so callers must
+    refresh anything derived from ``users`` afterwards.
+    """
+    rng = np.random.default_rng(seed)
+    now = utc_now()
+    inserted = 0
+    with engine.begin() as connection:
+        if truncate:
+            _delete_users(connection)
+        # Into an empty table it is much faster to build the secondary
+        # indexes once at the end than to maintain them row by row
+        empty = connection.execute(select(User.id).limit(1)).first() is None
+        indexes = [index for index in User.__table__.indexes if empty]
+        for index in indexes:
+            index.drop(connection, checkfirst=True)
+        while inserted < count:
+            size = min(batch_size, count - inserted)
+            _copy_frame(connection, generate_users(size, rng, now))
+            inserted += size
+            if progress is not None:
+                progress(inserted)
+        for index in indexes:
+            index.create(connection)
+        # Fresh statistics so the planner sees the new table size
+        connection.execute(text(f"ANALYZE {User.__tablename__}"))
+    return inserted
 
 def get_db_session() -> Session:
     """Get a new database session."""
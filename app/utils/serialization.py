@@ -0,0 +1,28 @@
+"""Fast JSON encoding for user listings.
+
+Rows are selected as plain column tuples (no ORM identity map) and encoded
+straight to bytes with orjson, producing the same wire format as a
+``List[UserResponse]`` response model without building Pydantic objects.
+"""
+import orjson
+
+from app.models.database import User
+
+# Same field order as UserResponse (UserBase fields first, then id, join_date)
+USER_RESPONSE_FIELDS = ("name", "age", "city", "salary", "id", "join_date")
+USER_RESPONSE_COLUMNS = tuple(getattr(User, field) for field in USER_RESPONSE_FIELDS)
+
+
+def user_dicts(rows, fields=USER_RESPONSE_FIELDS) -> list:
+    """Map rows selected in ``fields`` order to dicts keyed by field name."""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def dumps(content) -> bytes:
+    """Encode to compact JSON; naive datetimes render like ``isoformat()``."""
+    return orjson.dumps(content)
+
+
+def ndjson_lines(rows) -> bytes:
+    """Encode rows as newline-delimited UserResponse JSON objects."""
+    return b"".join(orjson.dumps(user) + b"\n" for user in user_dicts(rows))
@@ -0,0 +1,91 @@
+"""Compare the /users/all serialization paths on synthetic rows.
+
+    python -m benchmarks.bench_users_serialization --rows 100000
+
+The baseline reproduces the previous handler: one UserResponse per ORM row,
+then FastAPI validating and encoding ``List[UserResponse]`` before
+JSONResponse renders it. The fast path is what the handler does now. The
+script also checks that both produce byte-identical bodies.
+"""
+import argparse
+import asyncio
+import random
+from datetime import datetime, timedelta
+from time import perf_counter
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.models.schemas import UserResponse
+from app.utils.serialization import USER_RESPONSE_FIELDS, dumps, user_dicts
+
+
+def make_rows(count: int):
+    random.seed(0)
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return [
+        (
+            f"User {index}",
+            random.randint(18, 70),
+            random.choice(["Berlin", "Tokyo", "Xi'an", "São Paulo"]),
+            round(random.uniform(30000, 120000), 2),
+            index,
+            now - timedelta(days=random.randint(0, 1095), microseconds=random.randint(0, 999999)),
+        )
+        for index in range(1, count + 1)
+    ]
+
+
+def baseline(rows) -> bytes:
+    users = [SimpleNamespace(**dict(zip(USER_RESPONSE_FIELDS, row))) for row in rows]
+    content = [
+        UserResponse(
+            id=user.id,
+            name=user.name,
+            age=user.age,
+            city=user.city,
+            salary=user.salary,
+            join_date=user.join_date.isoformat()
+        )
+        for user in users
+    ]
+    field = create_response_field(name="response", type_=List[UserResponse])
+    encoded = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(encoded).body
+
+
+def fast_path(rows) -> bytes:
+    return dumps(user_dicts(rows))
+
+
+def timed(fn, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        fn(rows)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    assert baseline(rows[:1000]) == fast_path(rows[:1000]), "wire format differs"
+
+    slow = timed(baseline, rows, args.repeat)
+    fast = timed(fast_path, rows, args.repeat)
+    print(f"rows={args.rows}")
+    print(f"baseline:  {slow * 1000:9.1f} ms")
+    print(f"fast path: {fast * 1000:9.1f} ms")
+    print(f"speed-up:  {slow / fast:9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,399 @@
+"""Load test the API end to end and compare results between commits.
+
+    python -m benchmarks.load run --users 100000 --concurrency 16 --output base.json
+    python -m benchmarks.load run --sqlite /tmp/bench.db --users 10000
+    python -m benchmarks.load compare base.json new.json --threshold 10
+
+``run`` seeds a database, starts ``app.main:app`` under uvicorn in a
+subprocess and drives each endpoint in turn with ``--concurrency`` clients.
+Per endpoint it reports p50/p95/p99 latency, requests per second, errors
+and the peak RSS of the server process tree as JSON.
+
+The database is the configured PostgreSQL one (or ``--database-url``), which
+is migrated and reseeded with exactly ``--users`` users, so use a scratch
+database. ``--sqlite`` uses a throwaway SQLite file instead, where
+PostgreSQL-only paths fall back to pandas.
+
+``compare`` prints the change per endpoint and metric and exits with status
+1 when p95 latency or throughput regressed by more than ``--threshold``
+percent.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+import numpy as np
+
+ADMIN_USERNAME = "admin"
+
+# name -> (path, needs a token)
+ENDPOINTS = {
+    "login": ("/login", False),
+    "users_all": ("/users/all", True),
+    "by_city": ("/analytics/by_city", True),
+    "by_age_range": ("/analytics/by_age_range", True),
+    "salary_histogram": ("/analytics/salary_histogram", True),
+    "summary": ("/analytics/summary", True),
+}
+DEFAULT_ENDPOINTS = ["login", "users_all", "by_city", "by_age_range", "salary_histogram"]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _tree_rss(pid: int):
+    """Resident set size in bytes of ``pid`` and its children (None if unknown)."""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        try:
+            process = psutil.Process(pid)
+            processes = [process] + process.children(recursive=True)
+            return sum(item.memory_info().rss for item in processes)
+        except psutil.Error:
+            return None
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class RSSSampler:
+    """Track the peak RSS of a process tree from a background thread."""
+
+    def __init__(self, pid: int, interval: float = 0.05):
+        self.pid = pid
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            rss = _tree_rss(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = _tree_rss(self.pid)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+# Run in a child process with the environment of the server under test, so it
+# seeds the database that server will use. Trees from before ``app.migrations``
+# and ``seed_users`` existed get their schema from the models and users from
+# plain INSERTs instead.
+_SEED_SCRIPT = """
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import insert
+
+from app.config.database import Base, SessionLocal, engine
+from app.core.security import get_password_hash
+from app.models.database import Account, User
+
+users, batch, sqlite, password = int(sys.argv[1]), int(sys.argv[2]), sys.argv[3] == '1', sys.argv[4]
+try:
+    from app import migrations
+    from app.utils.db_utils import ensure_admin, seed_users
+except ImportError:
+    migrations = None
+
+if migrations is None:
+    Base.metadata.create_all(engine)
+elif sqlite:
+    # The migrations are PostgreSQL DDL; build the stand-in from the models
+    Base.metadata.create_all(engine)
+    migrations.migrations_table.create(engine, checkfirst=True)
+    with engine.begin() as connection:
+        for revision in migrations.revisions():
+            connection.execute(migrations.migrations_table.insert().values(
+                version=revision.version, description=revision.description))
+else:
+    migrations.migrate(engine, log=lambda message: None)
+
+if migrations is not None:
+    db = SessionLocal()
+    ensure_admin(db, password)
+    db.close()
+    seed_users(users, batch_size=batch, seed=0, truncate=not sqlite)
+    sys.exit()
+
+db = SessionLocal()
+if db.query(Account.id).first() is None:
+    db.add(Account(email='admin@example.com', username='admin',
+                   hashed_password=get_password_hash(password)))
+    db.commit()
+db.close()
+cities = np.array(['Amsterdam', 'Berlin', 'Chicago', 'Dublin', 'Edinburgh', 'Florence',
+                   'Geneva', 'Helsinki', 'Istanbul', 'Jakarta', 'Kiev', 'London', 'Madrid',
+                   'New York', 'Oslo', 'Paris', 'Quebec', 'Rome', 'Sydney', 'Tokyo',
+                   'Uppsala', 'Venice', 'Warsaw', "Xi'an", 'Yokohama', 'Zurich'])
+rng, now = np.random.default_rng(0), datetime.now()
+with engine.begin() as connection:
+    connection.execute(User.__table__.delete())
+    for start in range(0, users, batch):
+        size = min(batch, users - start)
+        connection.execute(insert(User), [
+            {'name': f'User {start + index}', 'age': int(age), 'city': str(city),
+             'salary': round(float(salary), 2), 'join_date': now - timedelta(days=int(days))}
+            for index, (age, city, salary, days) in enumerate(zip(
+                rng.integers(18, 70, size, endpoint=True), rng.choice(cities, size),
+                rng.uniform(30000, 120000, size), rng.integers(0, 1095, size, endpoint=True)))
+        ])
+"""
+
+
+def prepare_database(env: dict, args):
+    """Create the schema and reseed users in a child process using ``env``."""
+    subprocess.run(
+        [sys.executable, "-c", _SEED_SCRIPT, str(args.users), str(args.batch_size),
+         "1" if args.sqlite else "0", args.admin_password],
+        env=env, check=True
+    )
+
+
+def start_server(env: dict, port: int, workers: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("The server exited during startup")
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/docs", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("The server did not start within 60 seconds")
+
+
+def _request_factory(name: str, token: str, password: str):
+    path, authenticated = ENDPOINTS[name]
+    if name == "login":
+        form = {"username": ADMIN_USERNAME, "password": password}
+        return lambda client: client.post(path, data=form)
+    headers = {"Authorization": f"Bearer {token}"} if authenticated else {}
+    return lambda client: client.post(path, headers=headers)
+
+
+async def drive(base_url: str, send, requests: int, concurrency: int, warmup: int) -> dict:
+    """Send ``requests`` requests from ``concurrency`` workers; return latencies."""
+    latencies, errors = [], 0
+    remaining = requests
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        for _ in range(warmup):
+            await send(client)
+
+        async def worker():
+            nonlocal remaining, errors
+            while remaining > 0:
+                remaining -= 1
+                started = time.perf_counter()
+                try:
+                    response = await send(client)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies.append(time.perf_counter() - started)
+                errors += failed
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"latencies": latencies, "errors": errors, "elapsed": elapsed}
+
+
+def summarize(result: dict, peak_rss) -> dict:
+    latencies = np.array(result["latencies"]) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) if len(latencies) else (None,) * 3
+    return {
+        "requests": len(latencies),
+        "errors": result["errors"],
+        "rps": round(len(latencies) / result["elapsed"], 2) if result["elapsed"] else None,
+        "p50_ms": round(float(p50), 3) if p50 is not None else None,
+        "p95_ms": round(float(p95), 3) if p95 is not None else None,
+        "p99_ms": round(float(p99), 3) if p99 is not None else None,
+        "mean_ms": round(float(latencies.mean()), 3) if len(latencies) else None,
+        "max_ms": round(float(latencies.max()), 3) if len(latencies) else None,
+        "peak_rss_mb": round(peak_rss / 2 ** 20, 1) if peak_rss is not None else None,
+    }
+
+
+def run(args):
+    env = dict(os.environ)
+    env.setdefault("SECRET_KEY", secrets.token_hex(32))
+    if args.sqlite:
+        if os.path.exists(args.sqlite):
+            os.remove(args.sqlite)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.sqlite)}"
+        env["DB_ASYNC"] = "false"
+    elif args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    if args.no_cache:
+        env["ANALYTICS_CACHE_BACKEND"] = "none"
+    for name in ("ANALYTICS_MATERIALIZED", "ANALYTICS_SNAPSHOT", "DATABASE_REPLICA_URLS"):
+        # Features that change what is measured must be opted into explicitly
+        env.setdefault(name, "")
+
+    print(f"Seeding {args.users} users...", file=sys.stderr)
+    prepare_database(env, args)
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = start_server(env, port, args.workers)
+    try:
+        token = httpx.post(
+            f"{base_url}/login", data={"username": ADMIN_USERNAME, "password": args.admin_password}
+        ).json()["access_token"]
+        results = {}
+        for name in args.endpoints:
+            requests = args.login_requests if name == "login" else args.requests
+            print(f"{name}: {requests} requests, concurrency {args.concurrency}", file=sys.stderr)
+            with RSSSampler(server.pid) as sampler:
+                result = asyncio.run(drive(
+                    base_url, _request_factory(name, token, args.admin_password), requests, args.concurrency, args.warmup
+                ))
+            results[name] = summarize(result, sampler.peak)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "database": "sqlite" if args.sqlite else "postgresql",
+            "users": args.users,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "analytics_cache": not args.no_cache,
+            "python": platform.python_version(),
+        },
+        "endpoints": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    print(output)
+
+
+# Metrics where a larger value is worse
+_LOWER_IS_BETTER = ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+_GATED = ("p95_ms", "rps")
+
+
+def compare(args):
+    with open(args.base) as handle:
+        base = json.load(handle)
+    with open(args.new) as handle:
+        new = json.load(handle)
+    print(f"base {base['meta'].get('commit')}  ->  new {new['meta'].get('commit')}")
+
+    regressions = []
+    metrics = ("rps", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+    print(f"{'endpoint':18}" + "".join(f"{metric:>24}" for metric in metrics))
+    for name, new_stats in new["endpoints"].items():
+        base_stats = base["endpoints"].get(name)
+        if base_stats is None:
+            continue
+        cells = []
+        for metric in metrics:
+            before, after = base_stats.get(metric), new_stats.get(metric)
+            if not before or after is None:
+                cells.append(f"{'n/a':>24}")
+                continue
+            change = (after - before) / before * 100
+            worse = change if metric in _LOWER_IS_BETTER else -change
+            if metric in _GATED and worse > args.threshold:
+                regressions.append(f"{name} {metric} {change:+.1f}%")
+            cells.append(f"{before:>9.1f} -> {after:>8.1f} {change:+4.0f}%")
+        print(f"{name:18}" + "".join(cells))
+
+    if regressions:
+        print("Regressions beyond {:g}%: {}".format(args.threshold, ", ".join(regressions)))
+        sys.exit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.load", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    running = commands.add_parser("run", help="seed, start the server and measure")
+    database = running.add_mutually_exclusive_group()
+    database.add_argument("--database-url", help="PostgreSQL URL (default: the configured database)")
+    database.add_argument("--sqlite", metavar="PATH", help="use a throwaway SQLite file instead")
+    running.add_argument("--users", type=int, default=10000, help="users to seed (1k to 10M)")
+    running.add_argument("--batch-size", type=int, default=100000)
+    running.add_argument("--admin-password", default="admin123",
+                         help="password of the admin account (created if there is none)")
+    running.add_argument("--concurrency", type=int, default=8)
+    running.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    running.add_argument("--login-requests", type=int, default=50,
+                         help="requests for /login (bcrypt bound)")
+    running.add_argument("--warmup", type=int, default=3, help="unmeasured requests per endpoint")
+    running.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    running.add_argument("--endpoints", nargs="+", choices=list(ENDPOINTS),
+                         default=DEFAULT_ENDPOINTS)
+    running.add_argument("--no-cache", action="store_true",
+                         help="disable the analytics response cache to measure computation")
+    running.add_argument("--output", help="also write the JSON report to this file")
+    running.set_defaults(handler=run)
+
+    comparing = commands.add_parser("compare", help="compare two JSON reports")
+    comparing.add_argument("base")
+    comparing.add_argument("new")
+    comparing.add_argument("--threshold", type=float, default=10,
+                           help="allowed p95/throughput regression in percent")
+    comparing.set_defaults(handler=compare)
+
+    args = parser.parse_args(argv)
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
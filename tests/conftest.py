@@ -0,0 +1,122 @@
+import os
+import secrets
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, insert, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Settings are read at import time; tokens need a signing key
+os.environ.setdefault("SECRET_KEY", "test-secret-key-for-signing-tokens")
+
+from app.config.database import Base  # noqa: E402
+from app.models.database import User  # noqa: E402
+from app.api import dependencies  # noqa: E402
+from app.api.routes import users  # noqa: E402
+
+CITIES = ["Berlin", "Dublin", "Oslo", "Paris", "Tokyo"]
+
+# Server URL of a PostgreSQL the tests may create and drop databases on,
+# e.g. postgresql://postgres@/postgres?host=/tmp/pgdata
+POSTGRES_URL = os.getenv("TEST_POSTGRES_URL")
+
+
+@pytest.fixture(scope="session")
+def users_frame() -> pd.DataFrame:
+    """Random users with a few missing values in every column."""
+    rng = np.random.default_rng(0)
+    count = 5000
+    frame = pd.DataFrame({
+        "city": rng.choice(CITIES, count).astype(object),
+        "age": rng.integers(18, 70, count, endpoint=True).astype(np.float64),
+        "salary": np.round(rng.uniform(30000, 120000, count), 2),
+        "join_date": datetime(2024, 1, 1) + pd.to_timedelta(rng.integers(0, 700, count), unit="D"),
+    })
+    for column in ("city", "age", "salary"):
+        frame.loc[rng.choice(count, 50, replace=False), column] = None
+    return frame
+
+
+@pytest.fixture
+def postgres_engine():
+    """Engine on a new, empty PostgreSQL database (skips without TEST_POSTGRES_URL)."""
+    if not POSTGRES_URL:
+        pytest.skip("TEST_POSTGRES_URL is not set")
+    name = f"test_{secrets.token_hex(4)}"
+    server = create_engine(POSTGRES_URL, isolation_level="AUTOCOMMIT")
+    with server.connect() as connection:
+        connection.execute(text(f"CREATE DATABASE {name}"))
+    engine = create_engine(make_url(POSTGRES_URL).set(database=name))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+        with server.connect() as connection:
+            connection.execute(text(f"DROP DATABASE {name}"))
+        server.dispose()
+
+
+def _insert_users(engine, frame):
+    Base.metadata.create_all(engine)
+    rows = [
+        {
+            "name": f"User {index}",
+            "city": row.city,
+            "age": None if pd.isna(row.age) else int(row.age),
+            "salary": None if pd.isna(row.salary) else row.salary,
+            "join_date": row.join_date.to_pydatetime(),
+        }
+        for index, row in enumerate(frame.itertuples())
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(User), rows)
+
+
+@pytest.fixture
+def users_db(tmp_path, users_frame):
+    """Session on a SQLite database holding ``users_frame``."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'users.db'}")
+    _insert_users(engine, users_frame)
+    with Session(engine) as db:
+        yield db
+    engine.dispose()
+
+
+@pytest.fixture
+def postgres_users_db(postgres_engine, users_frame):
+    """Session on a PostgreSQL database holding ``users_frame``."""
+    _insert_users(postgres_engine, users_frame)
+    with Session(postgres_engine) as db:
+        yield db
+
+
+@pytest.fixture(params=["users_db", "postgres_users_db"])
+def any_users_db(request):
+    """``users_frame`` on SQLite and, with TEST_POSTGRES_URL, on PostgreSQL."""
+    return request.getfixturevalue(request.param)
+
+
+@pytest.fixture
+def users_api(users_db, monkeypatch):
+    """Client for the users routes on ``users_db``, with authentication stubbed out."""
+    # Handlers run their queries in the threadpool
+    engine = create_engine(users_db.get_bind().url, connect_args={"check_same_thread": False})
+    # /users/stream opens its own session
+    monkeypatch.setattr(users, "read_session", lambda subject=None: Session(engine))
+
+    def read_db():
+        with Session(engine) as db:
+            yield db
+
+    app = FastAPI()
+    app.include_router(users.router)
+    app.dependency_overrides[dependencies.get_token_user] = lambda: None
+    app.dependency_overrides[dependencies.get_read_db] = read_db
+    with TestClient(app) as client:
+        yield client
+    engine.dispose()
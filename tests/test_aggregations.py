@@ -0,0 +1,114 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.analytics import aggregations
+from app.models.filters import filter_user_frame
+from app.models.schemas import AgeRangeQuery, HistogramQuery, UserFilter
+
+FILTERS = [None, UserFilter(city=["Berlin", "Oslo"], min_age=25)]
+
+
+# The payloads the endpoints returned when they loaded every user into pandas
+
+def _baseline_by_city(frame) -> dict:
+    frame = frame.assign(id=np.arange(1, len(frame) + 1))
+    return frame.groupby('city').agg({'id': 'count', 'salary': 'mean', 'age': 'mean'}) \
+        .round(2).to_dict('index')
+
+
+def _baseline_by_age_range(frame) -> dict:
+    result = {}
+    for range_name, (min_age, max_age) in aggregations.AGE_RANGES.items():
+        age_group = frame[(frame['age'] >= min_age) & (frame['age'] <= max_age)]
+        result[range_name] = {
+            'count': len(age_group),
+            'avg_salary': round(age_group['salary'].mean(), 2)
+        }
+    return result
+
+
+def _baseline_salary_histogram(frame) -> dict:
+    # np.histogram rejects NaN, so the baseline only ever saw complete salaries
+    salaries = frame['salary'].dropna()
+    hist, bin_edges = np.histogram(salaries, bins=10)
+    return {
+        'counts': hist.tolist(),
+        'bin_edges': bin_edges.tolist(),
+        'statistics': {
+            'mean': round(salaries.mean(), 2),
+            'median': round(salaries.median(), 2),
+            'std': round(salaries.std(), 2),
+            'min': round(salaries.min(), 2),
+            'max': round(salaries.max(), 2)
+        }
+    }
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_city_stats_match_baseline(any_users_db, users_frame, filters):
+    expected = _baseline_by_city(filter_user_frame(users_frame, filters))
+    assert aggregations.city_stats(any_users_db, filters=filters) == expected
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_age_range_stats_match_baseline(any_users_db, users_frame, filters):
+    expected = _baseline_by_age_range(filter_user_frame(users_frame, filters))
+    assert aggregations.age_range_stats(any_users_db, filters=filters) == expected
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_salary_histogram_matches_baseline(any_users_db, users_frame, filters):
+    expected = _baseline_salary_histogram(filter_user_frame(users_frame, filters))
+    assert aggregations.salary_histogram(any_users_db, filters=filters) == expected
+
+
+def test_empty_groups_report_null(any_users_db):
+    filters = UserFilter(city=["Nowhere"])
+    assert aggregations.city_stats(any_users_db, filters=filters) == {}
+    assert aggregations.age_range_stats(any_users_db, filters=filters)['18-30'] == \
+        {'count': 0, 'avg_salary': None}
+    histogram = aggregations.salary_histogram(any_users_db, filters=filters)
+    assert histogram['counts'] == [0] * 10
+    assert set(histogram['statistics'].values()) == {None}
+
+
+PARAMETERS = [
+    {},
+    {"ranges": aggregations.age_ranges_from_edges([18, 25, 40, 71]), "bins": 4},
+    # Explicit edges leave out the salaries outside them, like np.histogram
+    {"bin_edges": [40000, 60000, 65000, 100000]},
+]
+
+
+@pytest.mark.parametrize("parameters", PARAMETERS)
+@pytest.mark.parametrize("filters", FILTERS)
+def test_summary_matches_the_separate_endpoints(any_users_db, filters, parameters):
+    ranges = parameters.get("ranges", aggregations.AGE_RANGES)
+    bins, bin_edges = parameters.get("bins", 10), parameters.get("bin_edges")
+    assert aggregations.summary(any_users_db, filters=filters, **parameters) == {
+        'by_city': aggregations.city_stats(any_users_db, filters=filters),
+        'by_age_range': aggregations.age_range_stats(any_users_db, ranges, filters=filters),
+        'salary_histogram': aggregations.salary_histogram(
+            any_users_db, bins, bin_edges, filters=filters
+        ),
+    }
+
+
+@pytest.mark.parametrize("parameters", PARAMETERS)
+def test_parameters_match_pandas(any_users_db, users_frame, parameters):
+    expected = aggregations.summary_from_frame(users_frame, **parameters)
+    assert aggregations.summary(any_users_db, **parameters) == expected
+
+
+def test_age_edges_become_inclusive_ranges():
+    assert aggregations.age_ranges_from_edges([18, 31, 46]) == {"18-30": (18, 30), "31-45": (31, 45)}
+    assert aggregations.age_ranges_from_edges(None) is aggregations.AGE_RANGES
+
+
+@pytest.mark.parametrize("edges", [[18], [18, 18], [40, 30]])
+def test_edges_must_increase(edges):
+    with pytest.raises(ValidationError):
+        AgeRangeQuery(age_edges=edges)
+    with pytest.raises(ValidationError):
+        HistogramQuery(bin_edges=edges)
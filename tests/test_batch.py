@@ -0,0 +1,76 @@
+import pytest
+
+from app.analytics import batch
+from app.models.filters import filter_user_frame
+from app.models.schemas import BatchAnalyticsQuery
+
+SPECS = {
+    "cities": {"type": "by_city", "min_age": 30},
+    "ages": {"type": "by_age_range", "age_edges": [18, 40, 71]},
+    "histogram": {"type": "salary_histogram", "bins": 4, "city": ["Oslo"]},
+    "summary": {"type": "summary", "joined_after": "2024-06-01T00:00:00"},
+}
+
+BAD_SPECS = {
+    "not_an_object": ["by_city"],
+    "null": None,
+    "no_type": {"min_age": 30},
+    "unknown_type": {"type": "median"},
+    "unknown_parameter": {"type": "by_city", "citty": ["Oslo"]},
+    "invalid_parameter": {"type": "salary_histogram", "bins": 0},
+}
+
+
+def test_query_accepts_any_spec_value():
+    query = BatchAnalyticsQuery(specs={**SPECS, **BAD_SPECS})
+    assert query.specs["not_an_object"] == ["by_city"]
+
+
+def test_each_bad_spec_gets_its_own_error():
+    specs = {spec.name: spec for spec in batch.parse_specs({**SPECS, **BAD_SPECS})}
+
+    assert all(specs[name].error is None for name in SPECS)
+    assert specs["not_an_object"].error == {"message": "spec must be an object with a type"}
+    assert specs["null"].error == specs["not_an_object"].error
+    assert specs["no_type"].error["message"].startswith("type must be one of")
+    assert specs["unknown_type"].error["message"].startswith("type must be one of")
+    assert specs["unknown_parameter"].error == {"message": "unknown parameters: citty"}
+    assert specs["invalid_parameter"].error["message"] == "invalid parameters"
+    assert specs["invalid_parameter"].error["details"][0]["loc"] == ("bins",)
+
+
+def test_only_needed_columns_are_read():
+    specs = batch.parse_specs({"histogram": SPECS["histogram"], "bad": BAD_SPECS["null"]})
+    assert batch.required_columns(specs) == ["city", "salary"]
+    assert batch.required_columns(batch.parse_specs(BAD_SPECS)) == []
+
+
+@pytest.mark.parametrize("filters", [None, BatchAnalyticsQuery(specs=SPECS, max_age=60)])
+def test_chunked_run_matches_frame_evaluation(users_db, users_frame, filters):
+    specs = batch.parse_specs({**SPECS, **BAD_SPECS})
+
+    result = batch.run(users_db, specs, filters)
+
+    expected = batch.evaluate(filter_user_frame(users_frame, filters), specs)
+    assert result == expected
+    assert set(result["results"]) == set(SPECS) | set(BAD_SPECS)
+    for name in BAD_SPECS:
+        assert "error" in result["results"][name]
+    for name in SPECS:
+        assert "result" in result["results"][name]
+
+
+def test_batch_of_only_bad_specs_reads_nothing(users_db):
+    result = batch.run(users_db, batch.parse_specs(BAD_SPECS))
+    assert result["rows"] == 0
+    assert all("error" in entry for entry in result["results"].values())
+
+
+def test_failing_spec_does_not_fail_the_batch(users_frame):
+    specs = batch.parse_specs(SPECS)
+    aggregator = batch.BatchAggregator(specs, {"histogram": (None, None), "summary": (None, None)})
+    aggregator.add(users_frame.drop(columns=["join_date"]))
+
+    result = aggregator.result()["results"]
+    assert "error" in result["summary"]
+    assert "result" in result["cities"]
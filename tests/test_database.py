@@ -0,0 +1,46 @@
+import asyncio
+import threading
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.config.database import offload, run_db
+from app.models.database import User
+
+
+def _count_and_threads(session):
+    count = session.execute(select(func.count()).select_from(User)).scalar()
+    return count, threading.get_ident(), offload(threading.get_ident)
+
+
+def test_sync_session_work_runs_in_the_threadpool(users_db, users_frame):
+    async def scenario():
+        return threading.get_ident(), await run_db(users_db, _count_and_threads)
+
+    loop_thread, (count, worker, offloaded) = asyncio.run(scenario())
+    assert count == len(users_frame)
+    assert worker != loop_thread
+    # Already off the loop: offload is a plain call
+    assert offloaded == worker
+
+
+def test_async_session_offloads_from_its_greenlet(postgres_users_db, users_frame):
+    url = postgres_users_db.get_bind().url.set(drivername="postgresql+asyncpg")
+
+    async def scenario():
+        engine = create_async_engine(url)
+        try:
+            async with AsyncSession(engine) as db:
+                return threading.get_ident(), await run_db(db, _count_and_threads)
+        finally:
+            await engine.dispose()
+
+    loop_thread, (count, greenlet_thread, offloaded) = asyncio.run(scenario())
+    assert count == len(users_frame)
+    # The sync facade runs on the loop's thread; offloaded work does not
+    assert greenlet_thread == loop_thread
+    assert offloaded != loop_thread
+
+
+def test_offload_outside_run_db_is_a_plain_call():
+    assert offload(threading.get_ident) == threading.get_ident()
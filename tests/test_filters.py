@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import select
+
+from app.models.database import User
+from app.models.filters import filter_user_frame, has_user_filters, user_filter_clauses
+from app.models.schemas import UserFilter
+
+FILTERS = [
+    UserFilter(city=["Oslo", "Paris"]),
+    UserFilter(min_age=30, max_age=45, min_salary=50000),
+    UserFilter(city=["Tokyo"], max_salary=80000, joined_after="2024-06-01T00:00:00"),
+    # Aware bounds compare in UTC against the naive UTC join_date
+    UserFilter(joined_after="2024-06-01T02:00:00+02:00", joined_before="2025-01-01T09:00:00+09:00"),
+]
+
+
+def _sql_ids(db, filters) -> list:
+    statement = select(User.id).where(*user_filter_clauses(filters)).order_by(User.id)
+    return db.execute(statement).scalars().all()
+
+
+def _frame_ids(frame, filters) -> list:
+    # users_frame rows are inserted in order, so ids are the positions plus one
+    return [index + 1 for index in filter_user_frame(frame, filters).index]
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_sql_and_frame_filters_agree(any_users_db, users_frame, filters):
+    ids = _sql_ids(any_users_db, filters)
+    assert 0 < len(ids) < len(users_frame)
+    assert ids == _frame_ids(users_frame, filters)
+
+
+def test_empty_city_list_is_no_filter(users_db, users_frame):
+    filters = UserFilter(city=[])
+    assert filters.city is None and not has_user_filters(filters)
+    assert user_filter_clauses(filters) == []
+    assert len(_sql_ids(users_db, filters)) == len(users_frame)
+    assert filter_user_frame(users_frame, filters) is users_frame
+
+
+def test_query_filters_sorts_and_projects(users_api, users_frame):
+    body = {"city": ["Oslo"], "min_age": 60, "sort_by": "salary", "descending": True,
+            "fields": ["id", "salary"], "limit": 5}
+    page = users_api.post("/users/query", json=body).json()
+
+    expected = filter_user_frame(users_frame, UserFilter(city=["Oslo"], min_age=60))
+    expected = expected.dropna(subset=["salary"]).sort_values("salary", ascending=False)
+    assert page["items"] == [
+        {"id": index + 1, "salary": salary} for index, salary in expected["salary"].head(5).items()
+    ]
+    assert page["next_offset"] == 5
+
+
+def test_query_with_empty_city_list_returns_everyone(users_api, users_frame):
+    page = users_api.post("/users/query", json={"city": [], "fields": ["id"], "limit": 3}).json()
+    assert page["items"] == [{"id": 1}, {"id": 2}, {"id": 3}]
@@ -0,0 +1,152 @@
+import asyncio
+
+import orjson
+import pytest
+from fastapi import HTTPException
+
+from app.core import jobs
+from app.core.jobs import FAILED, QUEUED, RUNNING, SUCCEEDED, Job, JobQueue, MemoryJobStore
+
+
+def _queue(workers=1, queue_size=2, per_user=2, ttl=60, max_finished=10):
+    return JobQueue(MemoryJobStore(ttl=ttl, max_finished=max_finished),
+                    workers=workers, queue_size=queue_size, per_user=per_user)
+
+
+def _body(queue, job) -> dict:
+    return orjson.loads(queue.render(job))
+
+
+def test_jobs_run_in_order_and_keep_results():
+    async def scenario():
+        queue = _queue()
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return b'{"value":1}'
+
+        async def fails():
+            raise HTTPException(status_code=400, detail="bad filters")
+
+        first = queue.submit(1, "summary", slow)
+        second = queue.submit(2, "by_city", fails)
+        await asyncio.sleep(0)
+        states = _body(queue, first)["status"], _body(queue, second)
+        release.set()
+        await asyncio.sleep(0.01)
+        queue.stop()
+        return queue, first, second, states
+
+    queue, first, second, (first_state, second_body) = asyncio.run(scenario())
+    assert first_state == RUNNING
+    assert second_body["status"] == QUEUED and second_body["position"] == 1
+
+    assert _body(queue, first)["result"] == {"value": 1}
+    assert _body(queue, second)["error"] == {"status_code": 400, "detail": "bad filters"}
+    assert queue.get(first.id, owner=1) is first
+    assert queue.get(first.id, owner=2) is None
+    assert queue.stats()["succeeded"] == 1 and queue.stats()["failed"] == 1
+
+
+def test_result_headers_only_come_with_the_result():
+    async def scenario():
+        queue = _queue()
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return b"{}"
+
+        async def fails():
+            raise HTTPException(status_code=400, detail="bad filters")
+
+        def headers():
+            return {"X-Data-Source": "snapshot"}
+
+        succeeds = queue.submit(1, "summary", slow, headers)
+        failed = queue.submit(1, "summary", fails, headers)
+        await asyncio.sleep(0)
+        pending = dict(succeeds.headers)
+        release.set()
+        await asyncio.sleep(0.01)
+        queue.stop()
+        return succeeds, failed, pending
+
+    succeeds, failed, pending = asyncio.run(scenario())
+    assert pending == {}
+    assert succeeds.status == SUCCEEDED and succeeds.headers == {"X-Data-Source": "snapshot"}
+    assert failed.status == FAILED and failed.headers == {}
+
+
+def test_unexpected_errors_are_hidden(caplog):
+    async def scenario():
+        queue = _queue()
+
+        async def crash():
+            raise RuntimeError("connection string with a password")
+
+        job = queue.submit(1, "summary", crash)
+        await asyncio.sleep(0.01)
+        queue.stop()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == FAILED
+    assert job.error == {"status_code": 500, "detail": "Internal Server Error"}
+    assert "failed" in caplog.text
+
+
+def test_per_user_and_queue_limits():
+    async def scenario():
+        queue = _queue(workers=1, queue_size=2, per_user=2)
+        release = asyncio.Event()
+
+        async def wait():
+            await release.wait()
+            return b"{}"
+
+        queue.submit(1, "a", wait)
+        await asyncio.sleep(0)  # the worker takes the first job
+        queue.submit(1, "b", wait)
+        with pytest.raises(HTTPException) as per_user:
+            queue.submit(1, "c", wait)
+        queue.submit(2, "d", wait)
+        with pytest.raises(HTTPException) as full:
+            queue.submit(3, "e", wait)
+        release.set()
+        await asyncio.sleep(0.01)
+        # Finished jobs no longer count towards the user's limit
+        queue.submit(1, "f", wait)
+        stats = queue.stats()
+        queue.stop()
+        return per_user.value, full.value, stats
+
+    per_user, full, stats = asyncio.run(scenario())
+    assert per_user.status_code == 429 and per_user.headers["Retry-After"]
+    assert full.status_code == 503
+    assert stats["rejected"] == 2 and stats["submitted"] == 4
+
+
+def test_finished_jobs_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(jobs.time, "time", lambda: now[0])
+    store = MemoryJobStore(ttl=60, max_finished=2)
+
+    finished = []
+    for index in range(3):
+        job = Job(id=str(index), owner=1, name="summary", status=SUCCEEDED, finished_at=now[0])
+        store.add(job)
+        store.save(job)
+        finished.append(job)
+    running = Job(id="running", owner=1, name="summary", status=RUNNING)
+    store.add(running)
+
+    # Beyond max_finished the oldest finished job goes first
+    assert store.get("0") is None and store.get("1") is finished[1]
+
+    now[0] += 61
+    assert store.get("1") is None and store.get("2") is None
+    assert store.get("running") is running
+    assert store.stats()["expired"] == 3
+    assert store.unfinished(1) == 1
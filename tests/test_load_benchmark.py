@@ -0,0 +1,55 @@
+import argparse
+import json
+import os
+
+import pytest
+from sqlalchemy import create_engine, func, select
+
+from app.models.database import Account, User
+from benchmarks import load
+
+
+def _report(path, commit, **endpoints):
+    report = {"meta": {"commit": commit}, "endpoints": endpoints}
+    path.write_text(json.dumps(report))
+    return str(path)
+
+
+def _stats(rps, p95):
+    return {"rps": rps, "p50_ms": p95 / 2, "p95_ms": p95, "p99_ms": p95 * 2, "peak_rss_mb": 100.0}
+
+
+def test_summarize_reports_percentiles_and_throughput():
+    result = {"latencies": [i / 1000 for i in range(1, 101)], "errors": 2, "elapsed": 2.0}
+    summary = load.summarize(result, peak_rss=150 * 2 ** 20)
+    assert summary["requests"] == 100 and summary["errors"] == 2 and summary["rps"] == 50.0
+    assert summary["p50_ms"] == 50.5 and summary["max_ms"] == 100.0
+    assert summary["peak_rss_mb"] == 150.0
+
+    empty = load.summarize({"latencies": [], "errors": 0, "elapsed": 0}, None)
+    assert empty["p95_ms"] is None and empty["rps"] is None and empty["peak_rss_mb"] is None
+
+
+def test_compare_fails_only_on_gated_regressions(tmp_path, capsys):
+    base = _report(tmp_path / "base.json", "aaa", by_city=_stats(100, 20), login=_stats(10, 300))
+    better = _report(tmp_path / "better.json", "bbb", by_city=_stats(105, 21), login=_stats(10, 200))
+    load.compare(argparse.Namespace(base=base, new=better, threshold=10))
+
+    slower = _report(tmp_path / "slower.json", "ccc", by_city=_stats(80, 20), new_endpoint=_stats(1, 1))
+    with pytest.raises(SystemExit) as exit_code:
+        load.compare(argparse.Namespace(base=base, new=slower, threshold=10))
+    assert exit_code.value.code == 1
+    assert "by_city rps -20.0%" in capsys.readouterr().out
+
+
+def test_sqlite_stand_in_is_seeded(tmp_path):
+    path = tmp_path / "bench.db"
+    env = {**os.environ, "DATABASE_URL": f"sqlite:///{path}", "DB_ASYNC": "false"}
+    args = argparse.Namespace(users=500, batch_size=200, sqlite=str(path), admin_password="admin123")
+    load.prepare_database(env, args)
+
+    engine = create_engine(f"sqlite:///{path}")
+    with engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(User)).scalar() == 500
+        assert connection.execute(select(Account.username)).scalars().all() == [load.ADMIN_USERNAME]
+    engine.dispose()
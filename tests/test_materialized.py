@@ -0,0 +1,88 @@
+import pytest
+from sqlalchemy import select
+
+from app.analytics import aggregations, materialized
+from app.models import events
+from app.models.database import AgeAggregate, CityAggregate, SalaryBin, User
+
+MODELS = (CityAggregate, AgeAggregate, SalaryBin)
+
+
+@pytest.fixture
+def maintained_db(any_users_db, monkeypatch):
+    """``users_frame`` with rebuilt aggregate tables that ORM writes keep up to date."""
+    monkeypatch.setattr(events, "_flush_handlers", [materialized.apply_changes])
+    materialized.rebuild(any_users_db)
+    return any_users_db
+
+
+def _tables(db) -> dict:
+    """Aggregate rows by table and key; emptied rows are left out, as after a rebuild."""
+    tables = {}
+    for model in MODELS:
+        key = materialized._TABLES[model]
+        columns = [column.key for column in model.__table__.columns if column.key != key.key]
+        tables[model.__tablename__] = {
+            getattr(row, key.key): {name: getattr(row, name) for name in columns}
+            for row in db.scalars(select(model).where(model.count > 0))
+        }
+    return tables
+
+
+def _assert_same(tables, expected):
+    assert tables.keys() == expected.keys()
+    for name, rows in tables.items():
+        assert rows.keys() == expected[name].keys(), name
+        for key, terms in rows.items():
+            # Sums are accumulated in a different order
+            assert terms == pytest.approx(expected[name][key]), (name, key)
+
+
+def _write_changes(db):
+    db.add_all([
+        User(name="New", city="Oslo", age=33, salary=61000.5),
+        User(name="No salary", city="Lima", age=41, salary=None),
+        User(name="No city", city=None, age=None, salary=99999.0),
+    ])
+    db.commit()
+    first, second, third = db.scalars(select(User).where(User.id <= 3).order_by(User.id))
+    first.city, first.salary = "Lima", 45000.0
+    second.age = None
+    db.delete(third)
+    db.commit()
+    # A change that is undone before the flush contributes nothing
+    first.age, first.age = 99, first.age
+    db.commit()
+
+
+def test_deltas_match_a_rebuild(maintained_db):
+    _write_changes(maintained_db)
+    maintained = _tables(maintained_db)
+    assert "Lima" in maintained["analytics_city"]
+
+    materialized.rebuild(maintained_db)
+    _assert_same(maintained, _tables(maintained_db))
+
+
+def test_rolled_back_changes_are_not_applied(maintained_db):
+    before = _tables(maintained_db)
+    maintained_db.add(User(name="Gone", city="Oslo", age=20, salary=1.0))
+    maintained_db.flush()
+    maintained_db.rollback()
+    _assert_same(_tables(maintained_db), before)
+
+
+def test_payloads_match_the_live_aggregates(maintained_db):
+    _write_changes(maintained_db)
+    assert materialized.city_stats(maintained_db) == aggregations.city_stats(maintained_db)
+    assert materialized.age_range_stats(maintained_db) == \
+        aggregations.age_range_stats(maintained_db)
+
+    estimated = materialized.salary_histogram(maintained_db)
+    exact = aggregations.salary_histogram(maintained_db)
+    assert sum(estimated["counts"]) == sum(exact["counts"])
+    for name in ("mean", "std"):
+        assert estimated["statistics"][name] == pytest.approx(exact["statistics"][name], abs=0.01)
+    for name in ("min", "max", "median"):
+        assert estimated["statistics"][name] == \
+            pytest.approx(exact["statistics"][name], abs=materialized.ANALYTICS_SALARY_BIN_WIDTH)
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app import migrations
+from app.config.database import Base
+from app.migrations.drift import schema_drift
+import app.models.database  # noqa: F401  (registers the models)
+
+COVERING = {"ix_users_city_covering", "ix_users_age_covering"}
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrations.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def engine(request):
+    return request.getfixturevalue(f"{request.param}_engine")
+
+
+def _indexes(engine) -> set:
+    return {index["name"] for index in inspect(engine).get_indexes("users")}
+
+
+def _silent(message):
+    pass
+
+
+def test_revisions_are_numbered_in_order():
+    numbers = [revision.version for revision in migrations.revisions()]
+    assert numbers == sorted(numbers) == list(range(1, migrations.head() + 1))
+
+
+def test_upgrade_downgrade_round_trip(engine):
+    assert migrations.current_version(engine) == 0
+    assert migrations.migrate(engine, log=_silent) == list(range(1, migrations.head() + 1))
+    assert migrations.current_version(engine) == migrations.head()
+    assert COVERING <= _indexes(engine)
+    assert migrations.migrate(engine, log=_silent) == []
+
+    assert migrations.migrate(engine, target=1, log=_silent) == [2]
+    assert migrations.current_version(engine) == 1
+    assert not COVERING & _indexes(engine)
+
+    assert migrations.migrate(engine, log=_silent) == [2]
+    assert COVERING <= _indexes(engine)
+
+
+def test_initial_schema_assigns_ids(engine):
+    migrations.migrate(engine, log=_silent)
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO users (name) VALUES ('a'), ('b')"))
+        ids = connection.execute(text("SELECT id FROM users ORDER BY id")).scalars().all()
+    assert ids == [1, 2]
+
+
+def test_no_drift_after_migrate(engine):
+    migrations.migrate(engine, log=_silent)
+    assert schema_drift(engine, Base.metadata) == []
+
+
+def test_drift_reports_real_differences(engine):
+    migrations.migrate(engine, log=_silent)
+    with engine.begin() as connection:
+        connection.execute(text("DROP INDEX ix_users_city_join_date"))
+        connection.execute(text("ALTER TABLE users ADD COLUMN nickname VARCHAR"))
+    assert sorted(schema_drift(engine, Base.metadata)) == [
+        "column users.nickname: not in the models",
+        "index ix_users_city_join_date: missing from the database",
+    ]
+
+
+def test_baseline_cannot_be_reverted(sqlite_engine):
+    migrations.migrate(sqlite_engine, log=_silent)
+    with pytest.raises(RuntimeError):
+        migrations.migrate(sqlite_engine, target=0, log=_silent)
+
+
+def test_concurrent_runs_apply_each_revision_once(postgres_engine):
+    results = []
+
+    def run():
+        results.append(migrations.migrate(postgres_engine, log=_silent))
+
+    threads = [threading.Thread(target=run) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(version for changed in results for version in changed) == \
+        list(range(1, migrations.head() + 1))
+    with postgres_engine.connect() as connection:
+        assert migrations.applied_versions(connection) == set(range(1, migrations.head() + 1))
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import insert
+
+from app.analytics import aggregations, parallel
+from app.analytics.aggregations import AGE_RANGES
+from app.analytics.loader import salary_bounds
+from app.analytics.parallel import AnalyticsPool, reduce_chunks
+from app.analytics.partials import SalaryAggregator, SummaryAggregator
+from app.models.database import User
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = AnalyticsPool(workers=3, timeout=60)
+    monkeypatch.setattr(parallel, "analytics_pool", pool)
+    monkeypatch.setattr(parallel, "ANALYTICS_PARALLEL_MIN_ROWS", 100)
+    yield pool
+    pool.stop()
+
+
+def _summary_aggregator(db):
+    salary = SalaryAggregator.for_bounds(*salary_bounds(db, [None])[0])
+    return SummaryAggregator(AGE_RANGES, salary.edges.tolist(), salary.clamp)
+
+
+def test_shards_cover_every_id(users_db, pool):
+    shards = parallel._shards(users_db, None)
+    assert len(shards) == 3
+    assert shards[0][0] is None and shards[-1][1] is None
+    assert all(upper == lower for (_, upper), (lower, _) in zip(shards, shards[1:]))
+
+
+def test_parallel_result_matches_the_frame(users_db, users_frame, pool):
+    aggregator = reduce_chunks(users_db, _summary_aggregator(users_db), ["city", "age", "salary"])
+    assert pool.parallel_runs == 1 and pool.shards == 3
+    assert aggregator.result() == aggregations.summary_from_frame(users_frame)
+
+
+def test_rows_written_after_the_split_are_counted(users_db, pool):
+    aggregator = _summary_aggregator(users_db)
+    shards = parallel._shards(users_db, None)
+    # A user committed between the parent's reads and the shards' reads,
+    # beyond both the highest id and the salary range the edges came from
+    with users_db.get_bind().begin() as connection:
+        connection.execute(insert(User), [{"name": "late", "city": "Oslo", "age": 30,
+                                           "salary": 1_000_000.0}])
+    url = parallel._worker_url(users_db)
+    edges = aggregator.parts["salary_histogram"].edges.tolist()
+    for lower, upper in shards:
+        empty = SummaryAggregator(AGE_RANGES, edges, clamp=True)
+        shard, _ = parallel._reduce_shard(url, empty, ["city", "age", "salary"], None, lower, upper)
+        aggregator.merge(shard)
+
+    histogram = aggregator.result()["salary_histogram"]
+    total = users_db.query(User).filter(User.salary.isnot(None)).count()
+    assert sum(histogram["counts"]) == total
+    assert histogram["statistics"]["max"] == 1_000_000.0
+
+
+def test_only_derived_edges_clamp():
+    frame = pd.DataFrame({"salary": np.array([5.0, 15.0, 25.0, 1000.0])})
+    explicit = SalaryAggregator.for_bounds(None, None, bin_edges=[10, 20, 30])
+    derived = SalaryAggregator.for_bounds(10.0, 30.0, bins=2)
+    explicit.add(frame)
+    derived.add(frame)
+    assert explicit.counts.tolist() == [1, 1]
+    assert derived.counts.tolist() == [2, 2]
@@ -0,0 +1,91 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from app.analytics import aggregations
+from app.analytics.aggregations import AGE_RANGES
+from app.analytics.loader import iter_chunks
+from app.analytics.parallel import reduce_chunks
+from app.analytics.partials import (AgeRangeAggregator, CityAggregator, MedianAccumulator,
+                                    SalaryAggregator, SummaryAggregator)
+
+
+def _edges(frame, bins=10):
+    salaries = frame["salary"].dropna()
+    return aggregations.histogram_edges(salaries.min(), salaries.max(), bins)
+
+
+AGGREGATORS = {
+    "by_city": (lambda frame: CityAggregator(), aggregations.city_stats_from_frame),
+    "by_age_range": (lambda frame: AgeRangeAggregator(AGE_RANGES),
+                     aggregations.age_range_stats_from_frame),
+    "salary_histogram": (lambda frame: SalaryAggregator(_edges(frame)),
+                         lambda frame: aggregations.salary_histogram_from_series(frame["salary"])),
+    "summary": (lambda frame: SummaryAggregator(AGE_RANGES, _edges(frame)),
+                aggregations.summary_from_frame),
+}
+
+
+def _split(frame, parts):
+    bounds = np.linspace(0, len(frame), parts + 1).astype(int)
+    return [frame.iloc[lower:upper] for lower, upper in zip(bounds, bounds[1:])]
+
+
+def _fed(aggregator, frame, chunks):
+    for chunk in _split(frame, chunks):
+        aggregator.add(chunk)
+    return aggregator
+
+
+@pytest.mark.parametrize("name", AGGREGATORS)
+@pytest.mark.parametrize("chunks", [1, 7])
+def test_chunked_result_matches_frame(users_frame, name, chunks):
+    create, from_frame = AGGREGATORS[name]
+    assert _fed(create(users_frame), users_frame, chunks).result() == from_frame(users_frame)
+
+
+@pytest.mark.parametrize("name", AGGREGATORS)
+def test_merged_shards_match_inline(users_frame, name):
+    create, _ = AGGREGATORS[name]
+    inline = _fed(create(users_frame), users_frame, 5)
+
+    empty = create(users_frame)
+    merged = create(users_frame)
+    for shard in _split(users_frame, 3):
+        # Shards travel to pool processes and back as pickles of the empty aggregator
+        merged.merge(_fed(pickle.loads(pickle.dumps(empty)), shard, 2))
+    merged.merge(create(users_frame))
+
+    assert merged.result() == inline.result()
+
+
+def test_median_is_exact_up_to_the_limit():
+    values = np.random.default_rng(1).normal(size=1001)
+    median = MedianAccumulator(limit=2000)
+    for part in np.array_split(values, 4):
+        median.add(part)
+    assert median.exact and median.result() == np.median(values)
+
+
+def test_median_estimate_beyond_the_limit():
+    values = np.random.default_rng(2).uniform(0, 1, 50_000)
+    spilled, exact = MedianAccumulator(limit=10_000), MedianAccumulator(limit=10_000)
+    for part in np.array_split(values[:40_000], 8):
+        spilled.add(part)
+    exact.add(values[40_000:])
+    spilled.merge(exact)
+
+    assert not spilled.exact and spilled.count == len(values)
+    ordered = np.sort(values)
+    rank = np.searchsorted(ordered, spilled.result()) / len(values)
+    assert abs(rank - 0.5) <= spilled.sketch.rank_error()
+
+
+def test_reduce_chunks_inline_matches_frame(users_db, users_frame):
+    chunks = list(iter_chunks(users_db, ["city", "age", "salary"], chunk_rows=600))
+    assert len(chunks) == 9 and chunks[0]["city"].dtype == "category"
+
+    aggregator = reduce_chunks(users_db, SummaryAggregator(AGE_RANGES, _edges(users_frame)),
+                               ["city", "age", "salary"])
+    assert aggregator.result() == aggregations.summary_from_frame(users_frame)
@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from app.config import database
+from app.core.pool import PoolStats, SessionHolds, instrumented_pool
+
+
+@pytest.fixture
+def pooled(tmp_path):
+    stats = PoolStats()
+    engine = create_engine(f"sqlite:///{tmp_path / 'pool.db'}",
+                           poolclass=instrumented_pool(QueuePool, stats),
+                           pool_size=1, max_overflow=1, pool_timeout=0.05)
+    yield engine, stats
+    engine.dispose()
+
+
+def test_checkouts_overflow_and_timeouts_are_counted(pooled):
+    engine, stats = pooled
+    first, second = engine.connect(), engine.connect()
+    with pytest.raises(PoolTimeoutError):
+        engine.connect()
+
+    snapshot = stats.snapshot(engine.pool)
+    assert snapshot["checked_out"] == 2 and snapshot["overflow"] == 1
+    assert snapshot["checkouts"] == 2 and snapshot["overflow_events"] == 1
+    assert snapshot["timeouts"] == 1 and snapshot["wait_max_ms"] >= 50
+
+    second.close()
+    first.close()
+    engine.connect().close()
+    snapshot = stats.snapshot(engine.pool)
+    assert snapshot["checkouts"] == 3 and snapshot["overflow_events"] == 1
+    assert snapshot["checked_out"] == 0
+
+
+def test_counters_survive_dispose(pooled):
+    engine, stats = pooled
+    engine.connect().close()
+    engine.dispose()
+    engine.connect().close()
+    assert stats.snapshot(engine.pool)["checkouts"] == 2
+
+
+def test_session_holds_per_route():
+    holds = SessionHolds()
+    for _ in range(2):
+        with holds.timer("/users/page"):
+            pass
+    with pytest.raises(RuntimeError):
+        with holds.timer("/analytics/summary"):
+            raise RuntimeError("query failed")
+
+    stats = holds.stats()
+    assert list(stats) == ["/analytics/summary", "/users/page"]
+    assert stats["/users/page"]["sessions"] == 2 and stats["/analytics/summary"]["sessions"] == 1
+
+
+def test_statement_timeout_reaches_the_drivers(monkeypatch):
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 1500)
+    url = "postgresql://app@db/app"
+    assert database._connect_args(url, is_async=False) == {"options": "-c statement_timeout=1500"}
+    assert database._connect_args(url, is_async=True) == \
+        {"server_settings": {"statement_timeout": "1500"}}
+    assert database._connect_args("sqlite:///app.db", is_async=False) == \
+        {"check_same_thread": False}
+
+    monkeypatch.setattr(database, "DB_STATEMENT_TIMEOUT_MS", 0)
+    assert database._connect_args(url, is_async=False) == {}
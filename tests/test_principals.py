@@ -0,0 +1,100 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from app.api import dependencies
+from app.config.database import Base
+from app.core import cache, principals, security
+from app.core.cache import TTLCache
+from app.core.principals import Principal, invalidate_principal
+from app.models.database import Account
+
+
+@pytest.fixture
+def accounts(tmp_path, monkeypatch):
+    """An accounts database behind open_read_session; returns the statements it ran."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'accounts.db'}",
+                           connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add_all([Account(id=7, username="alice", email="a@example.com", hashed_password="h"),
+                    Account(id=8, username="bob", email="b@example.com", hashed_password="h")])
+        db.commit()
+
+    statements = []
+    event.listen(engine, "before_cursor_execute",
+                 lambda conn, cursor, statement, *args: statements.append(statement))
+
+    async def open_read_session(subject=None):
+        return Session(engine)
+
+    monkeypatch.setattr(dependencies, "open_read_session", open_read_session)
+    monkeypatch.setattr(principals, "principal_cache", TTLCache(maxsize=10, ttl=300))
+    monkeypatch.setattr(dependencies, "principal_cache", principals.principal_cache)
+    monkeypatch.setattr(principals, "_changed_accounts", TTLCache(maxsize=10, ttl=3600))
+    yield statements
+    engine.dispose()
+
+
+def _current_user(token):
+    return asyncio.run(dependencies.get_current_user(token))
+
+
+def test_principal_is_looked_up_once_per_token(accounts):
+    token = security.create_access_token({"sub": "alice"})
+    first, second = _current_user(token), _current_user(token)
+    assert first == second == Principal(id=7, username="alice", email="a@example.com",
+                                        hashed_password="h", social_provider=None)
+    assert len(accounts) == 1
+
+    # Another token for the same account is cached separately
+    _current_user(security.create_access_token({"sub": "alice", "jti": "2"}))
+    assert len(accounts) == 2
+
+
+def test_invalidation_evicts_cached_principals(accounts):
+    alice = [security.create_access_token({"sub": "alice", "jti": str(n)}) for n in range(2)]
+    bob = security.create_access_token({"sub": "bob"})
+    for token in [*alice, bob]:
+        _current_user(token)
+
+    assert invalidate_principal(7) == 2
+    _current_user(bob)
+    assert len(accounts) == 3
+    _current_user(alice[0])
+    assert len(accounts) == 4
+
+
+def test_unknown_accounts_are_not_cached(accounts):
+    token = security.create_access_token({"sub": "mallory"})
+    for _ in range(2):
+        with pytest.raises(HTTPException) as error:
+            _current_user(token)
+        assert error.value.status_code == 401
+    assert len(accounts) == 2
+
+
+def test_entries_never_outlive_the_token(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache, "monotonic", lambda: now[0])
+    entries = TTLCache(maxsize=2, ttl=60)
+    entries.set("token", "principal", ttl=5)
+    # A token that expired before it was cached
+    entries.set("expired", "principal", ttl=-1)
+
+    assert entries.get("expired") is None
+    now[0] += 6
+    assert entries.get("token") is None
+
+
+def test_least_recently_used_entry_is_evicted():
+    entries = TTLCache(maxsize=2, ttl=60)
+    entries.set("a", 1)
+    entries.set("b", 2)
+    entries.get("a")
+    entries.set("c", 3)
+    assert entries.get("b") is None and entries.get("a") == 1 and entries.get("c") == 3
+    assert entries.stats()["evictions"] == 1
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from app.api import dependencies  # noqa: F401  (registers the users commit hook)
+from app.config import database
+from app.core import cache, replicas
+from app.core.pool import PoolStats
+from app.core.replicas import ReadRouter, Replica
+from app.models import events
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(replicas, "monotonic", lambda: now[0])
+    monkeypatch.setattr(cache, "monotonic", lambda: now[0])
+    return now
+
+
+def _replica(name, url="sqlite://"):
+    engine = create_engine(url, poolclass=QueuePool)
+    return Replica(name, url, engine, sessionmaker(bind=engine), PoolStats())
+
+
+def _router(count=2, max_lag=5.0):
+    return ReadRouter([_replica(f"replica_{index}") for index in range(count)],
+                      pin_seconds=2, max_lag=max_lag, interval=1)
+
+
+def _names(router, reads=4, subject=None) -> list:
+    return [getattr(router.choose(subject), "name", None) for _ in range(reads)]
+
+
+def test_reads_rotate_over_healthy_replicas(clock):
+    router = _router(3)
+    assert _names(router, 4) == ["replica_0", "replica_1", "replica_2", "replica_0"]
+    router.replicas[1].healthy = False
+    assert set(_names(router, 4)) == {"replica_0", "replica_2"}
+    for replica in router.replicas:
+        replica.healthy = False
+    assert _names(router, 2) == [None, None]
+    assert router.stats()["primary_reads"] == 2
+
+
+def test_writers_read_their_writes_from_the_primary(clock):
+    router = _router()
+    router.pin("alice")
+    assert _names(router, 2, "alice") == [None, None]
+    assert None not in _names(router, 2, "bob")
+    clock[0] += 2.1
+    assert None not in _names(router, 2, "alice")
+    assert router.stats()["pinned_reads"] == 2
+
+
+def test_users_commit_holds_every_read_on_the_primary(clock):
+    router = _router()
+    router.hold_primary([({"city": "Oslo"}, None)])
+    assert _names(router, 2, "anyone") == [None, None]
+    clock[0] += 2.1
+    assert None not in _names(router, 2)
+    assert database.read_router.hold_primary in events._commit_handlers
+
+
+def test_without_replicas_everything_goes_to_the_primary():
+    router = _router(0)
+    router.pin("alice")
+    router.hold_primary()
+    assert router.choose("alice") is None
+    assert router.stats() == {"primary_reads": 0, "pinned_reads": 0, "replicas": {}}
+
+
+def test_health_checks_follow_errors_and_lag():
+    router = _router(3)
+    lags = {"replica_0": 0.2, "replica_1": 30.0}
+
+    async def probe(replica):
+        if replica.name not in lags:
+            raise ConnectionRefusedError()
+        return lags[replica.name]
+
+    asyncio.run(router.check(probe))
+    healthy = {replica.name: replica.healthy for replica in router.replicas}
+    assert healthy == {"replica_0": True, "replica_1": False, "replica_2": False}
+    assert router.replicas[1].last_error == "replication lag 30.0s exceeds 5s"
+    assert router.replicas[2].last_error == "ConnectionRefusedError"
+
+    lags.update(replica_1=1.0, replica_2=0.0)
+    asyncio.run(router.check(probe))
+    assert all(replica.healthy and replica.last_error is None for replica in router.replicas)
+    assert router.replicas[2].failures == 1
+
+
+def test_unreachable_replica_falls_back_to_the_primary(tmp_path, monkeypatch):
+    unreachable = _replica("replica_0", f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    router = ReadRouter([unreachable], pin_seconds=2, max_lag=0, interval=1)
+    monkeypatch.setattr(database, "read_router", router)
+
+    db = database.read_session()
+    try:
+        assert db.get_bind() is database.engine
+    finally:
+        db.close()
+    assert not unreachable.healthy and unreachable.failures == 1
+    assert router.choose() is None
@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.api import dependencies
+from app.core import request_metrics
+from app.core.request_metrics import RequestMetrics, RequestMetricsMiddleware, timed
+from app.core.tokens import signing_keys
+
+
+def _user_token() -> str:
+    now = int(time.time())
+    return signing_keys.sign({"sub": "alice", "uid": 7, "iat": now, "exp": now + 60})
+
+
+def test_metrics_need_the_scrape_token_or_a_user_token(monkeypatch):
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "scrape-secret")
+
+    assert asyncio.run(dependencies.get_metrics_reader("scrape-secret")) is None
+    assert asyncio.run(dependencies.get_metrics_reader(_user_token())).username == "alice"
+    with pytest.raises(HTTPException) as denied:
+        asyncio.run(dependencies.get_metrics_reader("scrape-secreT"))
+    assert denied.value.status_code == 401
+
+
+def test_without_scrape_token_only_user_tokens_pass(monkeypatch):
+    monkeypatch.setattr(dependencies, "METRICS_TOKEN", "")
+    with pytest.raises(HTTPException):
+        asyncio.run(dependencies.get_metrics_reader(""))
+
+
+def test_phases_are_recorded_per_route(monkeypatch):
+    metrics = RequestMetrics()
+    monkeypatch.setattr(request_metrics, "request_metrics", metrics)
+    app = FastAPI()
+    app.add_middleware(RequestMetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def item(item_id: int):
+        with timed("pandas"):
+            with timed("pandas"):
+                time.sleep(0.01)
+        return {"id": item_id}
+
+    client = TestClient(app)
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+
+    lines = metrics.render()
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 2' in lines
+    pandas = [line for line in lines
+              if line.startswith('http_request_phase_seconds_sum{method="GET",route="/items/{item_id}",phase="pandas"}')]
+    # Nested blocks of the same phase count once
+    assert len(pandas) == 1 and 0.02 <= float(pandas[0].split()[-1]) < 0.2
+    assert not any('phase="db"' in line for line in lines)
@@ -0,0 +1,119 @@
+import asyncio
+import threading
+
+from sqlalchemy.util import greenlet_spawn
+from starlette.requests import Request
+
+from app.core.response_cache import MemoryCacheBackend, RedisCacheBackend, ResponseCache
+from app.core.singleflight import SingleFlight
+
+
+def _request(etag=None):
+    headers = [(b"if-none-match", etag.encode())] if etag else []
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": headers})
+
+
+class _Counter:
+    def __init__(self):
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        return {"calls": self.calls}
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.incr_thread = threading.get_ident()
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+def _cache(backend):
+    return ResponseCache(backend, SingleFlight(timeout=5))
+
+
+def _respond(cache, compute, etag=None, params=None):
+    return asyncio.run(cache.respond(_request(etag), "summary", params or {"city": ["Berlin"]}, compute))
+
+
+def test_etag_revalidation_and_invalidation():
+    cache = _cache(MemoryCacheBackend(maxsize=8, ttl=60))
+    compute = _Counter()
+
+    first = _respond(cache, compute)
+    etag = first.headers["etag"]
+    assert first.status_code == 200 and first.body == b'{"calls":1}'
+
+    assert _respond(cache, compute, etag).status_code == 304
+    assert _respond(cache, compute, "W/" + etag).status_code == 304
+    assert _respond(cache, compute, '"other"').body == b'{"calls":1}'
+    assert _respond(cache, compute, etag, params={"city": ["Paris"]}).status_code == 200
+    assert compute.calls == 2
+
+    cache.bump_data_version()
+    fresh = _respond(cache, compute, etag)
+    assert fresh.status_code == 200 and fresh.body == b'{"calls":3}'
+    assert fresh.headers["etag"] != etag
+
+
+def test_memory_etags_differ_between_processes():
+    # Two workers (or one restarted) at the same number of writes
+    first, second = _cache(MemoryCacheBackend(8, 60)), _cache(MemoryCacheBackend(8, 60))
+    etag = _respond(first, _Counter()).headers["etag"]
+    assert _respond(second, _Counter(), etag).status_code == 200
+
+
+def test_redis_backend_shares_version():
+    client = _FakeRedis()
+    first, second = _cache(RedisCacheBackend(client, 60)), _cache(RedisCacheBackend(client, 60))
+    compute = _Counter()
+
+    etag = _respond(first, compute).headers["etag"]
+    assert _respond(second, compute, etag).status_code == 304
+    assert _respond(second, compute).body == b'{"calls":1}'
+
+    first.bump_data_version()
+    assert _respond(second, compute, etag).status_code == 200
+    assert compute.calls == 2
+
+
+def test_redis_bump_leaves_the_event_loop():
+    client = _FakeRedis()
+    cache = _cache(RedisCacheBackend(client, 60))
+
+    async def commit_hook():
+        # AsyncSession runs commit hooks in a greenlet on the loop's thread
+        await greenlet_spawn(cache.bump_data_version)
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(commit_hook())
+    assert client.data == {"analytics:version": 1}
+    assert client.incr_thread != loop_thread
+
+
+def test_concurrent_misses_share_one_computation():
+    cache = _cache(MemoryCacheBackend(8, 60))
+    compute = _Counter()
+
+    async def slow():
+        await asyncio.sleep(0.01)
+        return await compute()
+
+    async def scenario():
+        return await asyncio.gather(*[
+            cache.respond(_request(), "summary", {}, slow) for _ in range(5)
+        ])
+
+    responses = asyncio.run(scenario())
+    assert compute.calls == 1
+    assert {response.body for response in responses} == {b'{"calls":1}'}
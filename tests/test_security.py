@@ -0,0 +1,69 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import security
+
+
+@pytest.fixture
+def hash_pool(monkeypatch):
+    """One hashing thread and one queue slot, with fresh counters."""
+    executor = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(security, "HASH_POOL_SIZE", 1)
+    monkeypatch.setattr(security, "HASH_QUEUE_SIZE", 1)
+    monkeypatch.setattr(security, "_hash_executor", executor)
+    monkeypatch.setattr(security, "hash_pool_stats", security.HashPoolStats())
+    yield security.hash_pool_stats
+    executor.shutdown(wait=True)
+
+
+def test_saturated_pool_rejects_with_503(hash_pool):
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.ensure_future(security._run_in_hash_pool(release.wait))
+        queued = asyncio.ensure_future(security._run_in_hash_pool(lambda: "queued"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(HTTPException) as rejected:
+            await security._run_in_hash_pool(lambda: "rejected")
+        depth = hash_pool.snapshot()["queue_depth"]
+        release.set()
+        return rejected.value, depth, await running, await queued
+
+    rejected, depth, running, queued = asyncio.run(scenario())
+    assert rejected.status_code == 503 and rejected.headers == {"Retry-After": "1"}
+    assert depth == 1
+    assert (running, queued) == (True, "queued")
+    stats = hash_pool.snapshot()
+    assert stats["rejected"] == 1 and stats["completed"] == 2 and stats["running"] == 0
+
+
+def test_slot_is_held_until_an_abandoned_hash_finishes(hash_pool):
+    release = threading.Event()
+
+    async def scenario():
+        caller = asyncio.ensure_future(security._run_in_hash_pool(release.wait))
+        await asyncio.sleep(0.01)
+        caller.cancel()
+        await asyncio.sleep(0.01)
+        # The thread is still hashing for the client that gave up
+        pending = hash_pool.pending
+        release.set()
+        await asyncio.sleep(0.05)
+        return pending
+
+    assert asyncio.run(scenario()) == 1
+    assert hash_pool.pending == 0
+
+
+def test_async_hashing_round_trip(hash_pool):
+    async def scenario():
+        hashed = await security.get_password_hash_async("correct horse")
+        return (await security.verify_password_async("correct horse", hashed),
+                await security.verify_password_async("wrong", hashed))
+
+    assert asyncio.run(scenario()) == (True, False)
+    assert hash_pool.snapshot()["completed"] == 3
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sqlalchemy import create_engine, func, inspect, select
+
+from app import migrations
+from app.models.database import User
+from app.utils import db_utils
+from app.utils.db_utils import generate_users, seed_users
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'seed.db'}")
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture(params=["sqlite", "postgres"])
+def seed_engine(request, monkeypatch):
+    """Migrated, empty database that seed_users writes to (COPY on PostgreSQL)."""
+    engine = request.getfixturevalue(f"{request.param}_engine")
+    migrations.migrate(engine, log=lambda message: None)
+    monkeypatch.setattr(db_utils, "engine", engine)
+    return engine
+
+
+def _ids(engine) -> list:
+    with engine.connect() as connection:
+        return connection.execute(select(User.id).order_by(User.id)).scalars().all()
+
+
+def test_generated_users_are_reproducible():
+    now = datetime(2025, 1, 1, 12, 0)
+    first = generate_users(1000, np.random.default_rng(7), now)
+    assert first.equals(generate_users(1000, np.random.default_rng(7), now))
+    assert list(first.columns) == list(db_utils.SEED_COLUMNS)
+    assert first["age"].between(18, 70).all() and first["salary"].between(30000, 120000).all()
+    assert first["city"].isin(db_utils.CITIES).all()
+    assert first["name"].str.contains(" ").all()
+    assert first["join_date"].max() <= now and first["join_date"].min() >= now - timedelta(days=1095)
+
+
+def test_seed_in_batches_and_rebuild_indexes(seed_engine):
+    done = []
+    assert seed_users(2500, batch_size=1000, seed=1, progress=done.append) == 2500
+    assert done == [1000, 2000, 2500]
+    assert _ids(seed_engine) == list(range(1, 2501))
+    # Dropped for the load into the empty table, then created again
+    indexes = {index["name"] for index in inspect(seed_engine).get_indexes("users")}
+    assert {index.name for index in User.__table__.indexes} <= indexes
+
+    seed_users(500, seed=2)
+    with seed_engine.connect() as connection:
+        assert connection.execute(select(func.count()).select_from(User)).scalar() == 3000
+
+
+def test_truncate_restarts_ids(seed_engine):
+    seed_users(300, seed=1)
+    seed_users(300, seed=1, truncate=True)
+    assert _ids(seed_engine) == list(range(1, 301))
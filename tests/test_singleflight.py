@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.singleflight import SingleFlight
+
+
+class _Slow:
+    """Computation that finishes when released, counting its runs."""
+
+    def __init__(self, result="done"):
+        self.result = result
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flights, compute, other = SingleFlight(timeout=5), _Slow(), _Slow("other")
+        waiting = [asyncio.ensure_future(flights.do("summary", compute)) for _ in range(5)]
+        other_key = asyncio.ensure_future(flights.do("by_city", other))
+        await asyncio.sleep(0)
+        in_flight = flights.stats()["in_flight"]
+        compute.release.set()
+        other.release.set()
+        results = await asyncio.gather(*waiting, other_key)
+        # A call after the run finished starts a new one
+        again = await flights.do("summary", compute)
+        return flights, compute, in_flight, results, again
+
+    flights, compute, in_flight, results, again = asyncio.run(scenario())
+    assert results == ["done"] * 5 + ["other"] and again == "done"
+    assert in_flight == 2 and compute.calls == 2
+    assert flights.stats() == {"in_flight": 0, "executions": 3, "coalesced": 4,
+                               "timeouts": 0, "failures": 0}
+
+
+def test_failure_reaches_every_waiter_once():
+    async def scenario():
+        flights = SingleFlight(timeout=5)
+        compute = _Slow(HTTPException(status_code=400, detail="bad filters"))
+        waiting = [asyncio.ensure_future(flights.do("summary", compute)) for _ in range(3)]
+        await asyncio.sleep(0)
+        compute.release.set()
+        return flights, await asyncio.gather(*waiting, return_exceptions=True)
+
+    flights, errors = asyncio.run(scenario())
+    assert [error.status_code for error in errors] == [400] * 3
+    assert flights.stats()["failures"] == 1 and flights.stats()["in_flight"] == 0
+
+
+def test_timed_out_caller_leaves_the_run_going():
+    async def scenario():
+        flights, compute = SingleFlight(timeout=0.01), _Slow()
+        with pytest.raises(HTTPException) as timed_out:
+            await flights.do("summary", compute)
+        later = asyncio.ensure_future(flights.do("summary", compute, timeout=5))
+        await asyncio.sleep(0)
+        compute.release.set()
+        return flights, compute, timed_out.value, await later
+
+    flights, compute, timed_out, later = asyncio.run(scenario())
+    assert timed_out.status_code == 504
+    assert later == "done" and compute.calls == 1
+    assert flights.stats()["timeouts"] == 1 and flights.stats()["coalesced"] == 1
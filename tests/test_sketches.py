@@ -0,0 +1,120 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.analytics.sketches import KLLSketch, SketchStore, merged
+
+FRACTIONS = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99]
+
+
+def _rank_errors(sketch, values):
+    ordered = np.sort(values)
+    estimates = sketch.quantiles(FRACTIONS)
+    return [
+        abs(np.searchsorted(ordered, estimate, side="right") / len(ordered) - fraction)
+        for fraction, estimate in zip(FRACTIONS, estimates)
+    ]
+
+
+@pytest.mark.parametrize("k", [64, 200])
+def test_rank_error_within_bound(k):
+    values = np.random.default_rng(1).lognormal(10, 1, 200_000)
+    sketch = KLLSketch(k=k, seed=2)
+    for chunk in np.array_split(values, 37):
+        sketch.update(chunk)
+
+    assert sketch.count == len(values)
+    assert max(_rank_errors(sketch, values)) <= sketch.rank_error()
+    assert sketch.quantiles([0, 1]) == [values.min(), values.max()]
+
+
+def test_sketch_stays_bounded():
+    sketch = KLLSketch(k=100, seed=3)
+    sketch.update(np.arange(1_000_000, dtype=np.float64))
+    assert sum(len(items) for items in sketch.compactors) < 3 * 100
+
+
+def test_merge_of_shards_matches_whole():
+    values = np.random.default_rng(4).normal(50_000, 15_000, 120_000)
+    shards = [KLLSketch(k=200, seed=seed) for seed in range(4)]
+    for shard, part in zip(shards, np.array_split(values, 4)):
+        shard.update(part)
+
+    union = KLLSketch(k=200, seed=9)
+    for shard in shards:
+        union.merge(shard)
+
+    assert union.count == len(values)
+    assert union.min == values.min() and union.max == values.max()
+    assert max(_rank_errors(union, values)) <= union.rank_error()
+
+
+def test_empty_and_nan():
+    sketch = KLLSketch()
+    assert sketch.quantiles([0.5]) == [None]
+    sketch.update([np.nan, 3.0, np.nan])
+    assert sketch.count == 1
+    assert sketch.quantiles([0.5]) == [3.0]
+
+
+def test_dict_round_trip():
+    sketch = KLLSketch(k=50, seed=5)
+    sketch.update(np.arange(10_000, dtype=np.float64))
+    copy = KLLSketch.from_dict(sketch.to_dict())
+    assert copy.count == sketch.count
+    assert copy.quantiles(FRACTIONS) == sketch.quantiles(FRACTIONS)
+
+
+def test_merged_by_city():
+    sketches = {}
+    for city, values in (("Berlin", [1.0, 2.0]), ("Paris", [3.0])):
+        sketches[("salary", city)] = KLLSketch()
+        sketches[("salary", city)].update(values)
+    assert merged(sketches, "salary", ["Berlin", "Paris", "Nowhere"]).count == 3
+    assert merged(sketches, "salary").count == 0
+
+
+class _Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def partitions(self):
+        yield self.rows
+
+
+class _Database:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def execute(self, statement):
+        return _Result(list(self.rows))
+
+
+def test_store_shares_one_rebuild_and_tracks_commits():
+    store = SketchStore()
+    database = _Database([("Berlin", 50_000.0, 30), ("Paris", 60_000.0, 40)])
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def run(fn):
+        started.set()
+        await release.wait()
+        return fn(database)
+
+    async def scenario():
+        readers = [asyncio.ensure_future(store.sketches(run)) for _ in range(5)]
+        await started.wait()
+        # A user committed while the scan runs may be missing from its result
+        store.apply_changes([(None, {"city": "Rome", "salary": 1.0, "age": 20})])
+        release.set()
+        return await asyncio.gather(*readers)
+
+    results = asyncio.run(scenario())
+    assert store.builds == 1
+    assert all(result is results[0] for result in results)
+    assert results[0][("salary", None)].count == 2
+    assert store.stats()["stale"] is True
+
+    store.apply_changes([(None, {"city": "Rome", "salary": 1.0, "age": 20})])
+    assert results[0][("salary", "Rome")].count == 1
@@ -0,0 +1,47 @@
+import asyncio
+import sys
+
+import pandas as pd
+import pytest
+
+from app.analytics import aggregations, snapshot
+from app.analytics.snapshot import SNAPSHOT_COLUMNS, SnapshotStore
+
+
+def test_snapshot_round_trip(tmp_path, users_db, users_frame):
+    store = SnapshotStore(str(tmp_path), max_age=0)
+    version = store.write(users_db)
+
+    snapshot = store.current()
+    assert snapshot.version == version and store.rows_written == len(users_frame)
+    frame = snapshot.frame()
+    assert list(frame.columns) == list(SNAPSHOT_COLUMNS)
+    pd.testing.assert_series_equal(frame["salary"], users_frame["salary"])
+    assert aggregations.summary_from_frame(frame) == aggregations.summary_from_frame(users_frame)
+
+
+def test_only_the_newest_snapshots_are_kept(tmp_path, users_db):
+    store = SnapshotStore(str(tmp_path), max_age=0)
+    versions = [store.write(users_db) for _ in range(3)]
+    assert [version for version, _ in store._versions()] == versions[1:]
+    assert store.current().version == versions[-1]
+
+
+def test_stale_snapshot_is_not_served(tmp_path, users_db, monkeypatch):
+    store = SnapshotStore(str(tmp_path), max_age=60)
+    version = store.write(users_db)
+    assert store.current() is not None
+
+    monkeypatch.setattr(snapshot.time, "time", lambda: version / 1000 + 61)
+    assert store.current() is None
+
+
+def test_start_needs_pyarrow(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, "pyarrow", None)
+    store = SnapshotStore(str(tmp_path), max_age=0)
+
+    async def start():
+        store.start(None)
+
+    with pytest.raises(RuntimeError, match="pyarrow"):
+        asyncio.run(start())
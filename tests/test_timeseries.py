@@ -0,0 +1,99 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from app.analytics import timeseries
+from app.analytics.aggregations import round_value
+from app.models.database import utc_now
+from app.models.schemas import RollingSalaryQuery, TimeSeriesQuery
+from app.utils.db_utils import generate_users
+
+NOW = datetime(2026, 1, 15, 12)
+
+
+@pytest.fixture(autouse=True)
+def bucket_store(monkeypatch):
+    store = timeseries.BucketStore(max_series=8)
+    monkeypatch.setattr(timeseries, "bucket_store", store)
+    return store
+
+
+def _months(frame):
+    return frame["join_date"].dt.to_period("M").dt.to_timestamp()
+
+
+def test_monthly_signups_and_headcount(any_users_db, users_frame):
+    result = timeseries.signups(any_users_db, "month", TimeSeriesQuery(joined_after="2024-03-10T00:00:00"), NOW)
+
+    expected = users_frame.groupby(_months(users_frame)).size()
+    buckets = result["buckets"]
+    assert buckets[0]["start"] == "2024-03-01T00:00:00"
+    assert buckets[-1]["start"] == "2026-01-01T00:00:00"
+    for bucket in buckets:
+        assert bucket["signups"] == expected.get(datetime.fromisoformat(bucket["start"]), 0)
+    before = (users_frame["join_date"] < datetime(2024, 3, 1)).sum()
+    assert buckets[-1]["headcount"] == before + sum(bucket["signups"] for bucket in buckets)
+
+
+def test_rolling_salary_ignores_missing_salaries(any_users_db, users_frame):
+    query = RollingSalaryQuery(joined_after="2024-01-01T00:00:00", joined_before="2024-12-31T00:00:00", window=2)
+    result = timeseries.rolling_salary(any_users_db, "month", query.window, query, NOW)
+
+    frame = users_frame.assign(month=_months(users_frame))
+    oslo = frame[frame["city"] == "Oslo"].groupby("month")["salary"]
+    means, sums, counts = oslo.mean(), oslo.sum(), oslo.count()
+    series = result["cities"]["Oslo"]
+    assert len(series) == 12
+    for index, point in enumerate(series):
+        month = datetime.fromisoformat(point["start"])
+        assert point["avg_salary"] == round_value(means[month])
+        window = [month, (month - timedelta(days=1)).replace(day=1)]
+        rolling = sums.reindex(window).sum() / counts.reindex(window).sum()
+        assert point["rolling_avg_salary"] == round_value(rolling)
+
+
+def test_closed_buckets_are_served_from_the_store(users_db, bucket_store):
+    query = TimeSeriesQuery(joined_after="2025-06-01T00:00:00")
+    first = timeseries.signups(users_db, "week", query, NOW)
+    misses = bucket_store.misses
+    assert timeseries.signups(users_db, "week", query, NOW) == first
+    # Every closed bucket is a hit; only the open one is queried again
+    assert bucket_store.hits == len(first["buckets"]) - 1
+    assert bucket_store.misses == misses
+
+
+def test_weeks_start_on_monday():
+    dates = np.array(["2024-01-07T23:00", "2024-01-08T00:00", "2024-02-29"], dtype="datetime64[us]")
+    starts = timeseries._bucket_array(dates, "week")
+    assert [str(start)[:10] for start in starts] == ["2024-01-01", "2024-01-08", "2024-02-26"]
+    assert timeseries.bucket_start(datetime(2024, 2, 29, 5), "week") == datetime(2024, 2, 26)
+
+
+def test_aware_bounds_select_utc_buckets(users_db):
+    # 02:00 in UTC+9 on Feb 1st is still January 31st in UTC
+    query = TimeSeriesQuery(joined_after="2024-02-01T02:00:00+09:00",
+                            joined_before="2024-02-03T00:00:00+00:00")
+    result = timeseries.signups(users_db, "day", query, NOW)
+    assert [bucket["start"][:10] for bucket in result["buckets"]] == [
+        "2024-01-31", "2024-02-01", "2024-02-02", "2024-02-03"
+    ]
+
+
+@pytest.fixture
+def tokyo_time(monkeypatch):
+    monkeypatch.setenv("TZ", "Asia/Tokyo")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_seeded_join_dates_are_utc(tokyo_time):
+    local = datetime.now()
+    utc = datetime.now(timezone.utc).replace(tzinfo=None)
+    assert abs(local - utc) > timedelta(hours=8)
+
+    latest = generate_users(2000, np.random.default_rng(0))["join_date"].max()
+    assert abs(latest.to_pydatetime() - utc_now()) < timedelta(minutes=1)
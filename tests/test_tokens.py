@@ -0,0 +1,98 @@
+import time
+
+import pytest
+from jose import JWTError, jwt
+
+from app.core import principals, security, tokens
+from app.core.cache import TTLCache
+from app.core.principals import embedded_principal, invalidate_principal
+from app.core.tokens import SigningKeys, parse_signing_keys
+
+OLD = "o" * 32
+NEW = "n" * 40
+
+
+@pytest.fixture
+def keys(monkeypatch):
+    """Install a key set; returns a function replacing it (a deploy with new settings)."""
+    def install(keys: dict, unkeyed_secret=None):
+        monkeypatch.setattr(tokens, "signing_keys", SigningKeys(keys, unkeyed_secret))
+        monkeypatch.setattr(security, "signing_keys", tokens.signing_keys)
+        # Each deploy starts with an empty cache of verified tokens
+        monkeypatch.setattr(tokens, "verified_tokens", TTLCache(maxsize=100, ttl=60))
+    return install
+
+
+def _claims(**extra) -> dict:
+    now = int(time.time())
+    return {"sub": "alice", "iat": now, "exp": now + 60, **extra}
+
+
+def test_parse_signing_keys():
+    assert parse_signing_keys(f" new:{NEW} , old:{OLD},") == {"new": NEW, "old": OLD}
+    assert parse_signing_keys("") == {}
+
+
+@pytest.mark.parametrize("value", ["new:", f"new:{'n' * 31}", f":{NEW}", f"new:{NEW},new:{OLD}"])
+def test_weak_or_malformed_keys_are_rejected(value):
+    with pytest.raises(ValueError):
+        parse_signing_keys(value)
+
+
+def test_rotation(keys):
+    keys({"old": OLD})
+    issued_before = security.create_access_token({"sub": "alice"})
+    assert jwt.get_unverified_header(issued_before)["kid"] == "old"
+
+    # Rotate: the new key signs, the old one still verifies
+    keys({"new": NEW, "old": OLD})
+    issued_after = security.create_access_token({"sub": "alice"})
+    assert jwt.get_unverified_header(issued_after)["kid"] == "new"
+    assert tokens.verify_token(issued_before)["sub"] == "alice"
+    assert tokens.verify_token(issued_after)["sub"] == "alice"
+
+    # Retire the old key once its tokens have expired
+    keys({"new": NEW})
+    assert tokens.verify_token(issued_after)["sub"] == "alice"
+    with pytest.raises(JWTError):
+        tokens.verify_token(issued_before)
+
+
+def test_unkeyed_tokens_need_the_legacy_secret(keys):
+    legacy = jwt.encode(_claims(), OLD, algorithm="HS256")
+    keys({"new": NEW}, unkeyed_secret=OLD)
+    assert tokens.verify_token(legacy)["sub"] == "alice"
+    keys({"new": NEW})
+    with pytest.raises(JWTError):
+        tokens.verify_token(legacy)
+
+
+def test_forged_and_expired_tokens_are_rejected(keys):
+    keys({"new": NEW})
+    with pytest.raises(JWTError):
+        tokens.verify_token(jwt.encode(_claims(), "f" * 32, algorithm="HS256", headers={"kid": "new"}))
+    expired = tokens.signing_keys.sign(_claims(exp=int(time.time()) - 1))
+    with pytest.raises(JWTError):
+        tokens.verify_token(expired)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_700_000_000.25]
+    monkeypatch.setattr(principals.time, "time", lambda: now[0])
+    monkeypatch.setattr(principals, "_changed_accounts", TTLCache(maxsize=10, ttl=3600))
+    return now
+
+
+def test_account_changes_invalidate_embedded_claims(clock):
+    claims = {"sub": "alice", "uid": 7, "email": "a@example.com", "iat": 1_700_000_000}
+    assert embedded_principal(claims).email == "a@example.com"
+
+    invalidate_principal(7)
+    # Issued in the second of the change (maybe before it) or earlier: look the account up
+    assert embedded_principal(claims) is None
+    # Issued in a later second: after the change, trusted again
+    assert embedded_principal({**claims, "iat": 1_700_000_001}).id == 7
+    # Other accounts are unaffected
+    assert embedded_principal({**claims, "uid": 8}).id == 8
+
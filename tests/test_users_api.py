@@ -0,0 +1,88 @@
+import json
+from datetime import datetime
+
+import orjson
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import delete
+
+from app.models.database import User
+from app.models.schemas import UserResponse
+from app.utils.serialization import USER_RESPONSE_FIELDS, dumps, ndjson_lines, user_dicts
+
+
+def _pages(client, limit):
+    cursor = None
+    while True:
+        params = {"limit": limit} if cursor is None else {"limit": limit, "cursor": cursor}
+        page = client.post("/users/page", params=params).json()
+        yield page
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
+
+
+def test_keyset_pages_cover_every_user_once(users_api, users_frame):
+    pages = list(_pages(users_api, 700))
+    ids = [user["id"] for page in pages for user in page["items"]]
+    assert ids == list(range(1, len(users_frame) + 1))
+    assert [len(page["items"]) for page in pages] == [700] * 7 + [100]
+
+
+def test_cursor_is_stable_when_earlier_rows_go(users_api, users_db):
+    first = users_api.post("/users/page", params={"limit": 10}).json()
+    users_db.execute(delete(User).where(User.id <= 5))
+    users_db.commit()
+    # An offset would now skip users 11-15
+    second = users_api.post("/users/page", params={"limit": 10, "cursor": first["next_cursor"]}).json()
+    assert [user["id"] for user in second["items"]] == list(range(11, 21))
+
+
+def test_exact_last_page_ends_with_an_empty_page(users_api, users_frame):
+    pages = list(_pages(users_api, 1000))
+    assert len(pages) == 6 and pages[4]["next_cursor"] == len(users_frame)
+    assert pages[5] == {"items": [], "next_cursor": None}
+
+
+def test_page_size_is_bounded(users_api):
+    assert users_api.post("/users/page", params={"limit": 0}).status_code == 422
+    assert users_api.post("/users/page", params={"limit": 100_000}).status_code == 422
+
+
+def test_stream_matches_the_full_listing(users_api, users_frame):
+    response = users_api.post("/users/stream")
+    assert response.headers["content-type"] == "application/x-ndjson"
+    streamed = [orjson.loads(line) for line in response.content.splitlines()]
+
+    assert len(streamed) == len(users_frame)
+    assert streamed == users_api.post("/users/all").json()
+
+
+def _expected_user(frame, index) -> dict:
+    row = frame.iloc[index]
+    return {
+        "name": f"User {index}",
+        "age": None if pd.isna(row.age) else int(row.age),
+        "city": row.city,
+        "salary": None if pd.isna(row.salary) else row.salary,
+        "id": index + 1,
+        "join_date": row.join_date.isoformat(),
+    }
+
+
+def test_listing_renders_like_the_response_model(users_api, users_frame):
+    response = users_api.post("/users/all")
+    users = response.json()
+    assert users == [_expected_user(users_frame, index) for index in range(len(users_frame))]
+    # Same field order as UserResponse, compact separators
+    assert response.content.startswith(b'[{"name":"User 0","age":')
+    assert tuple(users[0]) == USER_RESPONSE_FIELDS == tuple(UserResponse.model_fields)
+
+
+def test_encoding_matches_the_standard_encoder():
+    joined = datetime(2024, 5, 6, 7, 8, 9, 123456)
+    rows = [("Ann", 30, "Oslo", 51000.25, 1, joined), ("Bo", None, None, None, 2, joined)]
+    users = user_dicts(rows)
+    assert orjson.loads(dumps(users)) == jsonable_encoder(users)
+    assert ndjson_lines(rows) == b"".join(dumps(user) + b"\n" for user in users)
+    assert json.loads(ndjson_lines(rows).splitlines()[0])["join_date"] == joined.isoformat()